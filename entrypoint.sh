@@ -25,5 +25,6 @@ if [ "$DEBUG" = "True" ] || [ "$DEBUG" = "true" ] || [ "$DEBUG" = "1" ]; then
 else
     echo "🌍 MODO PRODUCCIÓN: Arrancando Gunicorn..."
     # Asegúrate de que 'core.wsgi' es correcto para tu proyecto
-    exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 3
+    # Hilos por worker: las peticiones simultáneas de radar_carga de una misma celda comparten cálculo
+    exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 3 --threads 4
 fi
\ No newline at end of file
@@ -80,9 +80,54 @@ DATABASES = {
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+
+        # Conexiones persistentes: cada worker de gunicorn reutiliza la suya en vez de abrir una por petición.
+        # Con CONN_HEALTH_CHECKS se comprueba antes de reutilizarla (por si Postgres se reinició).
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# --- RÉPLICA DE LECTURA (OPCIONAL) ---
+# Si existe POSTGRES_REPLICA_HOST, las vistas de analítica leen de ella (ver core/db_router.py).
+# Para probar en local basta con otra instancia de Postgres con una copia de los datos.
+if os.getenv('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('POSTGRES_REPLICA_DB', DATABASES['default']['NAME']),
+        'USER': os.getenv('POSTGRES_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('POSTGRES_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('POSTGRES_REPLICA_HOST'),
+        'PORT': os.getenv('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+        # En los tests la réplica es un alias de la base de pruebas, no otra base que crear
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Retraso máximo admitido (segundos entre la última captura del primario y la de la réplica)
+REPLICA_MAX_LAG = env.int('REPLICA_MAX_LAG', default=300)
+# Cada cuánto se vuelve a medir ese retraso (segundos, por proceso)
+REPLICA_CHECK_INTERVAL = env.int('REPLICA_CHECK_INTERVAL', default=30)
+
+
+# --- INGESTA MULTI-FEED (core/ingesta.py) ---
+# Peticiones HTTP simultáneas como máximo entre todos los feeds
+INGESTA_CONCURRENCIA = env.int('INGESTA_CONCURRENCIA', default=8)
+INGESTA_TIMEOUT = env.int('INGESTA_TIMEOUT', default=20)
+# Se puede apuntar a un servidor local con respuestas de prueba
+OPEN_METEO_URL = env('OPEN_METEO_URL', default='https://api.open-meteo.com/v1/forecast')
+
+# --- ARCHIVO FRÍO (core/archivo.py) ---
+# Meses exportados a .npy antes de purgarlos; debe ser un directorio compartido por web y monitor
+ARCHIVO_DIR = env('ARCHIVO_DIR', default=os.path.join(BASE_DIR, 'archivo'))
+
+# --- ARTEFACTOS ESTÁTICOS (core/publicacion.py) ---
+# JSON precomprimidos que se regeneran tras cada captura y nginx sirve sin pasar por Django
+PUBLICACION_DIR = env('PUBLICACION_DIR', default=os.path.join(BASE_DIR, 'publicado'))
+PUBLICACION_URL = env('PUBLICACION_URL', default='/datos/')
+
+# --- INFORMES MENSUALES (core/informes.py) ---
+INFORMES_DIR = env('INFORMES_DIR', default=os.path.join(BASE_DIR, 'informes'))
 
 # ... (El resto del archivo hacia abajo: Password validators, Internationalization, Static files... DÉJALO IGUAL) ...
 LANGUAGE_CODE = 'es-es'
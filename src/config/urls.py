@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -22,3 +24,6 @@ urlpatterns = [
     path('', include('core.urls')),  # Rutas de la app 'core'
 
 ]
+
+# En producción nginx sirve los artefactos publicados; en desarrollo (runserver) los sirve Django
+urlpatterns += static(settings.PUBLICACION_URL, document_root=settings.PUBLICACION_DIR)
@@ -1,8 +1,177 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import cached_property
+from datetime import timedelta
 
 # Register your models here.
-from .models import Estacion, Captura, LecturaEstacion
+from .models import Estacion, Captura, LecturaEstacion, Feed, AlertaEstacion, Zona
 
-admin.site.register(Estacion)
-admin.site.register(Captura)
-admin.site.register(LecturaEstacion)
+# --- PAGINACIÓN LIGERA PARA TABLAS GRANDES ---
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginador que evita el COUNT(*) exacto sobre tablas de millones de filas.
+    - Sin filtros: usa la estimación de pg_class (reltuples), que es instantánea.
+    - Con filtros: cuenta como mucho LIMITE_CONTEO filas.
+    En ambos casos el total se recorta a LIMITE_CONTEO, así que no hay páginas con un OFFSET
+    mayor (el resto se navega con los filtros de fecha/periodo).
+    """
+    LIMITE_CONTEO = 10000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            estimado = self._estimacion_pg_class(self.object_list.model)
+            if estimado is not None:
+                return min(estimado, self.LIMITE_CONTEO)
+        return self.object_list.values('pk')[:self.LIMITE_CONTEO].count()
+
+    @staticmethod
+    def _estimacion_pg_class(model):
+        connection = connections[model.objects.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [model._meta.db_table])
+            row = cursor.fetchone()
+        # reltuples vale -1 si la tabla nunca se ha analizado
+        if not row or row[0] < 0:
+            return None
+        return row[0]
+
+
+class TablaGrandeAdmin(admin.ModelAdmin):
+    """Base común para los históricos: sin conteo exacto y como mucho LIMITE_CONTEO filas paginables."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    # Deshabilita "Mostrar todo" (cargaría la tabla entera)
+    list_max_show_all = 0
+
+
+class PeriodoCapturaFilter(admin.SimpleListFilter):
+    """
+    Navegación por claves: resuelve en Captura (tabla pequeña) el primer ID del periodo
+    y filtra las lecturas con captura_id >= ID, que usa el índice en lugar de un JOIN + OFFSET.
+    """
+    title = 'periodo'
+    parameter_name = 'periodo'
+    PERIODOS = {
+        '3h': timedelta(hours=3),
+        '24h': timedelta(hours=24),
+        '7d': timedelta(days=7),
+    }
+
+    def lookups(self, request, model_admin):
+        return [('3h', 'Últimas 3 horas'), ('24h', 'Últimas 24 horas'), ('7d', 'Últimos 7 días')]
+
+    def queryset(self, request, queryset):
+        delta = self.PERIODOS.get(self.value())
+        if delta is None:
+            return queryset
+        primera = Captura.objects.filter(timestamp__gte=timezone.now() - delta).order_by('timestamp').values_list('id', flat=True).first()
+        if primera is None:
+            return queryset.none()
+        return queryset.filter(captura_id__gte=primera)
+
+
+# --- FEEDS ---
+
+@admin.register(Feed)
+class FeedAdmin(admin.ModelAdmin):
+    list_display = ('slug', 'nombre', 'tipo', 'activo', 'prefijo_ids')
+    list_filter = ('tipo', 'activo')
+    prepopulated_fields = {'slug': ('nombre',)}
+
+
+# --- ESTACIONES ---
+
+class UltimasLecturasInline(admin.TabularInline):
+    """Solo lectura: muestra las últimas N lecturas de la estación, nunca el histórico completo."""
+    model = LecturaEstacion
+    verbose_name_plural = 'Últimas lecturas'
+    num_lecturas = 20
+    fields = ('timestamp_captura', 'bicis_disponibles', 'anclajes_libres', 'estado')
+    readonly_fields = fields
+    extra = 0
+    max_num = 0
+    can_delete = False
+    show_change_link = True
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        estacion_id = request.resolver_match.kwargs.get('object_id') if request.resolver_match else None
+        if estacion_id is None:
+            return qs.none()
+        # Resolvemos primero los IDs (LIMIT sobre el índice estacion/captura) y luego filtramos por ellos
+        ultimos_ids = list(
+            LecturaEstacion.objects.filter(estacion_id=estacion_id)
+            .order_by('-captura_id')
+            .values_list('id', flat=True)[:self.num_lecturas]
+        )
+        return qs.filter(id__in=ultimos_ids).select_related('captura').order_by('-captura_id')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Captura')
+    def timestamp_captura(self, obj):
+        return obj.captura.timestamp
+
+
+@admin.register(Estacion)
+class EstacionAdmin(admin.ModelAdmin):
+    list_display = ('id_externo', 'nombre', 'feed', 'capacidad_total', 'latitud', 'longitud')
+    list_filter = ('feed',)
+    search_fields = ('nombre', 'id_externo')
+    ordering = ('id_externo',)
+    inlines = [UltimasLecturasInline]
+
+
+# --- CAPTURAS Y LECTURAS ---
+
+@admin.register(Captura)
+class CapturaAdmin(TablaGrandeAdmin):
+    list_display = ('timestamp', 'feed', 'temperatura', 'viento_kmh', 'precipitacion', 'codigo_clima', 'es_festivo', 'es_fin_semana')
+    list_filter = ('feed', 'es_festivo', 'es_fin_semana')
+    list_select_related = ('feed',)
+    # La jerarquía de fechas filtra por rango sobre el índice de timestamp (navegación por claves, sin OFFSET profundo)
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp',)
+
+
+@admin.register(LecturaEstacion)
+class LecturaEstacionAdmin(TablaGrandeAdmin):
+    list_display = ('id', 'captura', 'estacion', 'bicis_disponibles', 'anclajes_libres', 'estado')
+    list_select_related = ('captura', 'estacion')
+    # Filtros sobre columnas indexadas (captura_id y estacion_id). Sin date_hierarchy:
+    # calcularía MIN/MAX y DISTINCT de fechas con un JOIN sobre todo el histórico.
+    list_filter = (PeriodoCapturaFilter, 'estacion')
+    # Evita los desplegables con todas las capturas/estaciones en el formulario de edición
+    raw_id_fields = ('captura',)
+    autocomplete_fields = ('estacion',)
+    # El orden por PK usa el índice primario; el orden de llegada coincide con el de las capturas
+    ordering = ('-id',)
+
+
+@admin.register(AlertaEstacion)
+class AlertaEstacionAdmin(admin.ModelAdmin):
+    list_display = ('estacion', 'tipo', 'inicio', 'fin', 'activa', 'detalle')
+    list_filter = ('activa', 'tipo')
+    list_select_related = ('estacion',)
+    autocomplete_fields = ('estacion',)
+    date_hierarchy = 'inicio'
+
+
+@admin.register(Zona)
+class ZonaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'feed', 'resolucion', 'fila', 'columna', 'capacidad_total')
+    list_filter = ('feed', 'resolucion')
+    # La pertenencia la mantiene core/zonas.py a partir de las coordenadas
+    readonly_fields = ('estaciones',)
@@ -0,0 +1,133 @@
+"""
+Detector incremental de anomalías por estación.
+
+Se ejecuta en cada captura con el estado guardado de la vez anterior, sin leer el histórico:
+- EstadoEstacion: última foto y último cambio -> estaciones atascadas y desaparecidas.
+- EstadisticaFranja: media/varianza de Welford de la franja horaria actual (sin las lecturas
+  marcadas como atípicas) -> valores atípicos.
+- capacidad_total de la estación -> caídas bruscas de anclajes útiles.
+Cada captura hace un número fijo de consultas, todas acotadas a las estaciones del feed.
+"""
+import math
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AlertaEstacion, EstadisticaFranja, EstadoEstacion
+
+# Sin cambios durante este tiempo (en horario de servicio) -> atascada
+UMBRAL_ATASCADA = timedelta(hours=3)
+HORAS_SERVICIO = range(7, 24)
+# |z| por encima de esto con al menos MIN_MUESTRAS en la franja -> atípica
+UMBRAL_Z = 4.0
+MIN_MUESTRAS = 20
+# bicis + anclajes por debajo de esta fracción de la capacidad -> caída de capacidad
+FRACCION_CAPACIDAD = 0.5
+# Sin aparecer en el feed durante este tiempo -> desaparecida
+UMBRAL_DESAPARECIDA = timedelta(minutes=30)
+
+
+def franja_semanal(dt):
+    local = timezone.localtime(dt)
+    return local.weekday() * 24 + local.hour
+
+
+def welford(stat, x):
+    """Actualiza en sitio n, media y m2 con una nueva observación"""
+    stat.n += 1
+    delta = x - stat.media
+    stat.media += delta / stat.n
+    stat.m2 += delta * (x - stat.media)
+
+
+def detectar_anomalias(captura, lecturas):
+    """
+    Actualiza el estado del detector con `lecturas` (las de `captura`) y abre/cierra alertas.
+    Devuelve el número de alertas nuevas.
+    """
+    if captura.feed_id is None:
+        return 0
+    ahora = captura.timestamp
+    franja = franja_semanal(ahora)
+    en_servicio = timezone.localtime(ahora).hour in HORAS_SERVICIO
+
+    estados = {e.estacion_id: e for e in EstadoEstacion.objects.filter(estacion__feed_id=captura.feed_id)}
+    stats = {s.estacion_id: s for s in EstadisticaFranja.objects.filter(estacion__feed_id=captura.feed_id, franja=franja)}
+    activas = {(a.estacion_id, a.tipo): a for a in AlertaEstacion.objects.filter(estacion__feed_id=captura.feed_id, activa=True)}
+
+    abrir, cerrar = [], []
+    # (estacion_id, tipo) que siguen dándose en esta captura
+    vigentes = set()
+
+    def marcar(estacion_id, tipo, detalle):
+        vigentes.add((estacion_id, tipo))
+        if (estacion_id, tipo) not in activas:
+            abrir.append(AlertaEstacion(estacion_id=estacion_id, tipo=tipo, inicio=ahora, detalle=detalle))
+
+    for lectura in lecturas:
+        eid = lectura.estacion_id
+        bicis, anclajes = lectura.bicis_disponibles, lectura.anclajes_libres
+
+        # 1. Atascada: misma foto desde hace horas
+        estado = estados.get(eid)
+        if estado is None:
+            estado = EstadoEstacion(estacion_id=eid, bicis=bicis, anclajes=anclajes, ultimo_cambio=ahora, ultima_vista=ahora)
+            estados[eid] = estado
+        elif (estado.bicis, estado.anclajes) != (bicis, anclajes):
+            estado.bicis, estado.anclajes, estado.ultimo_cambio = bicis, anclajes, ahora
+        elif ahora - estado.ultimo_cambio >= UMBRAL_ATASCADA and (en_servicio or (eid, 'ATS') in activas):
+            # Solo se abre en horario de servicio (de noche es normal no moverse), pero una alerta abierta sigue viva
+            horas = (ahora - estado.ultimo_cambio).total_seconds() / 3600
+            marcar(eid, 'ATS', f"Sin cambios desde hace {horas:.1f} h ({bicis} bicis / {anclajes} anclajes)")
+        estado.ultima_vista = ahora
+
+        # 2. Atípica: se compara contra la distribución ANTES de añadir la observación
+        stat = stats.get(eid)
+        if stat is None:
+            stat = EstadisticaFranja(estacion_id=eid, franja=franja, n=0, media=0.0, m2=0.0)
+            stats[eid] = stat
+        atipica = False
+        if stat.n >= MIN_MUESTRAS:
+            desviacion = math.sqrt(stat.m2 / (stat.n - 1))
+            if desviacion > 0:
+                z = (bicis - stat.media) / desviacion
+                atipica = abs(z) > UMBRAL_Z
+                if atipica:
+                    marcar(eid, 'ATP', f"{bicis} bicis frente a una media de {stat.media:.1f} ± {desviacion:.1f} (z={z:.1f})")
+        # Las atípicas no entran en la estadística: una anomalía sostenida no ensancha su propio umbral
+        if not atipica:
+            welford(stat, bicis)
+
+        # 3. Caída de capacidad
+        # (la ingesta asigna el objeto Estacion a cada lectura, así que no hay consulta extra)
+        capacidad = lectura.estacion.capacidad_total
+        if capacidad and bicis + anclajes < capacidad * FRACCION_CAPACIDAD:
+            marcar(eid, 'CAP', f"{bicis + anclajes} puestos útiles de {capacidad}")
+
+    # 4. Desaparecidas: tenían estado pero no vienen en esta captura
+    for eid, estado in estados.items():
+        if estado.ultima_vista < ahora and ahora - estado.ultima_vista >= UMBRAL_DESAPARECIDA:
+            marcar(eid, 'DES', f"No aparece en el feed desde {timezone.localtime(estado.ultima_vista):%d/%m %H:%M}")
+
+    for clave, alerta in activas.items():
+        if clave not in vigentes:
+            alerta.activa, alerta.fin = False, ahora
+            cerrar.append(alerta)
+
+    with transaction.atomic():
+        EstadoEstacion.objects.bulk_create(
+            estados.values(),
+            update_conflicts=True,
+            unique_fields=['estacion'],
+            update_fields=['bicis', 'anclajes', 'ultimo_cambio', 'ultima_vista'],
+        )
+        EstadisticaFranja.objects.bulk_create(
+            stats.values(),
+            update_conflicts=True,
+            unique_fields=['estacion', 'franja'],
+            update_fields=['n', 'media', 'm2'],
+        )
+        AlertaEstacion.objects.bulk_create(abrir)
+        AlertaEstacion.objects.bulk_update(cerrar, ['activa', 'fin'])
+    return len(abrir)
@@ -0,0 +1,229 @@
+"""
+Archivo frío de capturas antiguas.
+
+Cada mes de un feed se guarda en ARCHIVO_DIR/<feed>/<AAAA-MM>/ como arrays NumPy (.npy):
+- timestamps (T,) int64: epoch UTC de cada Captura, ordenados.
+- minuto_semana (T,) int16: weekday*1440 + hora*60 + minuto en hora local (para franjas).
+- meteo (T, 4) float32: temperatura, viento, precipitación, código WMO.
+- calendario (T, 2) bool: festivo, fin de semana.
+- estaciones (S,) int32: id_externo, ordenados.
+- bicis, anclajes (S, T) int16: ocupación; SIN_DATO donde la estación no vino en esa captura.
+
+Una lectura ocupa 4 bytes frente a la fila + índices de LecturaEstacion, y los .npy se abren
+con mmap: solo se leen del disco las filas de las estaciones que se consultan.
+
+Lectura combinada: de un feed se usa el archivo para los instantes anteriores a su primera
+Captura viva en la base y la base a partir de ahí, así que no hay duplicados aunque un mes
+esté archivado y todavía sin purgar.
+"""
+import datetime
+import functools
+import os
+import shutil
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Captura, Estacion, Feed, LecturaEstacion
+
+SIN_DATO = -1
+ARRAYS = ('timestamps', 'minuto_semana', 'meteo', 'calendario', 'estaciones', 'bicis', 'anclajes')
+
+# feed_id -> primera Captura viva vista por este proceso (las purgas solo la adelantan)
+_primera_viva = {}
+
+
+def directorio_feed(feed):
+    return os.path.join(settings.ARCHIVO_DIR, feed.slug)
+
+
+def ruta_mes(feed, mes):
+    """mes: date del día 1"""
+    return os.path.join(directorio_feed(feed), f"{mes:%Y-%m}")
+
+
+def limites_mes(mes):
+    """[inicio, fin) del mes en hora local"""
+    inicio = timezone.make_aware(datetime.datetime(mes.year, mes.month, 1))
+    siguiente = datetime.datetime(mes.year + (mes.month == 12), mes.month % 12 + 1, 1)
+    return inicio, timezone.make_aware(siguiente)
+
+
+def mes_siguiente(mes):
+    return datetime.date(mes.year + (mes.month == 12), mes.month % 12 + 1, 1)
+
+
+def mes_de(instante):
+    local = timezone.localtime(instante)
+    return datetime.date(local.year, local.month, 1)
+
+
+def meses_archivados(feed):
+    try:
+        nombres = os.listdir(directorio_feed(feed))
+    except FileNotFoundError:
+        return []
+    meses = []
+    for nombre in sorted(nombres):
+        try:
+            mes = datetime.datetime.strptime(nombre, '%Y-%m').date()
+        except ValueError:
+            continue  # temporales de una exportación a medias
+        meses.append(mes)
+    return meses
+
+# --- EXPORTACIÓN ---
+
+def exportar_mes(feed, mes):
+    """
+    Vuelca las capturas del mes a disco. Se escribe en un directorio temporal y se renombra al
+    final, así que un lector nunca ve un mes a medias. Devuelve (capturas, lecturas) exportadas.
+    """
+    inicio, fin = limites_mes(mes)
+    capturas = list(Captura.objects.filter(feed=feed, timestamp__gte=inicio, timestamp__lt=fin).order_by('timestamp').values_list(
+        'id', 'timestamp', 'temperatura', 'viento_kmh', 'precipitacion', 'codigo_clima', 'es_festivo', 'es_fin_semana'
+    ))
+    if not capturas:
+        return 0, 0
+
+    columna = {c[0]: i for i, c in enumerate(capturas)}
+    estaciones = np.array(sorted(Estacion.objects.filter(feed=feed).values_list('id_externo', flat=True)), dtype=np.int32)
+    fila = {int(eid): i for i, eid in enumerate(estaciones)}
+
+    T, S = len(capturas), len(estaciones)
+    bicis = np.full((S, T), SIN_DATO, dtype=np.int16)
+    anclajes = np.full((S, T), SIN_DATO, dtype=np.int16)
+    n_lecturas = 0
+    lecturas = LecturaEstacion.objects.filter(captura__feed=feed, captura__timestamp__gte=inicio, captura__timestamp__lt=fin).values_list(
+        'captura_id', 'estacion_id', 'bicis_disponibles', 'anclajes_libres'
+    )
+    for cid, eid, b, a in lecturas.iterator(chunk_size=10000):
+        i, j = fila[eid], columna[cid]
+        bicis[i, j], anclajes[i, j] = b, a
+        n_lecturas += 1
+
+    locales = [timezone.localtime(c[1]) for c in capturas]
+    arrays = {
+        'timestamps': np.array([int(c[1].timestamp()) for c in capturas], dtype=np.int64),
+        'minuto_semana': np.array([l.weekday() * 1440 + l.hour * 60 + l.minute for l in locales], dtype=np.int16),
+        'meteo': np.array([(c[2] or 0, c[3] or 0, c[4] or 0, c[5] or 0) for c in capturas], dtype=np.float32),
+        'calendario': np.array([(c[6], c[7]) for c in capturas], dtype=bool),
+        'estaciones': estaciones,
+        'bicis': bicis,
+        'anclajes': anclajes,
+    }
+
+    destino = ruta_mes(feed, mes)
+    temporal = f"{destino}.tmp-{os.getpid()}"
+    os.makedirs(temporal, exist_ok=True)
+    for nombre, array in arrays.items():
+        np.save(os.path.join(temporal, f"{nombre}.npy"), array)
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.replace(temporal, destino)
+    return T, n_lecturas
+
+
+def primera_viva(feed):
+    """Captura más antigua del feed que sigue en la base (índice de unique_captura_por_feed)"""
+    return Captura.objects.filter(feed=feed).aggregate(m=Min('timestamp'))['m']
+
+
+def limite_purgable(feed):
+    """
+    Primer instante de `feed` que NO está archivado: desde el mes de su Captura más antigua se
+    avanza mientras el mes tenga archivo. Todo lo anterior se puede borrar de la base sin perder datos.
+    """
+    primera = primera_viva(feed)
+    if primera is None:
+        return None
+    archivados = set(meses_archivados(feed))
+    mes = mes_de(primera)
+    while mes in archivados:
+        mes = mes_siguiente(mes)
+    return limites_mes(mes)[0]
+
+# --- LECTURA ---
+
+@functools.lru_cache(maxsize=64)
+def _abrir(ruta, _mtime):
+    # El mtime forma parte de la clave: si se reexporta el mes se vuelve a abrir
+    return {nombre: np.load(os.path.join(ruta, f"{nombre}.npy"), mmap_mode='r') for nombre in ARRAYS}
+
+
+def abrir_mes(feed, mes):
+    """Arrays del mes memory-mapped (solo lectura) o None si no está archivado."""
+    ruta = ruta_mes(feed, mes)
+    try:
+        mtime = os.stat(ruta).st_mtime
+    except FileNotFoundError:
+        return None
+    return _abrir(ruta, mtime)
+
+
+def _tramos(feed, desde, hasta):
+    """(mes abierto, máscara de columnas) de los meses archivados que cubren [desde, hasta) y no siguen en la base."""
+    # Si `desde` ya es posterior a la primera captura viva vista, también lo es a la actual:
+    # nada que leer del archivo, sin consultar la base ni listar el directorio (el caso de las 24h del detalle)
+    vista = _primera_viva.get(feed.pk)
+    if vista is not None and desde >= vista:
+        return
+    viva = primera_viva(feed)
+    if viva is not None:
+        _primera_viva[feed.pk] = viva
+        hasta = min(hasta, viva)
+    if desde >= hasta:
+        return
+    t0, t1 = int(desde.timestamp()), int(hasta.timestamp())
+    for mes in meses_archivados(feed):
+        inicio, fin = limites_mes(mes)
+        if fin <= desde or inicio >= hasta:
+            continue
+        datos = abrir_mes(feed, mes)
+        if datos is None:
+            continue
+        ts = datos['timestamps']
+        columnas = (ts >= t0) & (ts < t1)
+        if columnas.any():
+            yield datos, columnas
+
+
+def serie_estacion(estacion, desde, hasta):
+    """(timestamps epoch, bicis, anclajes) archivados de una estación en [desde, hasta), sin huecos."""
+    partes = []
+    if estacion.feed_id is not None:
+        for datos, columnas in _tramos(estacion.feed, desde, hasta):
+            i = np.searchsorted(datos['estaciones'], estacion.id_externo)
+            if i >= len(datos['estaciones']) or datos['estaciones'][i] != estacion.id_externo:
+                continue
+            b, a = datos['bicis'][i][columnas], datos['anclajes'][i][columnas]
+            ok = b != SIN_DATO
+            partes.append((datos['timestamps'][columnas][ok], b[ok], a[ok]))
+    if not partes:
+        vacio = np.empty(0, dtype=np.int64)
+        return vacio, vacio, vacio
+    return tuple(np.concatenate(col) for col in zip(*partes))
+
+
+def resumen_estaciones(desde, hasta, horas_excluidas=None):
+    """
+    {id_externo: [lecturas, veces sin bicis, veces sin anclajes]} de todo el archivo en [desde, hasta).
+    horas_excluidas: rango de horas locales a descartar (p. ej. range(0, 6) para la noche).
+    """
+    resumen = {}
+    for feed in Feed.objects.all():
+        for datos, columnas in _tramos(feed, desde, hasta):
+            if horas_excluidas is not None:
+                hora = (datos['minuto_semana'] % 1440) // 60
+                columnas = columnas & ~np.isin(hora, list(horas_excluidas))
+            bicis, anclajes = datos['bicis'][:, columnas], datos['anclajes'][:, columnas]
+            validas = bicis != SIN_DATO
+            totales = np.stack([validas.sum(axis=1), ((bicis == 0) & validas).sum(axis=1), ((anclajes == 0) & validas).sum(axis=1)], axis=1)
+            for eid, fila in zip(datos['estaciones'].tolist(), totales.tolist()):
+                if fila[0]:
+                    acumulado = resumen.setdefault(eid, [0, 0, 0])
+                    for k in range(3):
+                        acumulado[k] += fila[k]
+    return resumen
@@ -0,0 +1,69 @@
+"""
+Agrupación de peticiones iguales para endpoints muy pedidos (radar_carga).
+
+- cuantizar(): lleva unas coordenadas a su celda de una rejilla de `metros` de lado (la misma
+  cuadrícula que zonas, con la latitud del punto como referencia), de modo que usuarios
+  cercanos comparten clave.
+- version_capturas(): id de la última Captura, consultado como mucho cada VERSION_TTL segundos
+  por proceso. Va en la clave de caché, así que un resultado vale hasta la siguiente captura.
+- calcular_una_vez(): caché + single-flight. Si varias peticiones del mismo proceso piden a la
+  vez una clave que no está en caché, solo una la calcula y el resto espera su resultado.
+Con esto el trabajo en base crece con el número de celdas activas, no con el de usuarios.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models import Max
+
+from .models import Captura
+from .zonas import celda_en, tamano_celda_en
+
+VERSION_TTL = 5
+# Si el cálculo en curso tarda más que esto, quien espera calcula por su cuenta
+ESPERA_MAXIMA = 10
+
+_version = {'instante': None, 'valor': None}
+_en_curso = {}
+_cerrojo = threading.Lock()
+
+
+def cuantizar(lat, lon, metros):
+    """(fila, columna, lat centro, lon centro) de la celda que contiene el punto"""
+    dlat, dlon = tamano_celda_en(lat, metros)
+    fila, columna = celda_en(lat, metros, lat, lon)
+    return fila, columna, (fila + 0.5) * dlat, (columna + 0.5) * dlon
+
+
+def version_capturas():
+    ahora = time.monotonic()
+    if _version['instante'] is None or ahora - _version['instante'] > VERSION_TTL:
+        _version['valor'] = Captura.objects.aggregate(m=Max('id'))['m']
+        _version['instante'] = ahora
+    return _version['valor']
+
+
+def calcular_una_vez(clave, calcular, timeout):
+    valor = cache.get(clave)
+    if valor is not None:
+        return valor
+
+    with _cerrojo:
+        evento = _en_curso.get(clave)
+        lider = evento is None
+        if lider:
+            evento = _en_curso[clave] = threading.Event()
+
+    if not lider:
+        evento.wait(ESPERA_MAXIMA)
+        valor = cache.get(clave)
+        return valor if valor is not None else calcular()
+
+    try:
+        valor = calcular()
+        cache.set(clave, valor, timeout)
+        return valor
+    finally:
+        with _cerrojo:
+            _en_curso.pop(clave, None)
+        evento.set()
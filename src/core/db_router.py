@@ -0,0 +1,90 @@
+"""
+Enrutado de lecturas a la réplica.
+
+Solo las vistas marcadas con @lectura_en_replica leen de la base 'replica' (si está definida);
+la ingesta, el admin y cualquier escritura van siempre a 'default'. Si la réplica se queda atrás
+más de REPLICA_MAX_LAG segundos (o no responde) se vuelve a leer del primario.
+"""
+import contextvars
+import functools
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+REPLICA = 'replica'
+PRIMARIA = 'default'
+
+_usar_replica = contextvars.ContextVar('usar_replica', default=False)
+
+# Estado de la última comprobación de retraso (por proceso): {'instante': monotonic, 'ok': bool}
+_estado_replica = {'instante': None, 'ok': False}
+
+
+def replica_configurada():
+    return REPLICA in settings.DATABASES
+
+
+def _ultima_captura(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT MAX(timestamp) FROM core_captura")
+        return cursor.fetchone()[0]
+
+
+def replica_al_dia():
+    """
+    Compara la última Captura de la réplica con la del primario. Es una consulta por índice
+    en cada base y el resultado se reutiliza durante REPLICA_CHECK_INTERVAL segundos.
+    Funciona igual con una réplica física que con otra instancia local cargada a mano.
+    """
+    ahora = time.monotonic()
+    intervalo = getattr(settings, 'REPLICA_CHECK_INTERVAL', 30)
+    if _estado_replica['instante'] is not None and ahora - _estado_replica['instante'] < intervalo:
+        return _estado_replica['ok']
+
+    try:
+        en_primaria = _ultima_captura(PRIMARIA)
+        en_replica = _ultima_captura(REPLICA)
+        if en_primaria is None:
+            ok = True
+        elif en_replica is None:
+            ok = False
+        else:
+            ok = (en_primaria - en_replica).total_seconds() <= getattr(settings, 'REPLICA_MAX_LAG', 300)
+    except DatabaseError:
+        ok = False
+
+    _estado_replica.update(instante=ahora, ok=ok)
+    return ok
+
+
+def lectura_en_replica(view):
+    """Decorador para vistas de solo lectura: sus consultas pueden ir a la réplica."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _usar_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _usar_replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Router de lecturas. Escrituras y migraciones van siempre al primario."""
+
+    def db_for_read(self, model, **hints):
+        if _usar_replica.get() and replica_configurada() and replica_al_dia():
+            return REPLICA
+        return PRIMARIA
+
+    def db_for_write(self, model, **hints):
+        return PRIMARIA
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Ambas bases contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación (o con la copia de los datos), nunca con migrate
+        return db == PRIMARIA
@@ -0,0 +1,70 @@
+"""
+Flujo de bicis por estación (salidas / llegadas) entre capturas consecutivas.
+
+Solo conocemos fotos del estado, así que el flujo es el cambio neto entre dos capturas:
+si una estación pierde 3 bicis y gana 1 en el mismo intervalo veremos 2 salidas.
+Es una cota inferior del movimiento real, suficiente para detectar desequilibrios.
+"""
+from django.db import connection
+
+from .models import FlujoEstacion, LecturaEstacion
+
+# Backfill del histórico con LAG: compara cada lectura con la anterior de la misma estación.
+# ON CONFLICT permite relanzarlo sin duplicar intervalos ya calculados en la ingesta.
+SQL_BACKFILL = """
+INSERT INTO core_flujoestacion (captura_id, estacion_id, salidas, llegadas, minutos)
+SELECT captura_id, estacion_id,
+       GREATEST(bicis_previas - bicis_disponibles, 0),
+       GREATEST(bicis_disponibles - bicis_previas, 0),
+       GREATEST(EXTRACT(EPOCH FROM (ts - ts_previo)) / 60, 0)::int
+FROM (
+    SELECT l.captura_id, l.estacion_id, l.bicis_disponibles, c.timestamp AS ts,
+           LAG(l.bicis_disponibles) OVER w AS bicis_previas,
+           LAG(c.timestamp) OVER w AS ts_previo
+    FROM core_lecturaestacion l
+    JOIN core_captura c ON c.id = l.captura_id
+    WHERE c.timestamp >= %s
+    WINDOW w AS (PARTITION BY l.estacion_id ORDER BY c.timestamp)
+) diffs
+WHERE bicis_previas IS NOT NULL
+ON CONFLICT (captura_id, estacion_id) DO NOTHING
+"""
+
+
+def registrar_flujos(captura, lecturas, captura_previa):
+    """
+    Calcula el flujo de la captura recién guardada frente a la anterior.
+    `lecturas` son las LecturaEstacion nuevas (ya en memoria); de la captura previa solo se leen
+    sus ~N filas por el índice único (captura, estacion): O(estaciones), sin recorrer el histórico.
+    """
+    if captura_previa is None or not lecturas:
+        return 0
+
+    previas = dict(
+        LecturaEstacion.objects.filter(captura=captura_previa).values_list('estacion_id', 'bicis_disponibles')
+    )
+    minutos = max(0, int((captura.timestamp - captura_previa.timestamp).total_seconds() // 60))
+
+    flujos = []
+    for lectura in lecturas:
+        antes = previas.get(lectura.estacion_id)
+        if antes is None:
+            continue
+        delta = lectura.bicis_disponibles - antes
+        flujos.append(FlujoEstacion(
+            captura=captura,
+            estacion_id=lectura.estacion_id,
+            salidas=max(-delta, 0),
+            llegadas=max(delta, 0),
+            minutos=minutos,
+        ))
+
+    FlujoEstacion.objects.bulk_create(flujos, ignore_conflicts=True)
+    return len(flujos)
+
+
+def backfill_flujos(desde):
+    """Rellena FlujoEstacion para todas las capturas desde `desde`. Devuelve filas insertadas."""
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_BACKFILL, [desde])
+        return cursor.rowcount
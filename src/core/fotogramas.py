@@ -0,0 +1,128 @@
+"""
+Viaje en el tiempo: estado de la red en cualquier instante a partir de fotogramas clave + deltas.
+
+En cada captura se guarda un FotogramaRed por feed:
+- clave: {id_estacion: [bicis, anclajes]} de todas las estaciones, cada DELTAS_POR_CLAVE capturas
+  (o si cambia más de la mitad de la red);
+- delta: solo las estaciones que cambian respecto a la captura anterior (null = desaparece).
+El estado en T es el último fotograma clave <= T más los deltas hasta T (como mucho
+DELTAS_POR_CLAVE - 1), y un rango [T1, T2] es el estado en T1 más los deltas siguientes.
+Los índices (feed, timestamp) y (feed, es_clave, timestamp) hacen que ambas cosas sean dos
+consultas por rango. Se rellena en la ingesta y, para el histórico, con `manage.py indexar_fotogramas`.
+"""
+from django.db import transaction
+
+from .models import Captura, FotogramaRed, LecturaEstacion
+
+# Con capturas cada 3 min, un fotograma clave por hora de día
+DELTAS_POR_CLAVE = 20
+
+
+def aplicar(estado, delta):
+    for estacion, valor in delta.items():
+        if valor is None:
+            estado.pop(estacion, None)
+        else:
+            estado[estacion] = valor
+
+
+def diferencia(anterior, actual):
+    delta = {e: v for e, v in actual.items() if anterior.get(e) != v}
+    delta.update({e: None for e in anterior.keys() - actual.keys()})
+    return delta
+
+
+def estado_en(feed, instante, incluido=True):
+    """
+    (timestamp, estado, deltas aplicados) de la red del feed en `instante` (o justo antes si
+    incluido=False). (None, {}, 0) si no hay fotogramas anteriores.
+    """
+    filtro = {'timestamp__lte': instante} if incluido else {'timestamp__lt': instante}
+    clave = FotogramaRed.objects.filter(feed=feed, es_clave=True, **filtro).order_by('-timestamp').first()
+    if clave is None:
+        return None, {}, 0
+    estado, timestamp, n = dict(clave.datos), clave.timestamp, 0
+    deltas = FotogramaRed.objects.filter(feed=feed, timestamp__gt=clave.timestamp, **filtro).order_by('timestamp')
+    for timestamp, datos in deltas.values_list('timestamp', 'datos'):
+        aplicar(estado, datos)
+        n += 1
+    return timestamp, estado, n
+
+
+def fotogramas_entre(feed, desde, hasta):
+    """(timestamp inicial, estado inicial, [(timestamp, delta), ...]) para reproducir [desde, hasta]."""
+    inicio, estado, _ = estado_en(feed, desde)
+    # Los fotogramas clave dentro del rango se mandan como delta frente al anterior: el cliente solo aplica deltas
+    siguientes = []
+    previo = dict(estado)
+    for timestamp, es_clave, datos in FotogramaRed.objects.filter(
+        feed=feed, timestamp__gt=inicio or desde, timestamp__lte=hasta
+    ).order_by('timestamp').values_list('timestamp', 'es_clave', 'datos'):
+        if es_clave:
+            delta = diferencia(previo, datos)
+            previo = dict(datos)
+        else:
+            delta = datos
+            aplicar(previo, datos)
+        siguientes.append((timestamp, delta))
+    if inicio is None and siguientes:
+        # Rango que empieza antes del primer fotograma: se arranca en el primero
+        inicio, primero = siguientes.pop(0)
+        estado = dict(primero)
+    return inicio, estado, siguientes
+
+
+def nuevo_fotograma(feed, timestamp, actual, anterior, deltas_previos):
+    """Fotograma clave o delta según cuántos deltas lleva la cadena y cuánto ha cambiado la red."""
+    delta = diferencia(anterior, actual) if anterior is not None else None
+    if delta is None or deltas_previos >= DELTAS_POR_CLAVE - 1 or len(delta) > len(actual) // 2:
+        return FotogramaRed(feed=feed, timestamp=timestamp, es_clave=True, datos=actual)
+    return FotogramaRed(feed=feed, timestamp=timestamp, es_clave=False, datos=delta)
+
+
+def registrar_fotograma(captura, lecturas):
+    """Guarda el fotograma de la captura a partir de las lecturas en memoria. Devuelve el FotogramaRed."""
+    if captura.feed_id is None or not lecturas:
+        return None
+    actual = {str(l.estacion_id): [l.bicis_disponibles, l.anclajes_libres] for l in lecturas}
+    previo, anterior, n = estado_en(captura.feed, captura.timestamp, incluido=False)
+    fotograma = nuevo_fotograma(captura.feed, captura.timestamp, actual, anterior if previo else None, n)
+    FotogramaRed.objects.bulk_create([fotograma], ignore_conflicts=True)
+    return fotograma
+
+
+def indexar_feed(feed, desde):
+    """
+    Rehace los fotogramas del feed desde `desde` recorriendo sus capturas en orden (para el
+    histórico anterior a este índice). Devuelve (fotogramas, de ellos clave).
+    Solo se reescribe desde la primera captura viva: los fotogramas de periodos ya purgados
+    no se pueden rehacer y se conservan.
+    """
+    capturas = list(Captura.objects.filter(feed=feed, timestamp__gte=desde, lecturas__isnull=False).distinct().order_by('timestamp').values_list('id', 'timestamp'))
+    if not capturas:
+        return 0, 0
+    desde = max(desde, capturas[0][1])
+    total = claves = 0
+    with transaction.atomic():
+        FotogramaRed.objects.filter(feed=feed, timestamp__gte=desde).delete()
+        previo, anterior, n = estado_en(feed, desde, incluido=False)
+        anterior = anterior if previo else None
+        lote = []
+        # Por bloques de capturas para no traer todo el histórico de lecturas a memoria
+        for i in range(0, len(capturas), 200):
+            bloque = capturas[i:i + 200]
+            por_captura = {cid: {} for cid, _ in bloque}
+            for cid, eid, b, a in LecturaEstacion.objects.filter(captura_id__in=list(por_captura)).values_list(
+                'captura_id', 'estacion_id', 'bicis_disponibles', 'anclajes_libres'
+            ).iterator(chunk_size=5000):
+                por_captura[cid][str(eid)] = [b, a]
+            for cid, timestamp in bloque:
+                fotograma = nuevo_fotograma(feed, timestamp, por_captura[cid], anterior, n)
+                n = 0 if fotograma.es_clave else n + 1
+                claves += fotograma.es_clave
+                anterior = por_captura[cid]
+                lote.append(fotograma)
+            FotogramaRed.objects.bulk_create(lote, ignore_conflicts=True)
+            total += len(lote)
+            lote = []
+    return total, claves
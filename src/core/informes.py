@@ -0,0 +1,206 @@
+"""
+Informe mensual de fiabilidad por estación.
+
+Cada estación se analiza de forma independiente (pensado para un pool de procesos, ver el
+comando informe_fiabilidad): se leen sus lecturas del mes (archivo frío + base con un cursor
+de servidor), se ponderan por el tiempo hasta la siguiente lectura y con NumPy se calculan
+disponibilidad, tiempo vacía/llena por franja horaria, episodios y percentiles.
+
+Salida en INFORMES_DIR/<AAAA-MM>/:
+- estacion-<id>.json / .html: resultado de cada estación (el .json marca la estación como hecha).
+- resumen.csv, franjas.csv, episodios.csv e index.html: consolidado de todas las estaciones.
+"""
+import csv
+import datetime
+import io
+import json
+import os
+
+import numpy as np
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import archivo
+from .models import Estacion, LecturaEstacion
+from .publicacion import escribir_atomico
+
+# Un hueco entre lecturas mayor que esto no se cuenta entero (caída de la ingesta)
+MAX_HUECO = 20 * 60
+FRANJAS_HORARIAS = [
+    (0, 6, 'Madrugada'),
+    (6, 10, 'Mañana (punta)'),
+    (10, 14, 'Mediodía'),
+    (14, 17, 'Tarde'),
+    (17, 21, 'Tarde (punta)'),
+    (21, 24, 'Noche'),
+]
+PEORES_EPISODIOS = 5
+
+
+def directorio_mes(mes):
+    return os.path.join(settings.INFORMES_DIR, f"{mes:%Y-%m}")
+
+
+# --- CÁLCULO ---
+
+def cargar_lecturas(estacion, inicio, fin):
+    """(timestamps epoch, bicis, anclajes) del mes ordenados: primero lo archivado y luego la base."""
+    ts_a, bicis_a, anclajes_a = archivo.serie_estacion(estacion, inicio, fin)
+    # .iterator() usa un cursor de servidor en PostgreSQL: las filas llegan por bloques
+    filas = LecturaEstacion.objects.filter(
+        estacion=estacion, captura__timestamp__gte=inicio, captura__timestamp__lt=fin
+    ).order_by('captura__timestamp').values_list('captura__timestamp', 'bicis_disponibles', 'anclajes_libres').iterator(chunk_size=5000)
+    ts_b, bicis_b, anclajes_b = [], [], []
+    for ts, b, a in filas:
+        ts_b.append(int(ts.timestamp()))
+        bicis_b.append(b)
+        anclajes_b.append(a)
+    return (
+        np.concatenate([ts_a, np.array(ts_b, dtype=np.int64)]),
+        np.concatenate([bicis_a, np.array(bicis_b, dtype=np.int64)]),
+        np.concatenate([anclajes_a, np.array(anclajes_b, dtype=np.int64)]),
+    )
+
+
+def horas_locales(ts):
+    """Hora local de cada timestamp. El desfase se calcula una vez por hora UTC del rango (cambios de horario incluidos)."""
+    origen = ts.min() - ts.min() % 3600
+    rejilla = range(int(origen), int(ts.max()) + 3600, 3600)
+    desfases = np.array([
+        timezone.localtime(datetime.datetime.fromtimestamp(h, tz=datetime.timezone.utc)).utcoffset().total_seconds()
+        for h in rejilla
+    ], dtype=np.int64)
+    locales = ts + desfases[(ts - origen) // 3600]
+    return (locales // 3600) % 24
+
+
+def episodios(mascara, acumulado):
+    """Rachas consecutivas donde `mascara` es cierta: (índice inicio, índice fin exclusivo, segundos)."""
+    bordes = np.diff(np.concatenate(([0], mascara.astype(np.int8), [0])))
+    inicios = np.flatnonzero(bordes == 1)
+    finales = np.flatnonzero(bordes == -1)
+    return inicios, finales, acumulado[finales] - acumulado[inicios]
+
+
+def analizar_estacion(estacion, mes):
+    inicio, fin = archivo.limites_mes(mes)
+    ts, bicis, anclajes = cargar_lecturas(estacion, inicio, fin)
+    resultado = {
+        'id': estacion.id_externo,
+        'nombre': estacion.nombre,
+        'feed': estacion.feed.slug if estacion.feed_id else None,
+        'mes': f"{mes:%Y-%m}",
+        'lecturas': int(len(ts)),
+    }
+    if len(ts) == 0:
+        return resultado
+
+    # Cada lectura vale el tiempo hasta la siguiente (la última, hasta fin de mes), con tope MAX_HUECO
+    siguiente = np.append(ts[1:], int(fin.timestamp()))
+    dt = np.minimum(siguiente - ts, MAX_HUECO).astype(np.float64)
+    total = dt.sum()
+    vacia, llena = bicis == 0, anclajes == 0
+    hora = horas_locales(ts)
+
+    franjas = []
+    for desde, hasta, nombre in FRANJAS_HORARIAS:
+        en_franja = (hora >= desde) & (hora < hasta)
+        segundos = dt[en_franja].sum()
+        franjas.append({
+            'franja': nombre,
+            'horas': round(segundos / 3600, 1),
+            'pct_vacia': round(100 * dt[en_franja & vacia].sum() / segundos, 1) if segundos else None,
+            'pct_llena': round(100 * dt[en_franja & llena].sum() / segundos, 1) if segundos else None,
+        })
+
+    acumulado = np.concatenate(([0.0], np.cumsum(dt)))
+    todos = []
+    resumen_episodios = {}
+    for tipo, mascara in (('vacia', vacia), ('llena', llena)):
+        ini, fin_ep, segundos = episodios(mascara, acumulado)
+        minutos = segundos / 60
+        resumen_episodios[tipo] = {
+            'n': int(len(ini)),
+            'mediana_min': round(float(np.median(minutos)), 1) if len(ini) else None,
+            'p90_min': round(float(np.percentile(minutos, 90)), 1) if len(ini) else None,
+        }
+        for i, f, m in zip(ini.tolist(), fin_ep.tolist(), minutos.tolist()):
+            todos.append((m, tipo, ts[i], ts[f - 1] + dt[f - 1]))
+    todos.sort(reverse=True)
+
+    def local(epoch):
+        return timezone.localtime(datetime.datetime.fromtimestamp(int(epoch), tz=datetime.timezone.utc)).strftime('%d/%m %H:%M')
+
+    p10, p50, p90 = np.percentile(bicis, [10, 50, 90])
+    resultado.update({
+        'horas_observadas': round(total / 3600, 1),
+        'pct_disponible': round(100 * dt[~vacia & ~llena].sum() / total, 1),
+        'pct_vacia': round(100 * dt[vacia].sum() / total, 1),
+        'pct_llena': round(100 * dt[llena].sum() / total, 1),
+        'bicis_p10': float(p10), 'bicis_p50': float(p50), 'bicis_p90': float(p90),
+        'franjas': franjas,
+        'episodios': resumen_episodios,
+        'peores': [
+            {'tipo': tipo, 'inicio': local(a), 'fin': local(b), 'minutos': round(m)}
+            for m, tipo, a, b in todos[:PEORES_EPISODIOS]
+        ],
+    })
+    return resultado
+
+# --- SALIDA ---
+
+def ruta_estacion(mes, estacion_id):
+    return os.path.join(directorio_mes(mes), f"estacion-{estacion_id}")
+
+
+def generar_estacion(estacion_id, mes):
+    """Tarea de un proceso del pool: analiza y escribe .html y .json (este último al final)."""
+    estacion = Estacion.objects.select_related('feed').get(pk=estacion_id)
+    resultado = analizar_estacion(estacion, mes)
+    ruta = ruta_estacion(mes, estacion_id)
+    escribir_atomico(f"{ruta}.html", render_to_string('core/informes/estacion.html', {'r': resultado}).encode())
+    escribir_atomico(f"{ruta}.json", json.dumps(resultado, ensure_ascii=False).encode())
+    return resultado
+
+
+def consolidar(mes):
+    """Une los .json de todas las estaciones del mes en los CSV y el índice HTML."""
+    directorio = directorio_mes(mes)
+    resultados = []
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.startswith('estacion-') and nombre.endswith('.json'):
+            with open(os.path.join(directorio, nombre), encoding='utf-8') as f:
+                resultados.append(json.load(f))
+    resultados = [r for r in resultados if r.get('lecturas')]
+    resultados.sort(key=lambda r: r['pct_disponible'])
+
+    def tabla(cabecera, filas):
+        salida = io.StringIO()
+        escritor = csv.writer(salida)
+        escritor.writerow(cabecera)
+        escritor.writerows(filas)
+        return salida.getvalue().encode()
+
+    escribir_atomico(os.path.join(directorio, 'resumen.csv'), tabla(
+        ['id', 'nombre', 'feed', 'lecturas', 'horas_observadas', 'pct_disponible', 'pct_vacia', 'pct_llena',
+         'bicis_p10', 'bicis_p50', 'bicis_p90', 'episodios_vacia', 'mediana_vacia_min', 'p90_vacia_min',
+         'episodios_llena', 'mediana_llena_min', 'p90_llena_min'],
+        [[r['id'], r['nombre'], r['feed'], r['lecturas'], r['horas_observadas'], r['pct_disponible'], r['pct_vacia'], r['pct_llena'],
+          r['bicis_p10'], r['bicis_p50'], r['bicis_p90'],
+          r['episodios']['vacia']['n'], r['episodios']['vacia']['mediana_min'], r['episodios']['vacia']['p90_min'],
+          r['episodios']['llena']['n'], r['episodios']['llena']['mediana_min'], r['episodios']['llena']['p90_min']]
+         for r in resultados],
+    ))
+    escribir_atomico(os.path.join(directorio, 'franjas.csv'), tabla(
+        ['id', 'nombre', 'franja', 'horas', 'pct_vacia', 'pct_llena'],
+        [[r['id'], r['nombre'], f['franja'], f['horas'], f['pct_vacia'], f['pct_llena']] for r in resultados for f in r['franjas']],
+    ))
+    escribir_atomico(os.path.join(directorio, 'episodios.csv'), tabla(
+        ['id', 'nombre', 'tipo', 'inicio', 'fin', 'minutos'],
+        [[r['id'], r['nombre'], e['tipo'], e['inicio'], e['fin'], e['minutos']] for r in resultados for e in r['peores']],
+    ))
+    escribir_atomico(os.path.join(directorio, 'index.html'), render_to_string('core/informes/indice.html', {
+        'mes': f"{mes:%Y-%m}", 'resultados': resultados, 'generado': timezone.localtime(),
+    }).encode())
+    return len(resultados)
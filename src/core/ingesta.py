@@ -0,0 +1,220 @@
+"""
+Ingesta multi-feed.
+
+1. Descarga (asyncio): estado, información (GBFS) y meteo de todos los feeds a la vez, con un
+   semáforo que limita las peticiones simultáneas. El tiempo total ≈ el del feed más lento.
+2. Normalización: cada tipo de feed se traduce a registros comunes
+   {codigo, nombre, lat, lon, bicis, anclajes, direccion}.
+3. Escritura (síncrona, una transacción por feed): Captura + estaciones nuevas + LecturaEstacion en bloque.
+
+Las URLs vienen del modelo Feed y la de Open-Meteo de settings.OPEN_METEO_URL, así que todo
+se puede apuntar a servidores locales con datos de prueba.
+"""
+import asyncio
+import datetime
+
+import holidays
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Captura, Estacion, LecturaEstacion
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+# Además del tiempo actual pedimos el pronóstico horario (UTC) para las predicciones de 24h
+PARAMS_METEO = {
+    'current': 'temperature_2m,wind_speed_10m,precipitation,weather_code',
+    'hourly': 'temperature_2m,wind_speed_10m,precipitation,weather_code',
+    'forecast_days': 2,
+    'timezone': 'GMT',
+    'wind_speed_unit': 'kmh',
+}
+METEO_POR_DEFECTO = (0.0, 0.0, 0.0, 0)
+
+# --- 1. DESCARGA CONCURRENTE ---
+
+async def _get_json(url, semaforo, params=None):
+    """requests es bloqueante: cada petición va a un hilo, pero el semáforo limita cuántas a la vez."""
+    async with semaforo:
+        r = await asyncio.to_thread(requests.get, url, params=params, headers=HEADERS, timeout=settings.INGESTA_TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+
+
+async def descargar_feed(feed, semaforo):
+    """Estado, info y meteo de un feed en paralelo. Los errores se devuelven, no se lanzan."""
+    peticiones = {
+        'estado': _get_json(feed.url_estado, semaforo),
+        'meteo': _get_json(settings.OPEN_METEO_URL, semaforo, {**PARAMS_METEO, 'latitude': feed.latitud, 'longitude': feed.longitud}),
+    }
+    if feed.url_info:
+        peticiones['info'] = _get_json(feed.url_info, semaforo)
+
+    respuestas = await asyncio.gather(*peticiones.values(), return_exceptions=True)
+    resultado = {'feed': feed, 'estado': None, 'info': None, 'meteo': None, 'errores': {}}
+    for clave, respuesta in zip(peticiones, respuestas):
+        if isinstance(respuesta, Exception):
+            resultado['errores'][clave] = respuesta
+        else:
+            resultado[clave] = respuesta
+    return resultado
+
+
+async def descargar_todos(feeds, concurrencia=None):
+    semaforo = asyncio.Semaphore(concurrencia or settings.INGESTA_CONCURRENCIA)
+    return await asyncio.gather(*(descargar_feed(feed, semaforo) for feed in feeds))
+
+# --- 2. NORMALIZACIÓN ---
+
+def normalizar_zaragoza(estado, info=None):
+    registros = []
+    for item in estado.get('result', []):
+        coords = item.get('geometry', {}).get('coordinates', [0, 0])
+        registros.append({
+            'codigo': str(item.get('id')),
+            'nombre': item.get('title', 'Desconocido'),
+            'lat': coords[1],
+            'lon': coords[0],
+            'bicis': int(item.get('bicisDisponibles', 0)),
+            'anclajes': int(item.get('anclajesDisponibles', 0)),
+            'direccion': None,
+        })
+    return registros
+
+
+def normalizar_gbfs(estado, info=None):
+    """GBFS v2/v3: station_status aporta la ocupación y station_information los metadatos."""
+    metadatos = {str(s.get('station_id')): s for s in (info or {}).get('data', {}).get('stations', [])}
+    registros = []
+    for s in estado.get('data', {}).get('stations', []):
+        codigo = str(s.get('station_id'))
+        meta = metadatos.get(codigo, {})
+        nombre = meta.get('name', 'Desconocido')
+        if isinstance(nombre, list):  # GBFS v3: [{'text': ..., 'language': ...}]
+            nombre = nombre[0].get('text', 'Desconocido') if nombre else 'Desconocido'
+        registros.append({
+            'codigo': codigo,
+            'nombre': nombre,
+            'lat': meta.get('lat', 0),
+            'lon': meta.get('lon', 0),
+            'bicis': int(s.get('num_bikes_available', s.get('num_vehicles_available', 0)) or 0),
+            'anclajes': int(s.get('num_docks_available', 0) or 0),
+            'direccion': meta.get('address'),
+        })
+    return registros
+
+
+NORMALIZADORES = {
+    'ZGZ': normalizar_zaragoza,
+    'GBFS': normalizar_gbfs,
+}
+
+
+def parsear_meteo(data):
+    """Devuelve (actual, pronostico) a partir de la respuesta de Open-Meteo."""
+    if not data:
+        return METEO_POR_DEFECTO, {}
+    current = data.get('current', {})
+    actual = (
+        current.get('temperature_2m', 0.0),
+        current.get('wind_speed_10m', 0.0),
+        current.get('precipitation', 0.0),
+        current.get('weather_code', 0),
+    )
+
+    hourly = data.get('hourly', {})
+    pronostico = {}
+    columnas = zip(
+        hourly.get('time', []),
+        hourly.get('temperature_2m', []),
+        hourly.get('wind_speed_10m', []),
+        hourly.get('precipitation', []),
+        hourly.get('weather_code', []),
+    )
+    for hora, t, v, p, w in columnas:
+        if None in (t, v, p, w):
+            continue
+        instante = datetime.datetime.fromisoformat(hora).replace(tzinfo=datetime.timezone.utc)
+        pronostico[instante] = (t, v, p, w)
+    return actual, pronostico
+
+# --- 3. ESCRITURA ---
+
+def resolver_estaciones(feed, registros):
+    """
+    Devuelve ({codigo: Estacion}, nº de nuevas) creando en bloque las que falten.
+    Zaragoza conserva su ID oficial como id_externo; el resto de feeds recibe
+    prefijo + n (prefijo por defecto: id del feed x 100000) para no colisionar.
+    """
+    existentes = {e.codigo_feed: e for e in Estacion.objects.filter(feed=feed)}
+    nuevas = []
+    if feed.tipo == 'ZGZ':
+        siguiente_id = None
+    else:
+        base = feed.prefijo_ids or feed.pk * 100000
+        ultimo = Estacion.objects.filter(feed=feed).aggregate(m=Max('id_externo'))['m']
+        siguiente_id = max(base, ultimo or base) + 1
+
+    for r in registros:
+        if r['codigo'] in existentes:
+            continue
+        if siguiente_id is None:
+            id_externo = feed.prefijo_ids + int(r['codigo'])
+        else:
+            id_externo, siguiente_id = siguiente_id, siguiente_id + 1
+        estacion = Estacion(
+            id_externo=id_externo,
+            feed=feed,
+            codigo_feed=r['codigo'],
+            nombre=r['nombre'],
+            direccion=r['direccion'],
+            latitud=r['lat'],
+            longitud=r['lon'],
+            capacidad_total=r['bicis'] + r['anclajes'],
+        )
+        existentes[r['codigo']] = estacion
+        nuevas.append(estacion)
+
+    Estacion.objects.bulk_create(nuevas)
+    return existentes, len(nuevas)
+
+
+def guardar_snapshot(feed, instante, registros, meteo):
+    """
+    Crea la Captura del feed y sus lecturas en una transacción.
+    Devuelve (captura, lecturas, captura_previa); la previa sirve para los cálculos incrementales.
+    """
+    temp, viento, lluvia, wmo_code = meteo
+    # Un feed que repite una estación en la misma respuesta violaría unique_lectura_por_captura
+    registros = list({r['codigo']: r for r in registros}.values())
+    local = timezone.localtime(instante)
+    festivos = holidays.country_holidays(feed.pais, subdiv=feed.subdivision or None)
+
+    captura_previa = Captura.objects.filter(feed=feed, timestamp__lt=instante, lecturas__isnull=False).order_by('-timestamp').first()
+    with transaction.atomic():
+        captura = Captura.objects.create(
+            feed=feed,
+            timestamp=instante,
+            temperatura=temp,
+            viento_kmh=viento,
+            precipitacion=lluvia,
+            codigo_clima=wmo_code,
+            es_festivo=local.date() in festivos,
+            es_fin_semana=local.weekday() >= 5,
+        )
+        estaciones, _ = resolver_estaciones(feed, registros)
+        lecturas = [
+            LecturaEstacion(
+                captura=captura,
+                estacion=estaciones[r['codigo']],
+                bicis_disponibles=r['bicis'],
+                anclajes_libres=r['anclajes'],
+            )
+            for r in registros
+        ]
+        LecturaEstacion.objects.bulk_create(lecturas)
+    return captura, lecturas, captura_previa
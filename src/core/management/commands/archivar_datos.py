@@ -0,0 +1,59 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.archivo import exportar_mes, limites_mes, mes_de, mes_siguiente, meses_archivados, primera_viva, ruta_mes
+from core.models import Feed
+
+
+class Command(BaseCommand):
+    help = 'Exporta los meses completos de Captura + LecturaEstacion al archivo frío (.npy) antes de purgarlos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--feed', action='append', help='Slug del feed a archivar (repetible). Por defecto todos.')
+        parser.add_argument('--mes', help='Mes concreto a exportar (AAAA-MM). Por defecto, todos los pendientes.')
+        parser.add_argument('--forzar', action='store_true', help='Reescribe meses ya archivados.')
+
+    def handle(self, *args, **options):
+        feeds = Feed.objects.order_by('id')
+        if options['feed']:
+            feeds = feeds.filter(slug__in=options['feed'])
+
+        mes_actual = mes_de(timezone.now())
+        mes_pedido = None
+        if options['mes']:
+            try:
+                mes_pedido = datetime.datetime.strptime(options['mes'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--mes debe tener el formato AAAA-MM")
+            if mes_pedido >= mes_actual:
+                raise CommandError("Solo se archivan meses ya terminados")
+
+        total = 0
+        for feed in feeds:
+            archivados = set(meses_archivados(feed))
+            if mes_pedido:
+                pendientes = [mes_pedido]
+            else:
+                primera = primera_viva(feed)
+                pendientes = []
+                mes = mes_de(primera) if primera else mes_actual
+                while mes < mes_actual:
+                    pendientes.append(mes)
+                    mes = mes_siguiente(mes)
+
+            for mes in pendientes:
+                if mes in archivados and not options['forzar']:
+                    continue
+                # Un mes archivado y ya purgado (aunque sea en parte) no se puede reconstruir desde la base
+                viva = primera_viva(feed)
+                if mes in archivados and (viva is None or viva >= limites_mes(mes)[0]):
+                    self.stdout.write(self.style.WARNING(f"[{feed.slug}] {mes:%Y-%m}: la base ya no tiene el mes completo, se conserva el archivo."))
+                    continue
+                n_capturas, n_lecturas = exportar_mes(feed, mes)
+                if n_capturas:
+                    total += 1
+                    self.stdout.write(f"[{feed.slug}] {mes:%Y-%m}: {n_capturas} capturas, {n_lecturas} lecturas -> {ruta_mes(feed, mes)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Archivo al día. Meses exportados: {total}."))
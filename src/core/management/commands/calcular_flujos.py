@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from core.flujos import backfill_flujos
+
+class Command(BaseCommand):
+    help = 'Rellena la tabla de flujos (salidas/llegadas) del histórico con una única consulta LAG en SQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=30,
+            help='Días de histórico a recalcular (por defecto 30).',
+        )
+
+    def handle(self, *args, **options):
+        desde = timezone.now() - timedelta(days=options['dias'])
+        self.stdout.write(f"Calculando flujos desde {desde}...")
+        insertadas = backfill_flujos(desde)
+        self.stdout.write(self.style.SUCCESS(f"Hecho. {insertadas} intervalos nuevos (los existentes se conservan)."))
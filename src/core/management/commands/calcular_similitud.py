@@ -0,0 +1,28 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import Feed
+from core.similitud import calcular_similitud
+
+class Command(BaseCommand):
+    help = 'Calcula el perfil semanal de cada estación, sus grupos de uso (k-means) y sus estaciones más parecidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Días de histórico para los perfiles (por defecto 30).')
+        parser.add_argument('--grupos', type=int, default=6, help='Número de grupos de k-means (por defecto 6).')
+        parser.add_argument('--vecinos', type=int, default=5, help='Estaciones similares guardadas por estación (por defecto 5).')
+        parser.add_argument('--min-muestras', type=int, default=200, help='Lecturas mínimas para calcular el perfil (por defecto 200).')
+
+    def handle(self, *args, **options):
+        desde = timezone.now() - timedelta(days=options['dias'])
+        for feed in Feed.objects.filter(activo=True).order_by('id'):
+            inicio = time.monotonic()
+            total = calcular_similitud(
+                feed, desde,
+                grupos=options['grupos'], vecinos=options['vecinos'], minimo_muestras=options['min_muestras'],
+            )
+            if total:
+                self.stdout.write(self.style.SUCCESS(f"[{feed.slug}] {total} perfiles en {time.monotonic() - inicio:.1f}s."))
+            else:
+                self.stdout.write(self.style.WARNING(f"[{feed.slug}] Sin histórico suficiente para calcular perfiles."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from core.models import Feed
+from core.zonas import backfill_zonas
+
+class Command(BaseCommand):
+    help = 'Asigna las estaciones a las zonas de la rejilla y rellena las series por zona del histórico'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=30,
+            help='Días de histórico a agregar (por defecto 30).',
+        )
+        parser.add_argument('--feed', action='append', help='Slug del feed (repetible). Por defecto todos.')
+
+    def handle(self, *args, **options):
+        desde = timezone.now() - timedelta(days=options['dias'])
+        feeds = Feed.objects.order_by('id')
+        if options['feed']:
+            feeds = feeds.filter(slug__in=options['feed'])
+
+        for feed in feeds:
+            self.stdout.write(f"[{feed.slug}] Calculando zonas desde {desde}...")
+            insertadas = backfill_zonas(feed, desde)
+            self.stdout.write(self.style.SUCCESS(f"[{feed.slug}] Hecho. {insertadas} filas nuevas de serie por zona (las que ya existían se conservan)."))
@@ -1,104 +1,130 @@
-import requests
-import holidays  # <--- IMPORTANTE: La librería de festivos
+import asyncio
+import time
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from core.models import Captura, Estacion, LecturaEstacion 
+from core.models import Feed
+from core.ingesta import NORMALIZADORES, descargar_todos, guardar_snapshot, parsear_meteo
+from core.anomalias import detectar_anomalias
+from core.flujos import registrar_flujos
+from core.fotogramas import registrar_fotograma
+from core.predictor import generar_predicciones
+from core.publicacion import publicar_feed
+from core.zonas import registrar_zonas
 
 class Command(BaseCommand):
-    help = 'Crea una Captura con datos de clima y festivos, y guarda el estado de las estaciones'
+    help = 'Crea una Captura por feed activo (clima + festivos) y guarda el estado de sus estaciones'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--feed',
+            action='append',
+            dest='feeds',
+            help='Slug del feed a capturar (repetible). Por defecto, todos los activos.',
+        )
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=None,
+            help='Peticiones HTTP simultáneas como máximo (por defecto settings.INGESTA_CONCURRENCIA).',
+        )
+
+    def handle(self, *args, **options):
         now = timezone.now()
-        fecha_hoy = now.date() # Solo la fecha para comprobar festivos
         self.stdout.write(f"--- Iniciando Captura: {now} ---")
 
-        # 1. OBTENER CLIMA (Open-Meteo)
-        url_clima = "https://api.open-meteo.com/v1/forecast?latitude=41.6488&longitude=-0.8891&current=temperature_2m,wind_speed_10m,precipitation,weather_code&wind_speed_unit=kmh"
-        
+        feeds = Feed.objects.filter(activo=True)
+        if options['feeds']:
+            feeds = feeds.filter(slug__in=options['feeds'])
+        feeds = list(feeds)
+        if not feeds:
+            self.stdout.write(self.style.WARNING("No hay feeds activos que capturar."))
+            return
+
+        self.capturar(feeds, now, options['concurrencia'])
+
+    def capturar(self, feeds, now, concurrencia=None):
+        """
+        Descarga y guarda una captura de cada feed en el instante `now`.
+        Devuelve los segundos de cada fase {'descarga', 'escritura', 'post'} y las capturas guardadas
+        (lo usa también el banco de pruebas reproducir_capturas).
+        """
+        tiempos = {'descarga': 0.0, 'escritura': 0.0, 'post': 0.0, 'capturas': 0}
+
+        # 1. DESCARGA: todos los feeds (estado + info + meteo) a la vez
+        inicio = time.monotonic()
+        resultados = asyncio.run(descargar_todos(feeds, concurrencia))
+        tiempos['descarga'] = time.monotonic() - inicio
+        self.stdout.write(f"Descargados {len(feeds)} feeds en {tiempos['descarga']:.1f}s")
+
+        # 2. ESCRITURA: una transacción por feed
+        for res in resultados:
+            feed = res['feed']
+            if 'meteo' in res['errores']:
+                self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error clima: {res['errores']['meteo']}. Usando valores por defecto."))
+            if 'estado' in res['errores'] or 'info' in res['errores']:
+                error = res['errores'].get('estado') or res['errores'].get('info')
+                self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error descargando estaciones: {error}"))
+                continue
+
+            inicio = time.monotonic()
+            try:
+                registros = NORMALIZADORES[feed.tipo](res['estado'], res['info'])
+                meteo, pronostico = parsear_meteo(res['meteo'])
+                captura, lecturas, captura_previa = guardar_snapshot(feed, now, registros, meteo)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error guardando captura: {e}"))
+                continue
+            tiempos['escritura'] += time.monotonic() - inicio
+            tiempos['capturas'] += 1
+
+            tipo_dia = "FESTIVO" if captura.es_festivo else ("FINDE" if captura.es_fin_semana else "LABORABLE")
+            self.stdout.write(self.style.SUCCESS(
+                f"[{feed.slug}] Captura ({tipo_dia}). T: {captura.temperatura}°C, V: {captura.viento_kmh}km/h. "
+                f"Guardados {len(lecturas)} registros de estaciones."
+            ))
+            inicio = time.monotonic()
+            self.post_captura(feed, captura, lecturas, captura_previa, pronostico)
+            tiempos['post'] += time.monotonic() - inicio
+        return tiempos
+
+    def post_captura(self, feed, captura, lecturas, captura_previa, pronostico):
+        """Cálculos incrementales tras guardar la captura. Un fallo aquí no invalida la captura."""
+        # FLUJOS (salidas/llegadas frente a la captura anterior del mismo feed)
         try:
-            r = requests.get(url_clima)
-            r.raise_for_status()
-            data_clima = r.json().get('current', {})
-            
-            temp = data_clima.get('temperature_2m', 0.0)
-            viento = data_clima.get('wind_speed_10m', 0.0)
-            lluvia = data_clima.get('precipitation', 0.0)
-            wmo_code = data_clima.get('weather_code', 0)
+            registrar_flujos(captura, lecturas, captura_previa)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error flujos: {e}"))
 
+        # ZONAS (agregado por celda de la rejilla, desde las lecturas en memoria)
+        try:
+            registrar_zonas(captura, lecturas)
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error clima: {e}. Usando valores por defecto."))
-            temp, viento, lluvia, wmo_code = (0.0, 0.0, 0.0, 0)
-
-        # 2. CALCULAR CALENDARIO (Con librería 'holidays')
-        # Cargamos festivos de España (ES) y específicamente de Aragón (AR)
-        # Esto incluye: Navidad, Año Nuevo, Reyes, Pilar, San Jorge, etc.
-        es_festivos_aragon = holidays.ES(subdiv='AR')
-        
-        # Comprobamos si HOY es festivo en la lista
-        es_festivo = fecha_hoy in es_festivos_aragon
-        
-        # Fin de semana: 5=Sábado, 6=Domingo
-        es_fin_semana = now.weekday() >= 5
-
-        # 3. CREAR LA CAPTURA (PADRE)
+            self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error zonas: {e}"))
+
+        # FOTOGRAMAS DEL VIAJE EN EL TIEMPO (clave o delta frente a la captura anterior)
         try:
-            captura = Captura.objects.create(
-                timestamp=now,
-                temperatura=temp,
-                viento_kmh=viento,
-                precipitacion=lluvia,
-                codigo_clima=wmo_code,
-                es_fin_semana=es_fin_semana,
-                es_festivo=es_festivo
-            )
-            # Info extra para el log
-            tipo_dia = "FESTIVO" if es_festivo else ("FINDE" if es_fin_semana else "LABORABLE")
-            self.stdout.write(self.style.SUCCESS(f"Captura ({tipo_dia}). T: {temp}°C, V: {viento}km/h"))
-            
+            registrar_fotograma(captura, lecturas)
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error creando Captura: {e}"))
-            return
+            self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error fotogramas: {e}"))
 
-        # 4. OBTENER DATOS BIZI Y GUARDAR ESTADOS (HIJOS)
-        url_bizi = "https://www.zaragoza.es/sede/servicio/urbanismo-infraestructuras/estacion-bicicleta.json?rows=300"
-        headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
+        # ANOMALÍAS (estado incremental por estación, sin leer el histórico)
+        try:
+            nuevas = detectar_anomalias(captura, lecturas)
+            if nuevas:
+                self.stdout.write(self.style.WARNING(f"[{feed.slug}] {nuevas} alertas nuevas."))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error anomalías: {e}"))
 
+        # PREDICCIONES PRÓXIMAS 24H (solo si hay modelos entrenados)
         try:
-            r_bizi = requests.get(url_bizi, headers=headers)
-            r_bizi.raise_for_status()
-            items = r_bizi.json().get('result', [])
-
-            estados_a_crear = []
-            
-            for item in items:
-                eid = item.get('id')
-                coords = item.get('geometry', {}).get('coordinates', [0,0])
-
-                bicis = int(item.get('bicisDisponibles', 0))
-                anclajes = int(item.get('anclajesDisponibles', 0))
-                capacidad_calculada = bicis + anclajes
-                
-                estacion_obj, _ = Estacion.objects.get_or_create(
-                    id_externo=eid,
-                    defaults={
-                        'nombre': item.get('title', 'Desconocido'),
-                        'latitud': coords[1],
-                        'longitud': coords[0],
-                        'capacidad_total': capacidad_calculada
-                    }
-                )
-
-                estados_a_crear.append(LecturaEstacion(
-                    captura=captura,
-                    estacion=estacion_obj,
-                    bicis_disponibles=int(item.get('bicisDisponibles', 0)),
-                    anclajes_libres=int(item.get('anclajesDisponibles', 0))  # Cambiado aquí
-                ))
-
-            LecturaEstacion.objects.bulk_create(estados_a_crear)
-            self.stdout.write(self.style.SUCCESS(f"Guardados {len(estados_a_crear)} registros de estaciones."))
+            total = generar_predicciones(captura, pronostico)
+            if total:
+                self.stdout.write(f"[{feed.slug}] Predicciones actualizadas: {total} franjas.")
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error predicciones: {e}"))
 
+        # ARTEFACTOS ESTÁTICOS (JSON precomprimidos que sirve nginx)
+        try:
+            publicar_feed(feed, captura, lecturas)
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error Bizi: {e}"))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f"[{feed.slug}] Error publicando artefactos: {e}"))
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 from django.utils import timezone
-from core.models import Captura
+from core.archivo import limite_purgable
+from core.models import Captura, Feed
 from datetime import timedelta
 import time
 
@@ -30,6 +32,11 @@ class Command(BaseCommand):
             default=100,
             help='Cantidad de registros a borrar en cada transacción (por defecto 100).',
         )
+        parser.add_argument(
+            '--sin-archivo',
+            action='store_true',
+            help='Borra también los meses que no están en el archivo frío (se pierden para siempre).',
+        )
 
     def handle(self, *args, **options):
         days = options['days']
@@ -42,8 +49,20 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.WARNING(f"Buscando registros anteriores a: {cutoff_date}"))
 
+        # Solo se borra lo que ya está en el archivo frío (ver archivar_datos), salvo --sin-archivo
+        filtro = Q(timestamp__lt=cutoff_date)
+        if not options['sin_archivo']:
+            por_feed = Q(pk__in=[])
+            for feed in Feed.objects.all():
+                limite = limite_purgable(feed)
+                if limite is not None:
+                    por_feed |= Q(feed=feed, timestamp__lt=min(cutoff_date, limite))
+            filtro &= por_feed
+            if Captura.objects.filter(timestamp__lt=cutoff_date).exclude(filtro).exists():
+                self.stdout.write(self.style.WARNING("Hay capturas antiguas sin archivar que se conservan. Ejecuta 'archivar_datos' para incluirlas."))
+
         # Queryset total para contar
-        qs = Captura.objects.filter(timestamp__lt=cutoff_date)
+        qs = Captura.objects.filter(filtro)
         total_count = qs.count()
 
         if total_count == 0:
@@ -72,7 +91,7 @@ class Command(BaseCommand):
             # Seleccionamos un lote de IDs
             # Importante: Usamos list() para ejecutar la query y obtener los IDs concretos
             # De lo contrario el slice sobre un delete puede dar problemas en algunos backends o no ser eficiente
-            batch_ids = list(Captura.objects.filter(timestamp__lt=cutoff_date).values_list('id', flat=True)[:batch_size])
+            batch_ids = list(Captura.objects.filter(filtro).values_list('id', flat=True)[:batch_size])
             
             if not batch_ids:
                 break
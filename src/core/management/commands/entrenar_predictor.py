@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand
+from core.models import Captura
+from core.predictor import entrenar_modelos, generar_predicciones
+
+class Command(BaseCommand):
+    help = 'Entrena el modelo de predicción por estación (ridge sobre calendario + meteo) y regenera las predicciones de 24h'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=60,
+            help='Días de histórico usados para entrenar (por defecto 60).',
+        )
+        parser.add_argument(
+            '--min-muestras',
+            type=int,
+            default=200,
+            help='Lecturas mínimas para entrenar una estación (por defecto 200).',
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        self.stdout.write(f"Entrenando con los últimos {options['dias']} días de histórico...")
+
+        modelos = entrenar_modelos(dias=options['dias'], minimo_muestras=options['min_muestras'])
+        if not modelos:
+            self.stdout.write(self.style.WARNING("No hay histórico suficiente para entrenar ninguna estación."))
+            return
+
+        mae_medio = sum(m.mae_bicis for m in modelos) / len(modelos)
+        self.stdout.write(self.style.SUCCESS(
+            f"Entrenadas {len(modelos)} estaciones en {time.monotonic() - inicio:.1f}s. MAE medio (bicis): {mae_medio:.2f}"
+        ))
+
+        # Puntuamos ya con los modelos nuevos para no esperar a la siguiente captura
+        ultima = Captura.objects.filter(lecturas__isnull=False).order_by('-timestamp').first()
+        if ultima:
+            total = generar_predicciones(ultima)
+            self.stdout.write(f"Predicciones regeneradas: {total} franjas.")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from core.models import Feed
+from core.fotogramas import indexar_feed
+
+class Command(BaseCommand):
+    help = 'Rehace el índice de fotogramas (clave + deltas) del viaje en el tiempo a partir de las capturas guardadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=30,
+            help='Días de histórico a indexar (por defecto 30). Los fotogramas desde esa fecha (o desde la primera captura sin purgar) se reescriben.',
+        )
+        parser.add_argument('--feed', action='append', help='Slug del feed (repetible). Por defecto todos.')
+
+    def handle(self, *args, **options):
+        desde = timezone.now() - timedelta(days=options['dias'])
+        feeds = Feed.objects.order_by('id')
+        if options['feed']:
+            feeds = feeds.filter(slug__in=options['feed'])
+
+        for feed in feeds:
+            self.stdout.write(f"[{feed.slug}] Indexando fotogramas desde {desde}...")
+            total, claves = indexar_feed(feed, desde)
+            self.stdout.write(self.style.SUCCESS(f"[{feed.slug}] Hecho. {total} fotogramas ({claves} clave)."))
@@ -0,0 +1,66 @@
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from core.archivo import mes_de
+from core.informes import consolidar, directorio_mes, generar_estacion, ruta_estacion
+from core.models import Estacion
+
+
+class Command(BaseCommand):
+    help = 'Genera el informe mensual de fiabilidad por estación (HTML + CSV) repartiendo las estaciones en varios procesos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mes del informe (AAAA-MM). Por defecto, el mes anterior.')
+        parser.add_argument('--feed', action='append', help='Slug del feed (repetible). Por defecto todos.')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Procesos en paralelo (por defecto, uno por CPU).')
+        parser.add_argument('--forzar', action='store_true', help='Regenera también las estaciones ya hechas en una ejecución anterior.')
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                mes = datetime.datetime.strptime(options['mes'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--mes debe tener el formato AAAA-MM")
+        else:
+            actual = mes_de(timezone.now())
+            mes = (actual - datetime.timedelta(days=1)).replace(day=1)
+
+        estaciones = Estacion.objects.order_by('id_externo')
+        if options['feed']:
+            estaciones = estaciones.filter(feed__slug__in=options['feed'])
+        ids = list(estaciones.values_list('id_externo', flat=True))
+
+        os.makedirs(directorio_mes(mes), exist_ok=True)
+        # Reanudación: una estación está hecha cuando existe su .json (se escribe el último)
+        pendientes = [i for i in ids if options['forzar'] or not os.path.exists(f"{ruta_estacion(mes, i)}.json")]
+        self.stdout.write(f"Informe {mes:%Y-%m}: {len(ids)} estaciones, {len(ids) - len(pendientes)} ya hechas, {len(pendientes)} pendientes.")
+
+        fallidas = 0
+        if pendientes:
+            inicio = time.monotonic()
+            # Los hijos no deben heredar la conexión abierta del padre: cada uno abre la suya
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=max(1, options['procesos']), initializer=django.setup) as pool:
+                tareas = {pool.submit(generar_estacion, i, mes): i for i in pendientes}
+                for hechas, tarea in enumerate(as_completed(tareas), start=1):
+                    estacion_id = tareas[tarea]
+                    try:
+                        r = tarea.result()
+                    except Exception as e:
+                        fallidas += 1
+                        self.stdout.write(self.style.ERROR(f"[{hechas}/{len(pendientes)}] Estación {estacion_id}: {e}"))
+                        continue
+                    resumen = f"{r['pct_disponible']}% disponible" if r['lecturas'] else "sin lecturas"
+                    self.stdout.write(f"[{hechas}/{len(pendientes)}] {r['nombre']}: {resumen} ({time.monotonic() - inicio:.0f}s)")
+
+        total = consolidar(mes)
+        if fallidas:
+            self.stdout.write(self.style.WARNING(f"{fallidas} estaciones fallaron; vuelve a lanzar el comando para completarlas."))
+        self.stdout.write(self.style.SUCCESS(f"Informe de {total} estaciones en {os.path.join(directorio_mes(mes), 'index.html')}"))
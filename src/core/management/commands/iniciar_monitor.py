@@ -12,6 +12,8 @@ class Command(BaseCommand):
         Se ejecuta cada minuto para evaluar si toca cargar datos.
         - Noche (00:00 - 06:00): Cada 15 min.
         - Día (06:00 - 23:59): Cada 3 min.
+        - 03:00: archiva los meses terminados (archivo frío) tras la captura.
+        - 04:00: reentrena el predictor y recalcula perfiles/estaciones similares tras la captura.
         """
         # Obtenemos la hora actual CON zona horaria (Europe/Madrid)
         ahora = timezone.localtime()
@@ -34,6 +36,26 @@ class Command(BaseCommand):
                 call_command('cargar_datos')
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Error: {e}"))
+
+            # 3. Archivo frío: solo exporta los meses cerrados que aún no estén en disco
+            if hora == 3 and minuto == 0:
+                self.stdout.write(f"[Monitor {ahora.strftime('%H:%M')}] Archivando meses cerrados...")
+                try:
+                    call_command('archivar_datos')
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Error archivando: {e}"))
+
+            # 4. Reentrenamiento nocturno del predictor (poca carga a esa hora)
+            if hora == 4 and minuto == 0:
+                self.stdout.write(f"[Monitor {ahora.strftime('%H:%M')}] Reentrenando predictor...")
+                try:
+                    call_command('entrenar_predictor')
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Error entrenando: {e}"))
+                try:
+                    call_command('calcular_similitud')
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Error calculando similitud: {e}"))
         else:
             # Opción verbose para depurar (puedes quitarlo si ensucia mucho el log)
             # self.stdout.write(f"[Monitor {ahora.strftime('%H:%M')}] Esperando... (Toca en el siguiente múltiplo de {intervalo})")
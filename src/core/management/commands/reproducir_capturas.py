@@ -0,0 +1,221 @@
+import io
+import json
+import re
+import tempfile
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.management.commands.cargar_datos import Command as CargarDatos
+from core.models import Estacion, Feed
+from core.reproduccion import (
+    CargaLectura, MonitorBloqueos, ServidorSimulado, borrar_feed, crear_feed, fotogramas_grabados,
+    fotogramas_sinteticos, meteo_simulada, percentiles, resumen_lecturas,
+)
+
+# Bases en las que se puede ejecutar sin --confirmar
+BASE_DE_PRUEBAS = re.compile(r'bench|banco|prueba|test|staging', re.IGNORECASE)
+
+
+class Command(BaseCommand):
+    help = ('Banco de pruebas: reproduce capturas a ritmo acelerado contra un servidor simulado mientras '
+            'varios hilos leen las vistas, y mide latencia de la ingesta, esperas por locks y degradación de las lecturas.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capturas', type=int, default=50, help='Capturas a reproducir (por defecto 50).')
+        parser.add_argument('--estaciones', type=int, default=300, help='Estaciones de los fotogramas sintéticos (por defecto 300).')
+        parser.add_argument('--desde-feed', help='Reproduce las últimas capturas guardadas de este feed en vez de datos sintéticos.')
+        parser.add_argument('--formato', choices=[t for t, _ in Feed.TIPOS],
+                            help='Formato en que se sirven los fotogramas (por defecto el del feed de --desde-feed; ZGZ con datos sintéticos).')
+        parser.add_argument('--intervalo', type=int, default=3, help='Minutos simulados entre capturas (por defecto 3, como el monitor de día).')
+        parser.add_argument('--aceleracion', type=float, default=60, help='Factor de aceleración del reloj (por defecto 60: una captura cada 3 s).')
+        parser.add_argument('--maximo', action='store_true', help='Sin pausas: encadena capturas para medir el máximo sostenible.')
+        parser.add_argument('--hilos-lectura', type=int, default=4, help='Hilos leyendo vistas en paralelo (0 = sin lecturas).')
+        parser.add_argument('--segundos-base', type=float, default=10, help='Segundos de lecturas sin ingesta para tener la referencia (la mitad con caché y la mitad sin ella).')
+        parser.add_argument('--servidor', help='Leer de un servidor real (ej. http://localhost:8000) en vez del cliente de pruebas en proceso.')
+        parser.add_argument('--json', help='Guarda también los resultados en este fichero.')
+        parser.add_argument('--conservar', action='store_true', help='No borra el feed del banco ni sus capturas al terminar.')
+        parser.add_argument('--confirmar', action='store_true', help='Ejecutar aunque el nombre de la base no parezca de pruebas (escribe en ella un feed temporal).')
+
+    def handle(self, *args, **options):
+        n = options['capturas']
+        if n < 1:
+            raise CommandError("--capturas debe ser al menos 1")
+        base = str(connection.settings_dict['NAME'])
+        if not options['confirmar'] and not BASE_DE_PRUEBAS.search(base):
+            raise CommandError(
+                f"La base '{base}' no parece de pruebas: el banco crea un feed, estaciones y capturas en ella. "
+                "Usa una base de staging o pasa --confirmar."
+            )
+
+        # 1. FOTOGRAMAS (uno más para la captura de calentamiento)
+        origen = Feed.objects.filter(activo=True).order_by('id').first()
+        latitud, longitud = (origen.latitud, origen.longitud) if origen else (41.65, -0.88)
+        if options['desde_feed']:
+            grabado = Feed.objects.filter(slug=options['desde_feed']).first()
+            if grabado is None:
+                raise CommandError(f"No existe el feed '{options['desde_feed']}'")
+            tipo = options['formato'] or grabado.tipo
+            info, estados = fotogramas_grabados(tipo, grabado, n + 1)
+            if not estados:
+                raise CommandError(f"El feed '{grabado.slug}' no tiene capturas que reproducir")
+            latitud, longitud = grabado.latitud, grabado.longitud
+            descripcion = f"{len(estados)} capturas grabadas de {grabado.slug} (en bucle si faltan)"
+        else:
+            tipo = options['formato'] or 'ZGZ'
+            info, estados = fotogramas_sinteticos(tipo, options['estaciones'], n + 1, latitud, longitud)
+            descripcion = f"fotogramas sintéticos de {options['estaciones']} estaciones"
+
+        intervalo = timedelta(minutes=options['intervalo'])
+        instante_inicial = timezone.now() - intervalo * (n + 1)
+        horas_meteo = int(intervalo.total_seconds() * (n + 1) // 3600) + 48
+        servidor = ServidorSimulado(info, estados, meteo_simulada(instante_inicial, horas_meteo)).iniciar()
+        self.stdout.write(f"Servidor simulado en {servidor.url} con {descripcion}, en formato {tipo}.")
+
+        # La ingesta real; su salida por captura solo se ve con -v 2
+        ingesta = CargarDatos(stdout=self.stdout if options['verbosity'] >= 2 else io.StringIO())
+        periodo = 0 if options['maximo'] else intervalo.total_seconds() / options['aceleracion']
+        lectores = monitor = None
+        try:
+            # Ficheros publicados, archivo e informes del banco van a un directorio temporal
+            with tempfile.TemporaryDirectory(prefix='reproduccion-') as temporal, override_settings(
+                OPEN_METEO_URL=f"{servidor.url}/meteo",
+                PUBLICACION_DIR=temporal, ARCHIVO_DIR=temporal, INFORMES_DIR=temporal,
+            ):
+                feed = crear_feed(servidor, tipo, latitud, longitud)
+                try:
+                    # 2. CALENTAMIENTO: crea las estaciones del banco (no se mide)
+                    ingesta.capturar([feed], instante_inicial)
+
+                    # 3. LECTURAS DE REFERENCIA, sin ingesta
+                    if options['hilos_lectura'] > 0:
+                        rutas = self.rutas_lectura(feed, latitud, longitud)
+                        lectores = CargaLectura(rutas, options['hilos_lectura'], options['servidor']).iniciar()
+                        self.stdout.write(f"Lecturas de referencia ({options['hilos_lectura']} hilos, {len(rutas)} rutas) durante {options['segundos_base']:.0f}s...")
+                        # Media referencia con caché y media sin ella
+                        time.sleep(options['segundos_base'] / 2)
+                        lectores.usar_cache(False)
+                        time.sleep(options['segundos_base'] / 2)
+                        lectores.fase = 'ingesta'
+
+                    # 4. INGESTA ACELERADA
+                    monitor = MonitorBloqueos().iniciar()
+                    ritmo = "al máximo" if options['maximo'] else f"una cada {periodo:.2f}s (x{options['aceleracion']:g})"
+                    self.stdout.write(f"Reproduciendo {n} capturas {ritmo}...")
+                    fases = {'total': [], 'descarga': [], 'escritura': [], 'post': []}
+                    retrasos = fallidas = 0
+                    inicio = time.monotonic()
+                    for i in range(1, n + 1):
+                        espera = inicio + (i - 1) * periodo - time.monotonic()
+                        if espera > 0:
+                            time.sleep(espera)
+                        elif periodo and -espera > 0.1 * periodo:
+                            retrasos += 1  # La captura anterior no terminó a tiempo
+                        servidor.actual = i
+                        if lectores:
+                            # Durante la ingesta se alterna: capturas pares con caché, impares sin ella
+                            lectores.usar_cache(i % 2 == 0)
+                        t0 = time.monotonic()
+                        tiempos = ingesta.capturar([feed], instante_inicial + intervalo * i)
+                        fases['total'].append(time.monotonic() - t0)
+                        for fase in ('descarga', 'escritura', 'post'):
+                            fases[fase].append(tiempos[fase])
+                        fallidas += tiempos['capturas'] == 0
+                        if i % max(1, n // 10) == 0:
+                            self.stdout.write(f"  {i}/{n} capturas ({time.monotonic() - inicio:.0f}s)")
+                    duracion = time.monotonic() - inicio
+                finally:
+                    if lectores:
+                        lectores.parar()
+                    if monitor:
+                        monitor.parar()
+                    if not options['conservar']:
+                        borrar_feed()
+        finally:
+            servidor.parar()
+
+        resultados = {
+            'capturas': n,
+            'fallidas': fallidas,
+            'duracion_s': round(duracion, 2),
+            'capturas_por_segundo': round(n / duracion, 3) if duracion else None,
+            'retrasos': retrasos,
+            'ingesta_ms': {fase: percentiles(valores) for fase, valores in fases.items()},
+            'lecturas_ms': resumen_lecturas(lectores.registro) if lectores else {},
+            'bloqueos': monitor.resumen(),
+        }
+        self.informar(resultados, intervalo)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['json']}")
+
+    def rutas_lectura(self, feed, latitud, longitud):
+        """(etiqueta, ruta) de las vistas más pedidas; las de detalle con estaciones reales y del banco."""
+        rutas = [
+            ('lista', reverse('lista_estaciones')),
+            ('mapa/estaciones', reverse('mapa_datos_estaciones')),
+            ('mapa/timeline', reverse('mapa_datos_timeline')),
+            ('mapa/zonas', reverse('mapa_datos_zonas')),
+            ('analitica', reverse('analitica')),
+            ('flujos', reverse('flujos')),
+            ('alertas', reverse('alertas')),
+            ('radar-carga', f"{reverse('radar_carga')}?lat={latitud}&lon={longitud}"),
+        ]
+        estaciones = list(Estacion.objects.exclude(feed=feed).values_list('id_externo', flat=True)[:10])
+        estaciones += list(Estacion.objects.filter(feed=feed).values_list('id_externo', flat=True)[:10])
+        for eid in estaciones:
+            rutas.append(('estacion/series', reverse('detalle_series', args=[eid])))
+            rutas.append(('estacion/ultimas', reverse('detalle_ultimas', args=[eid])))
+        return rutas
+
+    def informar(self, r, intervalo):
+        def fila(nombre, p):
+            if not p:
+                return f"  {nombre:<18} -"
+            return f"  {nombre:<18} p50 {p['p50']:>8.1f}  p95 {p['p95']:>8.1f}  p99 {p['p99']:>8.1f}  máx {p['max']:>8.1f} ms"
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nIngesta: {r['capturas']} capturas en {r['duracion_s']}s = {r['capturas_por_segundo']} capturas/s "
+            f"({r['fallidas']} fallidas, {r['retrasos']} empezaron tarde)"
+        ))
+        for fase, p in r['ingesta_ms'].items():
+            self.stdout.write(fila(fase, p))
+        p95 = (r['ingesta_ms']['total'] or {}).get('p95')
+        if p95:
+            self.stdout.write(f"  Con p95 de {p95:.0f} ms caben ~{intervalo.total_seconds() * 1000 / p95:.0f}x el ritmo real (una cada {intervalo}).")
+
+        for modo, titulo in (('con_cache', 'con caché'), ('sin_cache', 'sin caché')):
+            filas = sorted(
+                ((etiqueta, t[modo]) for etiqueta, t in r['lecturas_ms'].items() if modo in t),
+                key=lambda x: x[0] != '*',
+            )
+            if not filas:
+                continue
+            self.stdout.write(self.style.SUCCESS(f"\nLecturas {titulo}: referencia -> durante la ingesta (ms)"))
+            for etiqueta, t in filas:
+                base, carga = t['base'], t['ingesta']
+                if not base or not carga:
+                    continue
+                degradacion = carga['p95'] / base['p95'] if base['p95'] else 0
+                texto = (f"  {etiqueta:<18} p50 {base['p50']:>7.1f} -> {carga['p50']:>7.1f}   "
+                         f"p95 {base['p95']:>7.1f} -> {carga['p95']:>7.1f}  (x{degradacion:.2f})   n={base['n']}+{carga['n']}")
+                if t['errores']:
+                    texto += f"  errores={t['errores']}"
+                self.stdout.write(self.style.WARNING(texto) if degradacion > 2 else texto)
+
+        b = r['bloqueos']
+        if b is None:
+            self.stdout.write("\nBloqueos: solo se muestrean en PostgreSQL (pg_stat_activity).")
+        else:
+            self.stdout.write(self.style.SUCCESS("\nBloqueos (PostgreSQL)"))
+            self.stdout.write(
+                f"  {b['muestras_con_espera']}/{b['muestras']} muestras con sesiones esperando un lock, "
+                f"máx {b['max_sesiones_esperando']} a la vez, espera más larga {b['espera_max_s']}s, "
+                f"~{b['espera_acumulada_s']}s acumulados, {b['deadlocks']} deadlocks."
+            )
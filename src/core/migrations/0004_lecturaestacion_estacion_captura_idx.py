@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-19 12:45
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_alter_estacion_capacidad_total'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='lecturaestacion',
+            index=models.Index(fields=['estacion', '-captura'], name='lectura_estacion_captura_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-19 12:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_lecturaestacion_estacion_captura_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModeloPrediccion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coeficientes', models.JSONField(help_text='Matriz 2 x k: [bicis, anclajes] por característica')),
+                ('mae_bicis', models.FloatField(help_text='Error medio absoluto en validación (bicis)')),
+                ('mae_anclajes', models.FloatField(help_text='Error medio absoluto en validación (anclajes)')),
+                ('n_muestras', models.IntegerField()),
+                ('entrenado', models.DateTimeField()),
+                ('estacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='modelo_prediccion', to='core.estacion')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PrediccionEstacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instante', models.DateTimeField(help_text='Inicio de la franja de 15 minutos')),
+                ('bicis', models.FloatField()),
+                ('anclajes', models.FloatField()),
+                ('captura', models.ForeignKey(help_text='Captura que generó la predicción', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.captura')),
+                ('estacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='predicciones', to='core.estacion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('estacion', 'instante'), name='unique_prediccion_por_franja')],
+            },
+        ),
+    ]
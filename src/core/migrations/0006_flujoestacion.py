@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-19 12:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_modeloprediccion_prediccionestacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlujoEstacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('salidas', models.IntegerField(default=0)),
+                ('llegadas', models.IntegerField(default=0)),
+                ('minutos', models.IntegerField(help_text='Duración del intervalo desde la captura anterior')),
+                ('captura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flujos', to='core.captura')),
+                ('estacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flujos', to='core.estacion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estacion', '-captura'], name='flujo_estacion_captura_idx')],
+                'constraints': [models.UniqueConstraint(fields=('captura', 'estacion'), name='unique_flujo_por_captura')],
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 6.0 on 2026-10-19 12:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast
+
+
+def crear_feed_zaragoza(apps, schema_editor):
+    """Todo lo capturado hasta ahora pertenece a Bizi Zaragoza."""
+    Feed = apps.get_model('core', 'Feed')
+    Estacion = apps.get_model('core', 'Estacion')
+    Captura = apps.get_model('core', 'Captura')
+
+    zaragoza = Feed.objects.create(
+        slug='zaragoza',
+        nombre='Bizi Zaragoza',
+        tipo='ZGZ',
+        url_estado='https://www.zaragoza.es/sede/servicio/urbanismo-infraestructuras/estacion-bicicleta.json?rows=300',
+        latitud=41.6488,
+        longitud=-0.8891,
+        pais='ES',
+        subdivision='AR',
+        prefijo_ids=0,
+    )
+    Estacion.objects.update(feed=zaragoza, codigo_feed=Cast(F('id_externo'), models.CharField()))
+    Captura.objects.update(feed=zaragoza)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_flujoestacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('nombre', models.CharField(max_length=100)),
+                ('tipo', models.CharField(choices=[('ZGZ', 'API Ayuntamiento de Zaragoza'), ('GBFS', 'GBFS (station_status + station_information)')], default='GBFS', max_length=4)),
+                ('url_estado', models.URLField(help_text='Zaragoza: listado de estaciones. GBFS: station_status.json', max_length=500)),
+                ('url_info', models.URLField(blank=True, help_text='GBFS: station_information.json', max_length=500)),
+                ('latitud', models.FloatField(help_text='Punto de referencia para la meteo')),
+                ('longitud', models.FloatField(help_text='Punto de referencia para la meteo')),
+                ('pais', models.CharField(default='ES', help_text='Código ISO para festivos', max_length=2)),
+                ('subdivision', models.CharField(blank=True, help_text='Región para festivos (ej. AR)', max_length=10)),
+                ('prefijo_ids', models.IntegerField(default=0, help_text='Las estaciones nuevas reciben id_externo = prefijo + n')),
+                ('activo', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='estacion',
+            name='codigo_feed',
+            field=models.CharField(blank=True, help_text='ID de la estación en su feed de origen', max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='captura',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AddField(
+            model_name='captura',
+            name='feed',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='capturas', to='core.feed'),
+        ),
+        migrations.AddField(
+            model_name='estacion',
+            name='feed',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='estaciones', to='core.feed'),
+        ),
+        migrations.RunPython(crear_feed_zaragoza, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='captura',
+            constraint=models.UniqueConstraint(fields=('feed', 'timestamp'), name='unique_captura_por_feed'),
+        ),
+        migrations.AddConstraint(
+            model_name='estacion',
+            constraint=models.UniqueConstraint(fields=('feed', 'codigo_feed'), name='unique_estacion_por_feed'),
+        ),
+    ]
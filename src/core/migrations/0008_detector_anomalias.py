@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-19 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoEstacion',
+            fields=[
+                ('estacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estado_detector', serialize=False, to='core.estacion')),
+                ('bicis', models.IntegerField()),
+                ('anclajes', models.IntegerField()),
+                ('ultimo_cambio', models.DateTimeField(help_text='Última captura en la que cambiaron bicis o anclajes')),
+                ('ultima_vista', models.DateTimeField(help_text='Última captura en la que apareció la estación')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertaEstacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ATS', 'Atascada (sin cambios)'), ('ATP', 'Valor atípico'), ('CAP', 'Caída de capacidad'), ('DES', 'Desaparecida del feed')], max_length=3)),
+                ('inicio', models.DateTimeField()),
+                ('fin', models.DateTimeField(blank=True, null=True)),
+                ('activa', models.BooleanField(default=True)),
+                ('detalle', models.CharField(blank=True, max_length=255)),
+                ('estacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='core.estacion')),
+            ],
+            options={
+                'ordering': ['-inicio'],
+                'indexes': [models.Index(fields=['activa', '-inicio'], name='alerta_activa_inicio_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticaFranja',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('franja', models.SmallIntegerField()),
+                ('n', models.IntegerField(default=0)),
+                ('media', models.FloatField(default=0.0)),
+                ('m2', models.FloatField(default=0.0, help_text='Suma de cuadrados de diferencias (Welford)')),
+                ('estacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_franja', to='core.estacion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('estacion', 'franja'), name='unique_estadistica_por_franja')],
+            },
+        ),
+    ]
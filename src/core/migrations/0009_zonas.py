@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-19 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_detector_anomalias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Zona',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolucion', models.PositiveIntegerField(help_text='Lado de la celda en metros')),
+                ('fila', models.IntegerField()),
+                ('columna', models.IntegerField()),
+                ('lat_min', models.FloatField()),
+                ('lon_min', models.FloatField()),
+                ('lat_max', models.FloatField()),
+                ('lon_max', models.FloatField()),
+                ('capacidad_total', models.IntegerField(default=0, help_text='Suma de la capacidad de sus estaciones')),
+                ('estaciones', models.ManyToManyField(related_name='zonas', to='core.estacion')),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zonas', to='core.feed')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SerieZona',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bicis', models.IntegerField()),
+                ('anclajes', models.IntegerField()),
+                ('estaciones', models.IntegerField(help_text='Estaciones de la zona presentes en la captura')),
+                ('vacias', models.IntegerField(help_text='Estaciones sin bicis')),
+                ('llenas', models.IntegerField(help_text='Estaciones sin anclajes libres')),
+                ('captura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_zona', to='core.captura')),
+                ('zona', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='serie', to='core.zona')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='zona',
+            constraint=models.UniqueConstraint(fields=('feed', 'resolucion', 'fila', 'columna'), name='unique_zona_por_celda'),
+        ),
+        migrations.AddIndex(
+            model_name='seriezona',
+            index=models.Index(fields=['zona', '-captura'], name='serie_zona_captura_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='seriezona',
+            constraint=models.UniqueConstraint(fields=('captura', 'zona'), name='unique_serie_zona_por_captura'),
+        ),
+    ]
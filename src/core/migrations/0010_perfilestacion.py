@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-19 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_zonas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilEstacion',
+            fields=[
+                ('estacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='perfil', serialize=False, to='core.estacion')),
+                ('vector', models.JSONField(help_text='168 franjas (día*24 + hora): ocupación media centrada y normalizada')),
+                ('grupo', models.SmallIntegerField()),
+                ('descripcion_grupo', models.CharField(max_length=100)),
+                ('similares', models.JSONField(default=list, help_text='[[id_externo, similitud coseno], ...] de mayor a menor')),
+                ('n_muestras', models.IntegerField()),
+                ('calculado', models.DateTimeField()),
+            ],
+        ),
+    ]
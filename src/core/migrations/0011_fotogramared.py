@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_perfilestacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FotogramaRed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('es_clave', models.BooleanField(default=False)),
+                ('datos', models.JSONField(help_text='{id_estacion: [bicis, anclajes]}. En los deltas, null = estación que deja de aparecer')),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fotogramas', to='core.feed')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['feed', 'es_clave', 'timestamp'], name='fotograma_clave_idx')],
+                'constraints': [models.UniqueConstraint(fields=('feed', 'timestamp'), name='unique_fotograma_por_instante')],
+            },
+        ),
+    ]
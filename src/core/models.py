@@ -1,5 +1,30 @@
 from django.db import models
 
+class Feed(models.Model):
+    """
+    Registro de sistemas de bici compartida que se capturan desde este despliegue.
+    Cada feed aporta su propia URL de estado, coordenadas para la meteo y calendario de festivos.
+    """
+    TIPOS = [
+        ('ZGZ', 'API Ayuntamiento de Zaragoza'),
+        ('GBFS', 'GBFS (station_status + station_information)'),
+    ]
+
+    slug = models.SlugField(unique=True)
+    nombre = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=4, choices=TIPOS, default='GBFS')
+    url_estado = models.URLField(max_length=500, help_text="Zaragoza: listado de estaciones. GBFS: station_status.json")
+    url_info = models.URLField(max_length=500, blank=True, help_text="GBFS: station_information.json")
+    latitud = models.FloatField(help_text="Punto de referencia para la meteo")
+    longitud = models.FloatField(help_text="Punto de referencia para la meteo")
+    pais = models.CharField(max_length=2, default='ES', help_text="Código ISO para festivos")
+    subdivision = models.CharField(max_length=10, blank=True, help_text="Región para festivos (ej. AR)")
+    prefijo_ids = models.IntegerField(default=0, help_text="Las estaciones nuevas reciben id_externo = prefijo + n")
+    activo = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.nombre
+
 class Estacion(models.Model):
     # Usamos el ID oficial de Bizi como clave primaria
     id_externo = models.IntegerField(primary_key=True, help_text="ID oficial de la estación Bizi")
@@ -9,6 +34,13 @@ class Estacion(models.Model):
     longitud = models.FloatField()
     capacidad_total = models.IntegerField(null=True, blank=True, help_text="Suma de anclajes + bicis")
     fecha_alta = models.DateTimeField(auto_now_add=True)
+    feed = models.ForeignKey(Feed, on_delete=models.PROTECT, null=True, related_name='estaciones')
+    codigo_feed = models.CharField(max_length=64, blank=True, null=True, help_text="ID de la estación en su feed de origen")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['feed', 'codigo_feed'], name='unique_estacion_por_feed')
+        ]
 
     def __str__(self):
         return f"{self.id_externo} - {self.nombre}"
@@ -18,7 +50,8 @@ class Captura(models.Model):
     La 'foto' del momento. Guarda el contexto (Meteo + Tiempo)
     para no repetir datos en cada estación.
     """
-    timestamp = models.DateTimeField(db_index=True, unique=True)
+    feed = models.ForeignKey(Feed, on_delete=models.PROTECT, null=True, related_name='capturas')
+    timestamp = models.DateTimeField(db_index=True)
     
     # Datos para la futura IA
     temperatura = models.FloatField(help_text="Grados centígrados")
@@ -32,6 +65,9 @@ class Captura(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=['feed', 'timestamp'], name='unique_captura_por_feed')
+        ]
 
     def __str__(self):
         return f"Captura {self.timestamp.strftime('%d/%m/%Y %H:%M')}"
@@ -57,4 +93,200 @@ class LecturaEstacion(models.Model):
         # Evita duplicados si el script se ejecuta dos veces por error
         constraints = [
             models.UniqueConstraint(fields=['captura', 'estacion'], name='unique_lectura_por_captura')
-        ]
\ No newline at end of file
+        ]
+        indexes = [
+            # Histórico de una estación ordenado por captura (detalle, admin, últimas N lecturas)
+            models.Index(fields=['estacion', '-captura'], name='lectura_estacion_captura_idx'),
+        ]
+
+class ModeloPrediccion(models.Model):
+    """
+    Coeficientes del modelo ridge de cada estación (ver core/predictor.py).
+    Se recalcula con `manage.py entrenar_predictor`.
+    """
+    estacion = models.OneToOneField(Estacion, on_delete=models.CASCADE, related_name='modelo_prediccion')
+    coeficientes = models.JSONField(help_text="Matriz 2 x k: [bicis, anclajes] por característica")
+    mae_bicis = models.FloatField(help_text="Error medio absoluto en validación (bicis)")
+    mae_anclajes = models.FloatField(help_text="Error medio absoluto en validación (anclajes)")
+    n_muestras = models.IntegerField()
+    entrenado = models.DateTimeField()
+
+    def __str__(self):
+        return f"Modelo {self.estacion_id} (MAE {self.mae_bicis})"
+
+
+class PerfilEstacion(models.Model):
+    """
+    Perfil de uso semanal de la estación, su grupo (k-means) y sus estaciones más parecidas.
+    Caché de `manage.py calcular_similitud` (ver core/similitud.py).
+    """
+    estacion = models.OneToOneField(Estacion, on_delete=models.CASCADE, primary_key=True, related_name='perfil')
+    vector = models.JSONField(help_text="168 franjas (día*24 + hora): ocupación media centrada y normalizada")
+    grupo = models.SmallIntegerField()
+    descripcion_grupo = models.CharField(max_length=100)
+    similares = models.JSONField(default=list, help_text="[[id_externo, similitud coseno], ...] de mayor a menor")
+    n_muestras = models.IntegerField()
+    calculado = models.DateTimeField()
+
+    def __str__(self):
+        return f"Perfil {self.estacion_id} (grupo {self.grupo})"
+
+
+class PrediccionEstacion(models.Model):
+    """
+    Predicción precalculada tras cada captura: estación x franja de 15 min (próximas 24h).
+    """
+    estacion = models.ForeignKey(Estacion, on_delete=models.CASCADE, related_name='predicciones')
+    instante = models.DateTimeField(help_text="Inicio de la franja de 15 minutos")
+    bicis = models.FloatField()
+    anclajes = models.FloatField()
+    captura = models.ForeignKey(Captura, on_delete=models.SET_NULL, null=True, related_name='+', help_text="Captura que generó la predicción")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['estacion', 'instante'], name='unique_prediccion_por_franja')
+        ]
+
+
+class FlujoEstacion(models.Model):
+    """
+    Bicis que salen / llegan a una estación en el intervalo que termina en `captura`.
+    Se calcula en cada ingesta (core/flujos.py) y con `manage.py calcular_flujos` para el histórico.
+    """
+    captura = models.ForeignKey(Captura, on_delete=models.CASCADE, related_name='flujos')
+    estacion = models.ForeignKey(Estacion, on_delete=models.CASCADE, related_name='flujos')
+    salidas = models.IntegerField(default=0)
+    llegadas = models.IntegerField(default=0)
+    minutos = models.IntegerField(help_text="Duración del intervalo desde la captura anterior")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['captura', 'estacion'], name='unique_flujo_por_captura')
+        ]
+        indexes = [
+            models.Index(fields=['estacion', '-captura'], name='flujo_estacion_captura_idx'),
+        ]
+
+
+class EstadoEstacion(models.Model):
+    """
+    Estado incremental del detector de anomalías (core/anomalias.py): última foto de la estación
+    y cuándo cambió por última vez. Una fila por estación, se actualiza en cada captura.
+    """
+    estacion = models.OneToOneField(Estacion, on_delete=models.CASCADE, primary_key=True, related_name='estado_detector')
+    bicis = models.IntegerField()
+    anclajes = models.IntegerField()
+    ultimo_cambio = models.DateTimeField(help_text="Última captura en la que cambiaron bicis o anclajes")
+    ultima_vista = models.DateTimeField(help_text="Última captura en la que apareció la estación")
+
+
+class EstadisticaFranja(models.Model):
+    """
+    Media y varianza (Welford) de bicis por estación y franja horaria semanal (0-167 = día*24 + hora).
+    """
+    estacion = models.ForeignKey(Estacion, on_delete=models.CASCADE, related_name='estadisticas_franja')
+    franja = models.SmallIntegerField()
+    n = models.IntegerField(default=0)
+    media = models.FloatField(default=0.0)
+    m2 = models.FloatField(default=0.0, help_text="Suma de cuadrados de diferencias (Welford)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['estacion', 'franja'], name='unique_estadistica_por_franja')
+        ]
+
+
+class AlertaEstacion(models.Model):
+    """Anomalía detectada en la ingesta. Sigue activa hasta que la estación vuelve a la normalidad."""
+    TIPOS = [
+        ('ATS', 'Atascada (sin cambios)'),
+        ('ATP', 'Valor atípico'),
+        ('CAP', 'Caída de capacidad'),
+        ('DES', 'Desaparecida del feed'),
+    ]
+
+    estacion = models.ForeignKey(Estacion, on_delete=models.CASCADE, related_name='alertas')
+    tipo = models.CharField(max_length=3, choices=TIPOS)
+    inicio = models.DateTimeField()
+    fin = models.DateTimeField(null=True, blank=True)
+    activa = models.BooleanField(default=True)
+    detalle = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['-inicio']
+        indexes = [
+            models.Index(fields=['activa', '-inicio'], name='alerta_activa_inicio_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.estacion_id}"
+
+
+class Zona(models.Model):
+    """
+    Celda cuadrada de la rejilla de un feed a una resolución dada (core/zonas.py).
+    Las estaciones se asignan por sus coordenadas; una estación pertenece a una zona por resolución.
+    """
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name='zonas')
+    resolucion = models.PositiveIntegerField(help_text="Lado de la celda en metros")
+    fila = models.IntegerField()
+    columna = models.IntegerField()
+    lat_min = models.FloatField()
+    lon_min = models.FloatField()
+    lat_max = models.FloatField()
+    lon_max = models.FloatField()
+    capacidad_total = models.IntegerField(default=0, help_text="Suma de la capacidad de sus estaciones")
+    estaciones = models.ManyToManyField(Estacion, related_name='zonas')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['feed', 'resolucion', 'fila', 'columna'], name='unique_zona_por_celda')
+        ]
+
+    def __str__(self):
+        return f"{self.feed_id} {self.resolucion}m ({self.fila}, {self.columna})"
+
+
+class SerieZona(models.Model):
+    """
+    Agregado de una zona en una captura. Se calcula en cada ingesta a partir de las lecturas en
+    memoria, así que las consultas por zona nunca recorren LecturaEstacion.
+    """
+    captura = models.ForeignKey(Captura, on_delete=models.CASCADE, related_name='series_zona')
+    zona = models.ForeignKey(Zona, on_delete=models.CASCADE, related_name='serie')
+    bicis = models.IntegerField()
+    anclajes = models.IntegerField()
+    estaciones = models.IntegerField(help_text="Estaciones de la zona presentes en la captura")
+    vacias = models.IntegerField(help_text="Estaciones sin bicis")
+    llenas = models.IntegerField(help_text="Estaciones sin anclajes libres")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['captura', 'zona'], name='unique_serie_zona_por_captura')
+        ]
+        indexes = [
+            models.Index(fields=['zona', '-captura'], name='serie_zona_captura_idx'),
+        ]
+
+
+class FotogramaRed(models.Model):
+    """
+    Estado de la red de un feed en una captura, para el viaje en el tiempo del mapa (core/fotogramas.py).
+    Cada pocas capturas se guarda un fotograma clave con todas las estaciones y entre medias solo
+    las que cambian respecto a la captura anterior. No depende de Captura: sobrevive a la purga.
+    """
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name='fotogramas')
+    timestamp = models.DateTimeField()
+    es_clave = models.BooleanField(default=False)
+    datos = models.JSONField(help_text="{id_estacion: [bicis, anclajes]}. En los deltas, null = estación que deja de aparecer")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['feed', 'timestamp'], name='unique_fotograma_por_instante')
+        ]
+        indexes = [
+            models.Index(fields=['feed', 'es_clave', 'timestamp'], name='fotograma_clave_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.feed_id} {self.timestamp} ({'clave' if self.es_clave else 'delta'})"
@@ -0,0 +1,244 @@
+"""
+Predictor de disponibilidad por estación.
+
+Modelo ligero: una regresión ridge por estación (solución cerrada en NumPy) sobre
+variables de calendario y meteorología de cada Captura. El entrenamiento se lanza con
+`manage.py entrenar_predictor` y la puntuación de las próximas 24h se precalcula tras
+cada captura (ver `generar_predicciones`), de modo que las vistas solo leen la tabla.
+"""
+import datetime
+from datetime import timedelta
+
+import holidays
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ModeloPrediccion, PrediccionEstacion
+
+# Franjas de 15 minutos (misma resolución que el heatmap del detalle)
+MINUTOS_FRANJA = 15
+FRANJAS_HORIZONTE = 24 * 60 // MINUTOS_FRANJA
+LAMBDA_RIDGE = 1.0
+
+NOMBRES_CARACTERISTICAS = [
+    'sesgo',
+    'sin_h', 'cos_h', 'sin_2h', 'cos_2h',
+    'lab_sin_h', 'lab_cos_h', 'lab_sin_2h', 'lab_cos_2h',
+    'no_laborable',
+    'temperatura', 'viento', 'precipitacion', 'lluvia',
+]
+
+# --- CARACTERÍSTICAS ---
+
+def inicio_franja(dt):
+    """Redondea hacia abajo a la franja de 15 minutos"""
+    return dt.replace(minute=dt.minute - dt.minute % MINUTOS_FRANJA, second=0, microsecond=0)
+
+
+def matriz_caracteristicas(hora_decimal, no_laborable, temperatura, viento, precipitacion, codigo_clima):
+    """
+    Construye la matriz X (n x k). Todos los argumentos son arrays de longitud n.
+    hora_decimal es la hora local (0-24). Las escalas son fijas para no tener que guardar medias.
+    """
+    hora_decimal = np.asarray(hora_decimal, dtype=np.float64)
+    no_laborable = np.asarray(no_laborable, dtype=np.float64)
+    laborable = 1.0 - no_laborable
+    angulo = 2 * np.pi * hora_decimal / 24.0
+    armonicos = np.column_stack([np.sin(angulo), np.cos(angulo), np.sin(2 * angulo), np.cos(2 * angulo)])
+    codigo_clima = np.asarray(codigo_clima, dtype=np.float64)
+
+    return np.column_stack([
+        np.ones_like(hora_decimal),
+        armonicos,
+        armonicos * laborable[:, None],
+        no_laborable,
+        np.asarray(temperatura, dtype=np.float64) / 10.0,
+        np.asarray(viento, dtype=np.float64) / 20.0,
+        np.log1p(np.clip(np.asarray(precipitacion, dtype=np.float64), 0, None)),
+        # Códigos WMO >= 51: llovizna, lluvia, nieve o tormenta
+        (codigo_clima >= 51).astype(np.float64),
+    ])
+
+
+def ajustar_ridge(X, Y, lam=LAMBDA_RIDGE):
+    """Solución cerrada (XᵀX + λI)⁻¹XᵀY. El sesgo (columna 0) no se penaliza."""
+    reg = np.eye(X.shape[1]) * lam
+    reg[0, 0] = 0.0
+    return np.linalg.solve(X.T @ X + reg, X.T @ Y)
+
+# --- ENTRENAMIENTO ---
+
+def cargar_historico(desde):
+    """
+    Devuelve (estacion_ids, posiciones, Y, X_captura) con una fila por lectura desde `desde`.
+    X_captura tiene una fila por Captura; `posiciones` indica la fila de cada lectura, así
+    no se replica la matriz de características millones de veces.
+    Se lee con cursores por lotes para no materializar objetos del ORM.
+    """
+    vacio = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, 2)), np.empty((0, len(NOMBRES_CARACTERISTICAS))))
+    tz = timezone.get_current_timezone()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id, timestamp, temperatura, viento_kmh, precipitacion, codigo_clima, es_festivo, es_fin_semana "
+            "FROM core_captura WHERE timestamp >= %s ORDER BY id",
+            [desde],
+        )
+        capturas = cursor.fetchall()
+    if not capturas:
+        return vacio
+
+    ids_captura = np.array([c[0] for c in capturas], dtype=np.int64)
+    atributos = []
+    for _, ts, temp, viento, lluvia, wmo, festivo, finde in capturas:
+        local = ts.astimezone(tz)
+        atributos.append((local.hour + local.minute / 60.0, festivo or finde, temp, viento, lluvia, wmo))
+    X_captura = matriz_caracteristicas(*np.array(atributos, dtype=np.float64).T)
+
+    bloques = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT estacion_id, captura_id, bicis_disponibles, anclajes_libres "
+            "FROM core_lecturaestacion WHERE captura_id >= %s",
+            [int(ids_captura[0])],
+        )
+        while True:
+            filas = cursor.fetchmany(50000)
+            if not filas:
+                break
+            bloques.append(np.array(filas, dtype=np.int32))
+    if not bloques:
+        return vacio
+
+    lecturas = np.concatenate(bloques)
+    posiciones = np.searchsorted(ids_captura, lecturas[:, 1])
+    validas = (posiciones < len(ids_captura)) & (ids_captura[np.minimum(posiciones, len(ids_captura) - 1)] == lecturas[:, 1])
+    lecturas, posiciones = lecturas[validas], posiciones[validas]
+    return lecturas[:, 0].astype(np.int64), posiciones, lecturas[:, 2:4].astype(np.float64), X_captura
+
+
+def entrenar_modelos(dias=60, minimo_muestras=200):
+    """Ajusta y guarda un modelo por estación. Devuelve la lista de ModeloPrediccion guardados."""
+    ahora = timezone.now()
+    estacion_ids, posiciones, Y, X_captura = cargar_historico(ahora - timedelta(days=dias))
+    if len(estacion_ids) == 0:
+        return []
+
+    # Agrupamos por estación y, dentro de cada una, por orden temporal de captura
+    orden = np.lexsort((posiciones, estacion_ids))
+    estacion_ids, posiciones, Y = estacion_ids[orden], posiciones[orden], Y[orden]
+    unicos, inicios = np.unique(estacion_ids, return_index=True)
+    fines = np.append(inicios[1:], len(estacion_ids))
+
+    modelos = []
+    for eid, ini, fin in zip(unicos, inicios, fines):
+        n = fin - ini
+        if n < minimo_muestras:
+            continue
+        Xs, Ys = X_captura[posiciones[ini:fin]], Y[ini:fin]
+        # Validación temporal: el último 20% (las capturas más recientes) mide el error
+        corte = int(n * 0.8)
+        W_val = ajustar_ridge(Xs[:corte], Ys[:corte])
+        mae = np.abs(Xs[corte:] @ W_val - Ys[corte:]).mean(axis=0)
+        W = ajustar_ridge(Xs, Ys)
+        modelos.append(ModeloPrediccion(
+            estacion_id=int(eid),
+            coeficientes=W.T.tolist(),
+            mae_bicis=round(float(mae[0]), 3),
+            mae_anclajes=round(float(mae[1]), 3),
+            n_muestras=int(n),
+            entrenado=ahora,
+        ))
+
+    ModeloPrediccion.objects.bulk_create(
+        modelos,
+        update_conflicts=True,
+        unique_fields=['estacion'],
+        update_fields=['coeficientes', 'mae_bicis', 'mae_anclajes', 'n_muestras', 'entrenado'],
+    )
+    return modelos
+
+# --- PUNTUACIÓN (tras cada captura) ---
+
+def generar_predicciones(captura, pronostico=None):
+    """
+    Precalcula estación x franja para las próximas 24h y sustituye la tabla de predicciones.
+    `pronostico` es un dict {hora UTC (datetime en punto): (temp, viento, lluvia, wmo)} de Open-Meteo;
+    si falta una hora se usa el tiempo de la captura.
+    """
+    # Solo las estaciones del feed de esta captura (cada feed tiene su meteo y sus festivos)
+    modelos = list(ModeloPrediccion.objects.select_related('estacion').filter(estacion__feed_id=captura.feed_id))
+    if not modelos:
+        return 0
+
+    pronostico = pronostico or {}
+    actual = (captura.temperatura, captura.viento_kmh, captura.precipitacion, captura.codigo_clima)
+    feed = captura.feed
+    festivos = holidays.country_holidays(feed.pais, subdiv=feed.subdivision or None) if feed else holidays.ES(subdiv='AR')
+    primera = inicio_franja(captura.timestamp) + timedelta(minutes=MINUTOS_FRANJA)
+    instantes = [primera + timedelta(minutes=MINUTOS_FRANJA * i) for i in range(FRANJAS_HORIZONTE)]
+
+    filas = []
+    for instante in instantes:
+        local = timezone.localtime(instante)
+        meteo = pronostico.get(instante.astimezone(datetime.timezone.utc).replace(minute=0), actual)
+        no_laborable = local.weekday() >= 5 or local.date() in festivos
+        filas.append((local.hour + local.minute / 60.0, no_laborable, *meteo))
+    F = matriz_caracteristicas(*np.array(filas, dtype=np.float64).T)
+
+    # W: (estaciones, 2, k) -> predicciones (estaciones, franjas, 2)
+    W = np.array([m.coeficientes for m in modelos], dtype=np.float64)
+    P = np.einsum('fk,eok->efo', F, W)
+    capacidades = np.array([m.estacion.capacidad_total or 0 for m in modelos], dtype=np.float64)
+    techo = np.where(capacidades > 0, capacidades, np.inf)[:, None, None]
+    P = np.clip(P, 0, techo)
+
+    nuevas = [
+        PrediccionEstacion(
+            estacion_id=m.estacion_id,
+            instante=instante,
+            bicis=round(float(P[e, f, 0]), 2),
+            anclajes=round(float(P[e, f, 1]), 2),
+            captura=captura,
+        )
+        for e, m in enumerate(modelos)
+        for f, instante in enumerate(instantes)
+    ]
+
+    with transaction.atomic():
+        PrediccionEstacion.objects.bulk_create(
+            nuevas,
+            batch_size=5000,
+            update_conflicts=True,
+            unique_fields=['estacion', 'instante'],
+            update_fields=['bicis', 'anclajes', 'captura'],
+        )
+        PrediccionEstacion.objects.filter(estacion__feed_id=captura.feed_id, instante__lt=primera).delete()
+    return len(nuevas)
+
+
+def prediccion_para(estacion_id, dia, hora, minuto):
+    """
+    Busca en la tabla precalculada la próxima ocurrencia de (dia, hora, minuto).
+    `dia` sigue la convención de Django week_day (1=Domingo ... 7=Sábado).
+    Devuelve {'bicis', 'anclajes', 'antes', 'despues'} o None si cae fuera del horizonte.
+    """
+    ahora = timezone.localtime()
+    dias_hasta = (dia - 1 - (ahora.isoweekday() % 7)) % 7
+    objetivo = (ahora + timedelta(days=dias_hasta)).replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    if objetivo < ahora - timedelta(minutes=20):
+        objetivo += timedelta(days=7)
+    franja = inicio_franja(objetivo)
+
+    filas = {
+        p.instante: p for p in PrediccionEstacion.objects.filter(
+            estacion_id=estacion_id,
+            instante__range=(franja - timedelta(minutes=MINUTOS_FRANJA), franja + timedelta(minutes=MINUTOS_FRANJA)),
+        )
+    }
+    actual = filas.get(franja)
+    if actual is None:
+        return None
+    antes = filas.get(franja - timedelta(minutes=MINUTOS_FRANJA), actual)
+    despues = filas.get(franja + timedelta(minutes=MINUTOS_FRANJA), actual)
+    return {'bicis': actual.bicis, 'anclajes': actual.anclajes, 'antes': antes.bicis, 'despues': despues.bicis}
@@ -0,0 +1,180 @@
+"""
+Publicación de artefactos estáticos tras cada captura.
+
+Por cada feed se escriben en PUBLICACION_DIR (servido por nginx en PUBLICACION_URL):
+- estaciones-<feed>.<hash>.json: GeoJSON con los metadatos de las estaciones.
+- estado-<feed>.<hash>.json: ocupación de la última captura {id: [bicis, anclajes]}.
+- timeline-<feed>.<hash>.json: fotogramas de las últimas 24h (mismo formato que mapa_datos_timeline).
+Cada uno con su .gz (y .br si está instalado `brotli`) para que nginx los sirva ya comprimidos.
+
+El nombre lleva el hash del contenido, así que se pueden cachear para siempre; manifest.json
+(sin hash, caché corta) apunta a la versión vigente de cada feed. Todo se escribe en un
+temporal y se renombra, de modo que nginx nunca sirve un fichero a medias.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Captura, Estacion, LecturaEstacion
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin él solo se publica .gz
+    brotli = None
+
+MANIFIESTO = 'manifest.json'
+HORAS_TIMELINE = 24
+# Un fotograma cada ~6 min, como el [::2] de mapa_datos_timeline con capturas cada 3 min
+SEPARACION_FOTOGRAMAS = timedelta(minutes=5)
+# Las versiones anteriores se conservan un rato para los clientes que aún tienen el manifiesto viejo
+RETENCION_VERSIONES = 15 * 60
+
+
+def escribir_atomico(ruta, contenido):
+    temporal = f"{ruta}.tmp-{os.getpid()}"
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def publicar(nombre, datos):
+    """Escribe `datos` como <nombre>.<hash>.json (+ .gz/.br) y devuelve el nombre del fichero."""
+    crudo = json.dumps(datos, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False).encode()
+    fichero = f"{nombre}.{hashlib.sha256(crudo).hexdigest()[:12]}.json"
+    ruta = os.path.join(settings.PUBLICACION_DIR, fichero)
+    if os.path.exists(ruta):
+        return fichero  # Mismo contenido ya publicado
+
+    # Primero las variantes comprimidas: cuando aparece el .json, nginx ya puede servir cualquiera
+    escribir_atomico(f"{ruta}.gz", gzip.compress(crudo, compresslevel=9, mtime=0))
+    if brotli is not None:
+        escribir_atomico(f"{ruta}.br", brotli.compress(crudo, quality=11))
+    escribir_atomico(ruta, crudo)
+    return fichero
+
+
+def leer_manifiesto():
+    try:
+        with open(os.path.join(settings.PUBLICACION_DIR, MANIFIESTO), 'rb') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def leer_publicado(fichero):
+    try:
+        with open(os.path.join(settings.PUBLICACION_DIR, fichero), 'rb') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError, TypeError):
+        return None
+
+# --- ARTEFACTOS ---
+
+def geojson_estaciones(feed):
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [float(e.longitud), float(e.latitud)]},
+                'properties': {'id': e.id_externo, 'nombre': e.nombre, 'url': reverse('detalle_estacion', args=[e.id_externo])},
+            }
+            for e in Estacion.objects.filter(feed=feed).order_by('id_externo')
+        ],
+    }
+
+
+def fotograma(captura, lecturas):
+    return {
+        't': int(captura.timestamp.timestamp()),
+        'ts': timezone.localtime(captura.timestamp).strftime("%H:%M"),
+        'd': {str(l.estacion_id): [l.bicis_disponibles, l.anclajes_libres] for l in lecturas},
+    }
+
+
+def timeline_desde_base(feed, desde):
+    """Reconstrucción completa (primer arranque o manifiesto perdido)"""
+    capturas = list(Captura.objects.filter(feed=feed, timestamp__gte=desde).order_by('timestamp'))
+    elegidas, ultima = [], None
+    for c in capturas:
+        if ultima is None or c.timestamp - ultima >= SEPARACION_FOTOGRAMAS:
+            elegidas.append(c)
+            ultima = c.timestamp
+    lecturas = {c.pk: [] for c in elegidas}
+    for l in LecturaEstacion.objects.filter(captura_id__in=list(lecturas)).only('captura_id', 'estacion_id', 'bicis_disponibles', 'anclajes_libres'):
+        lecturas[l.captura_id].append(l)
+    return [fotograma(c, lecturas[c.pk]) for c in elegidas if lecturas[c.pk]]
+
+
+def actualizar_timeline(feed, anterior, captura, lecturas):
+    """
+    Ventana deslizante: se parte del timeline ya publicado, se quitan los fotogramas de más de
+    24h y se añade el de esta captura. Solo se va a la base si no hay timeline previo.
+    """
+    desde = captura.timestamp - timedelta(hours=HORAS_TIMELINE)
+    frames = leer_publicado(anterior)
+    if frames is None:
+        return timeline_desde_base(feed, desde)
+
+    limite = int(desde.timestamp())
+    frames = [f for f in frames if f.get('t', 0) >= limite]
+    if not frames or captura.timestamp.timestamp() - frames[-1]['t'] >= SEPARACION_FOTOGRAMAS.total_seconds():
+        frames.append(fotograma(captura, lecturas))
+    return frames
+
+# --- PUBLICACIÓN ---
+
+def limpiar_versiones(vigentes):
+    """Borra versiones que ya no están en el manifiesto y llevan un rato sin estarlo."""
+    limite = time.time() - RETENCION_VERSIONES
+    for nombre in os.listdir(settings.PUBLICACION_DIR):
+        base = nombre.removesuffix('.gz').removesuffix('.br')
+        if base == MANIFIESTO or base in vigentes:
+            continue
+        ruta = os.path.join(settings.PUBLICACION_DIR, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+def publicar_feed(feed, captura, lecturas):
+    """Publica los artefactos del feed y actualiza el manifiesto. Devuelve la entrada del manifiesto."""
+    os.makedirs(settings.PUBLICACION_DIR, exist_ok=True)
+    manifiesto = leer_manifiesto()
+    previa = manifiesto.get(feed.slug, {})
+
+    entrada = {
+        'nombre': feed.nombre,
+        'ts': captura.timestamp.isoformat(),
+        'estaciones': publicar(f"estaciones-{feed.slug}", geojson_estaciones(feed)),
+        'estado': publicar(f"estado-{feed.slug}", {'ts': captura.timestamp.isoformat(), 'd': fotograma(captura, lecturas)['d']}),
+        'timeline': publicar(f"timeline-{feed.slug}", actualizar_timeline(feed, previa.get('timeline'), captura, lecturas)),
+    }
+    manifiesto[feed.slug] = entrada
+    escribir_atomico(
+        os.path.join(settings.PUBLICACION_DIR, MANIFIESTO),
+        json.dumps(manifiesto, separators=(',', ':'), ensure_ascii=False).encode(),
+    )
+    limpiar_versiones({f for e in manifiesto.values() for k, f in e.items() if k in ('estaciones', 'estado', 'timeline')})
+    return entrada
+
+
+def retirar_feed(slug):
+    """Quita un feed del manifiesto (sus ficheros caducan con limpiar_versiones)."""
+    manifiesto = leer_manifiesto()
+    if manifiesto.pop(slug, None) is None:
+        return
+    escribir_atomico(
+        os.path.join(settings.PUBLICACION_DIR, MANIFIESTO),
+        json.dumps(manifiesto, separators=(',', ':'), ensure_ascii=False).encode(),
+    )
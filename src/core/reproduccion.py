@@ -0,0 +1,347 @@
+"""
+Banco de pruebas de la ingesta: reproduce capturas a ritmo acelerado.
+
+- ServidorSimulado: HTTP local que sustituye al feed y a Open-Meteo, sirviendo en cada captura
+  el fotograma que toque. Los fotogramas son sintéticos (paseo aleatorio) o se reconstruyen
+  desde las capturas guardadas de un feed real, y se sirven con el formato de la API de
+  Zaragoza o de GBFS para medir el normalizador que corresponda.
+- La ingesta que se mide es la de verdad: cargar_datos.Command.capturar() contra un feed
+  propio del banco (inactivo, para que el monitor no lo capture), con instantes virtuales.
+- CargaLectura: hilos que piden vistas en bucle (cliente de pruebas de Django en el propio
+  proceso, o un servidor real) antes y durante la ingesta para ver cuánto se degradan. Casi
+  todo se sirve de caché, así que se mide por separado con caché y sin ella.
+- MonitorBloqueos: en PostgreSQL muestrea pg_stat_activity buscando sesiones esperando un lock.
+
+Se lanza con `manage.py reproducir_capturas`; pensado para una base de staging (con otra base
+pide --confirmar). Lo que publica la ingesta va a un directorio temporal, no al real.
+"""
+import datetime
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from .models import Captura, Estacion, Feed, LecturaEstacion
+from .publicacion import retirar_feed
+
+SLUG_FEED = 'reproduccion'
+# Ids de estación lejos de los de cualquier feed real
+PREFIJO_IDS = 900000000
+SIN_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+# --- FOTOGRAMAS ---
+
+def _fotogramas(tipo, estaciones, estados):
+    """
+    (info, [estado, ...]) con la forma de un feed `tipo` (ZGZ o GBFS). `estaciones` es
+    {código: (nombre, lat, lon, dirección)} y cada estado (códigos, bicis, anclajes).
+    Zaragoza no tiene info: cada estado lleva también nombre y coordenadas.
+    """
+    if tipo == 'ZGZ':
+        return None, [{'result': [
+            {
+                'id': c, 'title': estaciones[c][0],
+                'geometry': {'type': 'Point', 'coordinates': [estaciones[c][2], estaciones[c][1]]},
+                'bicisDisponibles': int(b), 'anclajesDisponibles': int(a),
+            }
+            for c, b, a in zip(codigos, bicis, anclajes)
+        ]} for codigos, bicis, anclajes in estados]
+    info = {'data': {'stations': [
+        {'station_id': str(c), 'name': nombre, 'lat': lat, 'lon': lon, 'address': direccion}
+        for c, (nombre, lat, lon, direccion) in estaciones.items()
+    ]}}
+    return info, [{'data': {'stations': [
+        {'station_id': str(c), 'num_bikes_available': int(b), 'num_docks_available': int(a)}
+        for c, b, a in zip(codigos, bicis, anclajes)
+    ]}} for codigos, bicis, anclajes in estados]
+
+
+def fotogramas_sinteticos(tipo, n_estaciones, n_capturas, latitud, longitud, semilla=0):
+    """(info, [estado, ...]) con la ocupación de `n_estaciones` haciendo un paseo aleatorio."""
+    rng = np.random.default_rng(semilla)
+    # Códigos numéricos: Zaragoza los usa para el id_externo
+    codigos = list(range(1, n_estaciones + 1))
+    estaciones = {
+        c: (f"Simulada {c}", latitud + rng.normal(0, 0.02), longitud + rng.normal(0, 0.02), None)
+        for c in codigos
+    }
+    capacidad = rng.integers(10, 31, n_estaciones)
+    bicis = rng.integers(0, capacidad + 1)
+    estados = []
+    for _ in range(n_capturas):
+        bicis = np.clip(bicis + rng.integers(-2, 3, n_estaciones), 0, capacidad)
+        estados.append((codigos, bicis, capacidad - bicis))
+    return _fotogramas(tipo, estaciones, estados)
+
+
+def fotogramas_grabados(tipo, feed, n_capturas):
+    """(info, [estado, ...]) reconstruidos desde las últimas `n_capturas` del feed (código = id_externo)."""
+    estaciones = {
+        e.id_externo: (e.nombre, e.latitud, e.longitud, e.direccion)
+        for e in Estacion.objects.filter(feed=feed).order_by('id_externo')
+    }
+    capturas = list(Captura.objects.filter(feed=feed, lecturas__isnull=False).distinct().order_by('-timestamp')[:n_capturas])[::-1]
+    por_captura = {c.pk: ([], [], []) for c in capturas}
+    filas = LecturaEstacion.objects.filter(captura_id__in=list(por_captura)).values_list(
+        'captura_id', 'estacion_id', 'bicis_disponibles', 'anclajes_libres'
+    ).iterator(chunk_size=5000)
+    for captura_id, estacion_id, b, a in filas:
+        codigos, bicis, anclajes = por_captura[captura_id]
+        codigos.append(estacion_id)
+        bicis.append(b)
+        anclajes.append(a)
+    return _fotogramas(tipo, estaciones, [por_captura[c.pk] for c in capturas])
+
+
+def meteo_simulada(desde, horas):
+    """Respuesta con la forma de Open-Meteo: tiempo actual + pronóstico horario (UTC)."""
+    inicio = desde.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return {
+        'current': {'temperature_2m': 18.0, 'wind_speed_10m': 10.0, 'precipitation': 0.0, 'weather_code': 1},
+        'hourly': {
+            'time': [(inicio + datetime.timedelta(hours=h)).strftime('%Y-%m-%dT%H:%M') for h in range(horas)],
+            'temperature_2m': [18.0] * horas,
+            'wind_speed_10m': [10.0] * horas,
+            'precipitation': [0.0] * horas,
+            'weather_code': [1] * horas,
+        },
+    }
+
+# --- SERVIDOR SIMULADO ---
+
+class ServidorSimulado:
+    """Sirve /estado.json (fotograma `actual`), /info.json (si hay) y /meteo en un hilo propio."""
+
+    def __init__(self, info, estados, meteo):
+        # Se serializa todo de antemano para no cargar el tiempo de JSON a la ingesta medida
+        self.info = json.dumps(info).encode() if info is not None else None
+        self.estados = [json.dumps(e).encode() for e in estados]
+        self.meteo = json.dumps(meteo).encode()
+        self.actual = 0
+        self.servidor = None
+
+    def iniciar(self):
+        simulado = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                ruta = self.path.split('?')[0]
+                if ruta == '/estado.json':
+                    cuerpo = simulado.estados[simulado.actual % len(simulado.estados)]
+                elif ruta == '/info.json' and simulado.info is not None:
+                    cuerpo = simulado.info
+                elif ruta == '/meteo':
+                    cuerpo = simulado.meteo
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.servidor.server_port}"
+
+    def parar(self):
+        if self.servidor:
+            self.servidor.shutdown()
+            self.servidor.server_close()
+
+# --- FEED DEL BANCO ---
+
+def crear_feed(servidor, tipo, latitud, longitud):
+    """Feed inactivo apuntando al servidor simulado (se rehace si quedó de una ejecución anterior)."""
+    borrar_feed()
+    return Feed.objects.create(
+        slug=SLUG_FEED, nombre='Banco de pruebas', tipo=tipo,
+        url_estado=f"{servidor.url}/estado.json", url_info=f"{servidor.url}/info.json" if tipo == 'GBFS' else '',
+        latitud=latitud, longitud=longitud, prefijo_ids=PREFIJO_IDS, activo=False,
+    )
+
+
+def borrar_feed():
+    feed = Feed.objects.filter(slug=SLUG_FEED).first()
+    if feed is None:
+        return
+    Captura.objects.filter(feed=feed).delete()
+    Estacion.objects.filter(feed=feed).delete()
+    feed.delete()
+    retirar_feed(SLUG_FEED)
+
+# --- CARGA DE LECTURA ---
+
+class CargaLectura:
+    """
+    `hilos` hilos pidiendo rutas al azar sin pausa. `rutas` es [(etiqueta, ruta)] y cada petición
+    se anota como (fase, con caché, etiqueta, segundos, código); la fase y la caché las cambia
+    quien dirige la prueba. Contra un servidor real no se puede quitar su caché: cada hilo alterna
+    peticiones normales y con un parámetro único que salta cache_page (no la caché por celda del radar).
+    """
+
+    def __init__(self, rutas, hilos, servidor=None):
+        self.rutas = rutas
+        self.hilos = hilos
+        self.servidor = servidor.rstrip('/') if servidor else None
+        self.fase = 'base'
+        self.cache = True
+        self.registro = []
+        self._sin_cache = None
+        self._parar = threading.Event()
+        self._hilos = []
+
+    def usar_cache(self, activa):
+        """En proceso cambia la caché de Django por DummyCache (para todos los hilos) o la restaura."""
+        if self.servidor or activa == self.cache:
+            return
+        if activa:
+            self._sin_cache.disable()
+            self._sin_cache = None
+        else:
+            self._sin_cache = override_settings(CACHES=SIN_CACHE)
+            self._sin_cache.enable()
+        self.cache = activa
+
+    def _trabajar(self, semilla):
+        rng = random.Random(semilla)
+        cliente = None if self.servidor else Client()
+        sesion = requests.Session() if self.servidor else None
+        try:
+            while not self._parar.is_set():
+                etiqueta, ruta = rng.choice(self.rutas)
+                con_cache = self.cache if cliente else rng.random() < 0.5
+                inicio = time.perf_counter()
+                try:
+                    if sesion:
+                        url = self.servidor + ruta
+                        if not con_cache:
+                            url += f"{'&' if '?' in ruta else '?'}sin_cache={rng.getrandbits(64)}"
+                        codigo = sesion.get(url, timeout=30).status_code
+                    else:
+                        codigo = cliente.get(ruta).status_code
+                except Exception:
+                    codigo = 0
+                self.registro.append((self.fase, con_cache, etiqueta, time.perf_counter() - inicio, codigo))
+        finally:
+            # Cada hilo tiene su propia conexión a la base
+            connection.close()
+
+    def iniciar(self):
+        for i in range(self.hilos):
+            hilo = threading.Thread(target=self._trabajar, args=(i,), daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        return self
+
+    def parar(self):
+        self._parar.set()
+        for hilo in self._hilos:
+            hilo.join()
+        self.usar_cache(True)
+
+# --- BLOQUEOS ---
+
+class MonitorBloqueos:
+    """Muestrea cada `intervalo` s las sesiones que esperan un lock (solo PostgreSQL)."""
+    CONSULTA = """
+        SELECT count(*), coalesce(max(extract(epoch FROM now() - state_change)), 0)
+        FROM pg_stat_activity
+        WHERE wait_event_type = 'Lock' AND datname = current_database()
+    """
+    CONSULTA_DEADLOCKS = "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()"
+
+    def __init__(self, intervalo=0.1):
+        self.intervalo = intervalo
+        self.disponible = connection.vendor == 'postgresql'
+        self.muestras = []  # (sesiones esperando, espera más larga en s)
+        self.deadlocks = 0
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def _deadlocks(self):
+        with connection.cursor() as cursor:
+            cursor.execute(self.CONSULTA_DEADLOCKS)
+            return cursor.fetchone()[0]
+
+    def _muestrear(self):
+        try:
+            inicial = self._deadlocks()
+            while not self._parar.wait(self.intervalo):
+                with connection.cursor() as cursor:
+                    cursor.execute(self.CONSULTA)
+                    esperando, maximo = cursor.fetchone()
+                self.muestras.append((esperando, float(maximo)))
+            self.deadlocks = self._deadlocks() - inicial
+        finally:
+            connection.close()
+
+    def iniciar(self):
+        if self.disponible:
+            self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+            self._hilo.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._hilo:
+            self._hilo.join()
+
+    def resumen(self):
+        if not self.disponible:
+            return None
+        esperas = [m for m in self.muestras if m[0]]
+        return {
+            'muestras': len(self.muestras),
+            'muestras_con_espera': len(esperas),
+            'max_sesiones_esperando': max((m[0] for m in esperas), default=0),
+            'espera_max_s': round(max((m[1] for m in esperas), default=0.0), 3),
+            # Aproximación: sesiones esperando en cada muestra x intervalo de muestreo
+            'espera_acumulada_s': round(sum(m[0] for m in esperas) * self.intervalo, 2),
+            'deadlocks': self.deadlocks,
+        }
+
+# --- ESTADÍSTICAS ---
+
+def percentiles(segundos):
+    """p50/p95/p99/máx en milisegundos"""
+    if not len(segundos):
+        return None
+    p50, p95, p99 = np.percentile(np.asarray(segundos) * 1000, [50, 95, 99])
+    return {'n': len(segundos), 'p50': round(p50, 1), 'p95': round(p95, 1), 'p99': round(p99, 1), 'max': round(max(segundos) * 1000, 1)}
+
+
+def resumen_lecturas(registro):
+    """
+    {etiqueta: {'con_cache' / 'sin_cache': {'base': percentiles, 'ingesta': percentiles, 'errores': n}}}
+    más una fila '*' con todas.
+    """
+    tiempos = {}
+    errores = {}
+    for fase, con_cache, etiqueta, segundos, codigo in registro:
+        modo = 'con_cache' if con_cache else 'sin_cache'
+        for clave in (etiqueta, '*'):
+            tiempos.setdefault((clave, modo), {'base': [], 'ingesta': []})[fase].append(segundos)
+            if codigo == 0 or codigo >= 500:
+                errores[clave, modo] = errores.get((clave, modo), 0) + 1
+    resumen = {}
+    for (etiqueta, modo), t in tiempos.items():
+        resumen.setdefault(etiqueta, {})[modo] = {
+            'base': percentiles(t['base']), 'ingesta': percentiles(t['ingesta']), 'errores': errores.get((etiqueta, modo), 0),
+        }
+    return resumen
@@ -0,0 +1,159 @@
+"""
+Estaciones parecidas y grupos de uso.
+
+Perfil de cada estación: ocupación media (bicis / puestos) en las 168 franjas de la semana
+(día*24 + hora local), centrada en su media y normalizada a norma 1, de modo que compara la
+forma del patrón (cuándo se vacía o se llena) y no el tamaño de la estación.
+Con los perfiles apilados en una matriz S x 168:
+- similitud coseno de todos contra todos = P @ P.T,
+- k-means vectorizado (k-means++ con semilla fija) para los grupos.
+Se calcula por feed con `manage.py calcular_similitud` y se guarda en PerfilEstacion.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
+
+from .models import LecturaEstacion, PerfilEstacion
+
+FRANJAS_SEMANA = 7 * 24
+# Una estación necesita datos en al menos esta fracción de franjas para tener perfil
+COBERTURA_MINIMA = 0.5
+
+# --- PERFILES ---
+
+def cargar_perfiles(feed, desde, minimo_muestras):
+    """
+    Devuelve (estacion_ids, P, n_muestras) con P de forma (S, 168) ya centrada y normalizada.
+    La agregación por (estación, día, hora) la hace la base; aquí solo llegan S x 168 filas.
+    """
+    filas = LecturaEstacion.objects.filter(estacion__feed=feed, captura__timestamp__gte=desde).annotate(
+        dia=ExtractIsoWeekDay('captura__timestamp'), hora=ExtractHour('captura__timestamp'),
+    ).values('estacion_id', 'dia', 'hora').annotate(
+        bicis=Sum('bicis_disponibles'), puestos=Sum(F('bicis_disponibles') + F('anclajes_libres')), n=Count('id'),
+    ).order_by()
+
+    posicion, ocupacion, muestras = {}, [], []
+    for r in filas:
+        i = posicion.get(r['estacion_id'])
+        if i is None:
+            i = posicion[r['estacion_id']] = len(ocupacion)
+            ocupacion.append(np.full(FRANJAS_SEMANA, np.nan))
+            muestras.append(0)
+        if r['puestos']:
+            ocupacion[i][(r['dia'] - 1) * 24 + r['hora']] = r['bicis'] / r['puestos']
+        muestras[i] += r['n']
+
+    if not ocupacion:
+        return [], np.empty((0, FRANJAS_SEMANA)), np.empty(0, dtype=int)
+
+    ids = np.array(list(posicion), dtype=np.int64)
+    R = np.vstack(ocupacion)
+    n = np.array(muestras)
+
+    con_datos = ~np.isnan(R)
+    cubiertas = con_datos.mean(axis=1)
+    media = np.divide(np.nansum(R, axis=1), con_datos.sum(axis=1), out=np.zeros(len(R)), where=con_datos.any(axis=1))
+    # Franjas sin datos = media de la estación (tras centrar quedan en 0)
+    R = np.where(np.isnan(R), media[:, None], R) - media[:, None]
+    norma = np.linalg.norm(R, axis=1)
+
+    validas = (n >= minimo_muestras) & (cubiertas >= COBERTURA_MINIMA) & (norma > 0)
+    P = R[validas] / norma[validas, None]
+    return ids[validas].tolist(), P, n[validas]
+
+# --- SIMILITUD Y GRUPOS ---
+
+def vecinos_mas_similares(P, k):
+    """Para cada fila, (índices, similitudes) de las k filas con mayor coseno, sin contarse a sí misma."""
+    S = P @ P.T
+    np.fill_diagonal(S, -np.inf)
+    k = min(k, len(P) - 1)
+    if k <= 0:
+        return np.empty((len(P), 0), dtype=int), np.empty((len(P), 0))
+    candidatos = np.argpartition(-S, k - 1, axis=1)[:, :k]
+    orden = np.argsort(-np.take_along_axis(S, candidatos, axis=1), axis=1)
+    indices = np.take_along_axis(candidatos, orden, axis=1)
+    return indices, np.take_along_axis(S, indices, axis=1)
+
+
+def kmeans(P, k, iteraciones=100, semilla=0):
+    """k-means con inicialización k-means++. Devuelve (etiquetas, centroides)."""
+    rng = np.random.default_rng(semilla)
+    C = np.empty((k, P.shape[1]))
+    C[0] = P[rng.integers(len(P))]
+    distancia = ((P - C[0]) ** 2).sum(axis=1)
+    for j in range(1, k):
+        prob = distancia / distancia.sum() if distancia.sum() > 0 else None
+        C[j] = P[rng.choice(len(P), p=prob)]
+        distancia = np.minimum(distancia, ((P - C[j]) ** 2).sum(axis=1))
+
+    etiquetas = None
+    cuadrados = (P ** 2).sum(axis=1)[:, None]
+    for _ in range(iteraciones):
+        nuevas = (cuadrados - 2 * P @ C.T + (C ** 2).sum(axis=1)[None, :]).argmin(axis=1)
+        if etiquetas is not None and np.array_equal(nuevas, etiquetas):
+            break
+        etiquetas = nuevas
+        pertenencia = np.eye(k)[etiquetas]
+        tamanos = pertenencia.sum(axis=0)
+        llenos = tamanos > 0
+        C[llenos] = (pertenencia.T @ P)[llenos] / tamanos[llenos, None]
+    return etiquetas, C
+
+
+def describir_grupo(centroide):
+    """Etiqueta orientativa a partir de la forma media del grupo (perfil centrado)."""
+    semana = centroide.reshape(7, 24)
+    laborables, finde = semana[:5], semana[5:]
+    manana = laborables[:, 7:10].mean()
+    tarde = laborables[:, 17:20].mean()
+    umbral = 0.5 * np.abs(semana).mean()
+    if manana - tarde < -umbral:
+        return "Origen al trabajo: se vacía por la mañana"
+    if manana - tarde > umbral:
+        return "Destino de trabajo: se llena por la mañana"
+    if finde[:, 10:21].std() > 1.5 * laborables[:, 10:21].std():
+        return "Ocio: más movimiento en fin de semana"
+    return "Uso estable a lo largo de la semana"
+
+# --- CÁLCULO COMPLETO ---
+
+def calcular_similitud(feed, desde, grupos=6, vecinos=5, minimo_muestras=200):
+    """Recalcula perfiles, grupos y vecinos del feed. Devuelve el número de estaciones con perfil."""
+    ids, P, n = cargar_perfiles(feed, desde, minimo_muestras)
+    if len(ids) == 0:
+        return 0
+
+    k = min(grupos, len(ids))
+    etiquetas, centroides = kmeans(P, k)
+    # Numeramos los grupos de mayor a menor para que el 0 sea siempre el más común
+    orden = np.argsort(-np.bincount(etiquetas, minlength=k))
+    renumerar = np.empty(k, dtype=int)
+    renumerar[orden] = np.arange(k)
+    descripciones = [describir_grupo(centroides[j]) for j in range(k)]
+
+    indices, similitudes = vecinos_mas_similares(P, vecinos)
+    ahora = timezone.now()
+    perfiles = [
+        PerfilEstacion(
+            estacion_id=eid,
+            vector=np.round(P[i], 4).tolist(),
+            grupo=int(renumerar[etiquetas[i]]),
+            descripcion_grupo=descripciones[etiquetas[i]],
+            similares=[[ids[j], round(float(s), 3)] for j, s in zip(indices[i], similitudes[i])],
+            n_muestras=int(n[i]),
+            calculado=ahora,
+        )
+        for i, eid in enumerate(ids)
+    ]
+    with transaction.atomic():
+        PerfilEstacion.objects.filter(estacion__feed=feed).exclude(estacion_id__in=ids).delete()
+        PerfilEstacion.objects.bulk_create(
+            perfiles,
+            update_conflicts=True,
+            unique_fields=['estacion'],
+            update_fields=['vector', 'grupo', 'descripcion_grupo', 'similares', 'n_muestras', 'calculado'],
+        )
+    return len(perfiles)
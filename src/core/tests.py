@@ -1,3 +1,361 @@
-from django.test import TestCase
+import datetime
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.paginator import EmptyPage
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+
+from . import archivo
+from .admin import EstimatedCountPaginator
+from .anomalias import MIN_MUESTRAS, UMBRAL_Z, detectar_anomalias, franja_semanal, welford
+from .flujos import registrar_flujos
+from .fotogramas import DELTAS_POR_CLAVE, aplicar, diferencia, estado_en, fotogramas_entre, indexar_feed, registrar_fotograma
+from .informes import analizar_estacion, episodios
+from .ingesta import normalizar_gbfs
+from .models import AlertaEstacion, Captura, EstadisticaFranja, Estacion, Feed, FlujoEstacion, FotogramaRed, LecturaEstacion
+from .zonas import registrar_zonas
+
+INICIO = datetime.datetime(2026, 3, 2, 8, 0, tzinfo=datetime.timezone.utc)
+
+
+def crear_feed(slug='prueba'):
+    return Feed.objects.create(slug=slug, nombre='Prueba', url_estado='http://localhost/estado.json', latitud=41.65, longitud=-0.88)
+
+
+def crear_captura(feed, timestamp):
+    return Captura.objects.create(feed=feed, timestamp=timestamp, temperatura=18.0, viento_kmh=10.0, codigo_clima=1)
+
+
+def crear_lecturas(captura, bicis_por_estacion):
+    return LecturaEstacion.objects.bulk_create([
+        LecturaEstacion(captura=captura, estacion_id=eid, bicis_disponibles=bicis, anclajes_libres=20 - bicis)
+        for eid, bicis in bicis_por_estacion.items()
+    ])
+
+
+class FlujosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.feed = crear_feed()
+        for eid in (1, 2, 3):
+            Estacion.objects.create(id_externo=eid, nombre=f"E{eid}", latitud=41.65, longitud=-0.88, feed=cls.feed)
+        cls.previa = crear_captura(cls.feed, INICIO)
+        crear_lecturas(cls.previa, {1: 10, 2: 5})
+        cls.captura = crear_captura(cls.feed, INICIO + datetime.timedelta(minutes=3))
+        # La estación 3 aparece en esta captura: no tiene flujo
+        cls.lecturas = crear_lecturas(cls.captura, {1: 7, 2: 9, 3: 4})
+
+    def test_salidas_y_llegadas_por_cambio_neto(self):
+        self.assertEqual(registrar_flujos(self.captura, self.lecturas, self.previa), 2)
+        flujos = {f.estacion_id: (f.salidas, f.llegadas, f.minutos) for f in FlujoEstacion.objects.filter(captura=self.captura)}
+        self.assertEqual(flujos, {1: (3, 0, 3), 2: (0, 4, 3)})
+
+    def test_relanzar_no_duplica(self):
+        registrar_flujos(self.captura, self.lecturas, self.previa)
+        registrar_flujos(self.captura, self.lecturas, self.previa)
+        self.assertEqual(FlujoEstacion.objects.filter(captura=self.captura).count(), 2)
+
+    def test_sin_captura_previa(self):
+        self.assertEqual(registrar_flujos(self.previa, self.lecturas, None), 0)
+        self.assertFalse(FlujoEstacion.objects.exists())
+
+
+class NormalizarGbfsTests(SimpleTestCase):
+    def test_une_estado_e_informacion(self):
+        estado = {'data': {'stations': [{'station_id': 7, 'num_bikes_available': 3, 'num_docks_available': 12}]}}
+        info = {'data': {'stations': [{'station_id': '7', 'name': 'Plaza', 'lat': 41.6, 'lon': -0.9, 'address': 'C/ Mayor 1'}]}}
+        self.assertEqual(normalizar_gbfs(estado, info), [
+            {'codigo': '7', 'nombre': 'Plaza', 'lat': 41.6, 'lon': -0.9, 'bicis': 3, 'anclajes': 12, 'direccion': 'C/ Mayor 1'},
+        ])
+
+    def test_nombre_gbfs_v3_y_vehiculos(self):
+        estado = {'data': {'stations': [{'station_id': 'a', 'num_vehicles_available': 5, 'num_docks_available': None}]}}
+        info = {'data': {'stations': [{'station_id': 'a', 'name': [{'text': 'Estación A', 'language': 'es'}]}]}}
+        registro, = normalizar_gbfs(estado, info)
+        self.assertEqual((registro['nombre'], registro['bicis'], registro['anclajes']), ('Estación A', 5, 0))
+
+    def test_sin_informacion(self):
+        registro, = normalizar_gbfs({'data': {'stations': [{'station_id': 'b', 'num_bikes_available': 1}]}})
+        self.assertEqual((registro['nombre'], registro['lat'], registro['lon'], registro['direccion']), ('Desconocido', 0, 0, None))
+
+
+class WelfordTests(SimpleTestCase):
+    def test_media_y_varianza_como_numpy(self):
+        valores = np.random.default_rng(1).integers(0, 30, 500)
+        stat = EstadisticaFranja(n=0, media=0.0, m2=0.0)
+        for x in valores.tolist():
+            welford(stat, x)
+        self.assertEqual(stat.n, len(valores))
+        self.assertAlmostEqual(stat.media, valores.mean())
+        self.assertAlmostEqual(stat.m2 / stat.n, np.var(valores))
+        self.assertAlmostEqual(stat.m2 / (stat.n - 1), np.var(valores, ddof=1))
+
+
+class AtipicaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.feed = crear_feed()
+        cls.estacion = Estacion.objects.create(id_externo=1, nombre='E1', latitud=41.65, longitud=-0.88, feed=cls.feed, capacidad_total=20)
+        cls.captura = crear_captura(cls.feed, INICIO)
+
+    def detectar(self, bicis, n=MIN_MUESTRAS, media=10.0, desviacion=2.0):
+        EstadisticaFranja.objects.create(
+            estacion=self.estacion, franja=franja_semanal(INICIO), n=n, media=media, m2=desviacion ** 2 * (n - 1),
+        )
+        lectura = LecturaEstacion(captura=self.captura, estacion=self.estacion, bicis_disponibles=bicis, anclajes_libres=20 - bicis)
+        detectar_anomalias(self.captura, [lectura])
+        return set(AlertaEstacion.objects.filter(activa=True).values_list('tipo', flat=True))
+
+    def test_fuera_del_umbral(self):
+        self.assertEqual(self.detectar(10 + 2 * (UMBRAL_Z + 0.5)), {'ATP'})
+
+    def test_dentro_del_umbral(self):
+        self.assertEqual(self.detectar(10 + 2 * (UMBRAL_Z - 0.5)), set())
+
+    def test_pocas_muestras(self):
+        self.assertEqual(self.detectar(10 + 2 * (UMBRAL_Z + 0.5), n=MIN_MUESTRAS - 1), set())
+
+    def test_actualiza_la_franja(self):
+        self.detectar(12)
+        stat = EstadisticaFranja.objects.get(estacion=self.estacion)
+        self.assertEqual(stat.n, MIN_MUESTRAS + 1)
+        self.assertAlmostEqual(stat.media, 10 + 2 / (MIN_MUESTRAS + 1))
+
+    def test_atipica_no_entra_en_la_franja(self):
+        self.detectar(30)
+        stat = EstadisticaFranja.objects.get(estacion=self.estacion)
+        self.assertEqual((stat.n, stat.media), (MIN_MUESTRAS, 10.0))
+
+    def test_anomalia_sostenida_sigue_detectandose(self):
+        self.detectar(20)
+        for i in range(1, 20):
+            captura = crear_captura(self.feed, INICIO + datetime.timedelta(minutes=3 * i))
+            lectura = LecturaEstacion(captura=captura, estacion=self.estacion, bicis_disponibles=20, anclajes_libres=0)
+            detectar_anomalias(captura, [lectura])
+        self.assertEqual(list(AlertaEstacion.objects.values_list('tipo', 'activa')), [('ATP', True)])
+
+
+class EpisodiosTests(SimpleTestCase):
+    def test_rachas_y_duracion(self):
+        mascara = np.array([True, True, False, False, True, False, True])
+        acumulado = np.concatenate(([0.0], np.cumsum([60, 120, 60, 60, 300, 60, 30])))
+        inicios, finales, segundos = episodios(mascara, acumulado)
+        self.assertEqual(inicios.tolist(), [0, 4, 6])
+        self.assertEqual(finales.tolist(), [2, 5, 7])
+        self.assertEqual(segundos.tolist(), [180, 300, 30])
+
+    def test_sin_episodios(self):
+        inicios, _, segundos = episodios(np.zeros(3, dtype=bool), np.arange(4.0))
+        self.assertEqual((len(inicios), len(segundos)), (0, 0))
+
+
+class InformeEstacionTests(TestCase):
+    MES = datetime.date(2026, 2, 1)
+    # Lecturas cada 10 min desde la medianoche local; capacidad 10
+    BICIS = [5, 0, 0, 0, 5, 5, 10, 5, 5, 0, 5, 5]
+
+    @classmethod
+    def setUpTestData(cls):
+        feed = crear_feed()
+        cls.estacion = Estacion.objects.create(id_externo=1, nombre='E1', latitud=41.65, longitud=-0.88, feed=feed)
+        inicio, _ = archivo.limites_mes(cls.MES)
+        for i, bicis in enumerate(cls.BICIS):
+            captura = crear_captura(feed, inicio + datetime.timedelta(minutes=10 * i))
+            LecturaEstacion.objects.create(captura=captura, estacion=cls.estacion, bicis_disponibles=bicis, anclajes_libres=10 - bicis)
+
+    def setUp(self):
+        archivo_vacio = tempfile.TemporaryDirectory()
+        self.addCleanup(archivo_vacio.cleanup)
+        ajustes = override_settings(ARCHIVO_DIR=archivo_vacio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_porcentajes_ponderados_por_tiempo(self):
+        r = analizar_estacion(self.estacion, self.MES)
+        # 11 intervalos de 10 min y la última lectura vale MAX_HUECO (20 min): 130 min
+        self.assertEqual(r['lecturas'], 12)
+        self.assertEqual(r['horas_observadas'], round(130 / 60, 1))
+        self.assertEqual(r['pct_vacia'], round(100 * 40 / 130, 1))
+        self.assertEqual(r['pct_llena'], round(100 * 10 / 130, 1))
+        self.assertEqual(r['pct_disponible'], round(100 * 80 / 130, 1))
+        self.assertEqual(r['franjas'][0]['pct_vacia'], r['pct_vacia'])
+
+    def test_episodios_y_percentiles(self):
+        r = analizar_estacion(self.estacion, self.MES)
+        self.assertEqual(r['episodios']['vacia'], {'n': 2, 'mediana_min': 20.0, 'p90_min': 28.0})
+        self.assertEqual(r['episodios']['llena'], {'n': 1, 'mediana_min': 10.0, 'p90_min': 10.0})
+        self.assertEqual([(p['tipo'], p['minutos'], p['inicio']) for p in r['peores']], [
+            ('vacia', 30, '01/02 00:10'), ('vacia', 10, '01/02 01:30'), ('llena', 10, '01/02 01:00'),
+        ])
+        self.assertEqual(
+            [r['bicis_p10'], r['bicis_p50'], r['bicis_p90']],
+            np.percentile(self.BICIS, [10, 50, 90]).tolist(),
+        )
+
+
+def estados_aleatorios(n, semilla=0):
+    """Red de 30 estaciones en la que cada paso cambian unas pocas y alguna desaparece o vuelve."""
+    rng = np.random.default_rng(semilla)
+    estado = {str(e): [10, 10] for e in range(1, 31)}
+    estados = []
+    for _ in range(n):
+        estado = {e: list(v) for e, v in estado.items()}
+        for e in rng.choice(30, 4, replace=False) + 1:
+            bicis = int(rng.integers(0, 21))
+            estado[str(e)] = [bicis, 20 - bicis]
+        if rng.random() < 0.2:
+            estado.pop(str(rng.integers(1, 31)), None)
+        estados.append(estado)
+    return estados
+
+
+class DeltasTests(SimpleTestCase):
+    def test_ida_y_vuelta(self):
+        estados = estados_aleatorios(50)
+        for base, actual in zip(estados, estados[1:]):
+            estado = {e: list(v) for e, v in base.items()}
+            aplicar(estado, diferencia(base, actual))
+            self.assertEqual(estado, actual)
+
+    def test_delta_solo_con_cambios(self):
+        self.assertEqual(diferencia({'1': [3, 7], '2': [5, 5]}, {'1': [3, 7], '3': [0, 10]}), {'2': None, '3': [0, 10]})
+
+
+class EstadoEnTests(TestCase):
+    N = 2 * DELTAS_POR_CLAVE + 5
+
+    @classmethod
+    def setUpTestData(cls):
+        feed = crear_feed()
+        cls.estados = estados_aleatorios(cls.N)
+        cls.instantes = [INICIO + datetime.timedelta(minutes=3 * i) for i in range(cls.N)]
+        for instante, estado in zip(cls.instantes, cls.estados):
+            captura = crear_captura(feed, instante)
+            lecturas = [LecturaEstacion(captura=captura, estacion_id=int(e), bicis_disponibles=b, anclajes_libres=a) for e, (b, a) in estado.items()]
+            registrar_fotograma(captura, lecturas)
+        cls.feed = feed
+
+    def test_reconstruye_cada_captura(self):
+        self.assertEqual(FotogramaRed.objects.filter(feed=self.feed).count(), self.N)
+        # Cada paso cambia pocas estaciones: solo hay fotograma clave cada DELTAS_POR_CLAVE capturas
+        self.assertEqual(FotogramaRed.objects.filter(feed=self.feed, es_clave=True).count(), 3)
+        for instante, estado in zip(self.instantes, self.estados):
+            timestamp, reconstruido, n = estado_en(self.feed, instante + datetime.timedelta(seconds=30))
+            self.assertEqual((timestamp, reconstruido), (instante, estado))
+            self.assertLess(n, DELTAS_POR_CLAVE)
+
+    def test_justo_antes(self):
+        timestamp, estado, _ = estado_en(self.feed, self.instantes[10], incluido=False)
+        self.assertEqual((timestamp, estado), (self.instantes[9], self.estados[9]))
+
+    def test_antes_del_primer_fotograma(self):
+        self.assertEqual(estado_en(self.feed, INICIO - datetime.timedelta(minutes=1)), (None, {}, 0))
+
+    def test_rango(self):
+        inicio, estado, siguientes = fotogramas_entre(self.feed, self.instantes[5], self.instantes[-1])
+        self.assertEqual((inicio, estado), (self.instantes[5], self.estados[5]))
+        for (timestamp, delta), instante, esperado in zip(siguientes, self.instantes[6:], self.estados[6:], strict=True):
+            aplicar(estado, delta)
+            self.assertEqual((timestamp, estado), (instante, esperado))
+
+
+class IndexarFeedTests(TestCase):
+    N = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.feed = crear_feed()
+        for eid in range(1, 31):
+            Estacion.objects.create(id_externo=eid, nombre=f"E{eid}", latitud=41.65, longitud=-0.88, feed=cls.feed)
+        cls.estados = estados_aleatorios(cls.N, semilla=1)
+        cls.instantes = [INICIO + datetime.timedelta(minutes=3 * i) for i in range(cls.N)]
+        for instante, estado in zip(cls.instantes, cls.estados):
+            captura = crear_captura(cls.feed, instante)
+            registrar_fotograma(captura, LecturaEstacion.objects.bulk_create([
+                LecturaEstacion(captura=captura, estacion_id=int(e), bicis_disponibles=b, anclajes_libres=a) for e, (b, a) in estado.items()
+            ]))
+
+    def test_conserva_los_fotogramas_purgados(self):
+        # Purga de la primera mitad: sus fotogramas ya no se pueden rehacer
+        Captura.objects.filter(feed=self.feed, timestamp__lt=self.instantes[15]).delete()
+        total, _ = indexar_feed(self.feed, INICIO - datetime.timedelta(days=1))
+        self.assertEqual(total, self.N - 15)
+        self.assertEqual(FotogramaRed.objects.filter(feed=self.feed).count(), self.N)
+        for instante, estado in zip(self.instantes, self.estados):
+            self.assertEqual(estado_en(self.feed, instante)[:2], (instante, estado))
+
+    def test_sin_capturas_vivas(self):
+        Captura.objects.filter(feed=self.feed).delete()
+        self.assertEqual(indexar_feed(self.feed, INICIO - datetime.timedelta(days=1)), (0, 0))
+        self.assertEqual(FotogramaRed.objects.filter(feed=self.feed).count(), self.N)
+
+
+class PaginadorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        feed = crear_feed()
+        for i in range(12):
+            crear_captura(feed, INICIO + datetime.timedelta(minutes=3 * i))
+
+    def paginador(self, queryset):
+        paginador = EstimatedCountPaginator(queryset, 2)
+        paginador.LIMITE_CONTEO = 5
+        return paginador
+
+    def test_estimacion_recortada(self):
+        with mock.patch.object(EstimatedCountPaginator, '_estimacion_pg_class', return_value=10 ** 7):
+            paginador = self.paginador(Captura.objects.order_by('id'))
+            self.assertEqual((paginador.count, paginador.num_pages), (5, 3))
+            with self.assertRaises(EmptyPage):
+                paginador.page(4)
+
+    def test_conteo_con_filtros_recortado(self):
+        paginador = self.paginador(Captura.objects.filter(temperatura__gt=0).order_by('id'))
+        self.assertEqual((paginador.count, paginador.num_pages), (5, 3))
+
+
+class TramosArchivoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.feed = crear_feed()
+        cls.estacion = Estacion.objects.create(id_externo=1, nombre='E1', latitud=41.65, longitud=-0.88, feed=cls.feed)
+        crear_captura(cls.feed, INICIO)
+
+    def setUp(self):
+        archivo._primera_viva.clear()
+        self.addCleanup(archivo._primera_viva.clear)
+
+    def test_rango_reciente_sin_consultas(self):
+        archivo.serie_estacion(self.estacion, INICIO - datetime.timedelta(days=1), INICIO)
+        with self.assertNumQueries(0), mock.patch('os.listdir') as listdir:
+            ts, _, _ = archivo.serie_estacion(self.estacion, INICIO + datetime.timedelta(hours=1), INICIO + datetime.timedelta(days=1))
+        self.assertEqual(len(ts), 0)
+        listdir.assert_not_called()
+
+    def test_rango_anterior_consulta_la_base(self):
+        archivo.serie_estacion(self.estacion, INICIO, INICIO + datetime.timedelta(days=1))
+        with self.assertNumQueries(1):
+            archivo.serie_estacion(self.estacion, INICIO - datetime.timedelta(days=1), INICIO + datetime.timedelta(days=1))
+
+
+class RegistrarZonasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.feed = crear_feed()
+        cls.estaciones = [
+            Estacion.objects.create(id_externo=1, nombre='E1', latitud=41.65, longitud=-0.88, feed=cls.feed),
+            Estacion.objects.create(id_externo=2, nombre='Sin coordenadas', latitud=0, longitud=0, feed=cls.feed),
+        ]
+
+    def lecturas(self, minutos):
+        captura = crear_captura(self.feed, INICIO + datetime.timedelta(minutes=minutos))
+        return captura, [LecturaEstacion(captura=captura, estacion=e, bicis_disponibles=5, anclajes_libres=5) for e in self.estaciones]
+
+    def test_estacion_sin_coordenadas_no_se_reintenta(self):
+        self.assertEqual(registrar_zonas(*self.lecturas(0)), 3)  # una zona por resolución
+        # Siguientes capturas: pertenencias + SerieZona, sin volver a asignar
+        captura, lecturas = self.lecturas(3)
+        with self.assertNumQueries(2):
+            self.assertEqual(registrar_zonas(captura, lecturas), 3)
@@ -7,9 +7,23 @@ urlpatterns = [
     
     # Ruta detalle: /estacion/1/
     path('estacion/<int:estacion_id>/', views.detalle_estacion, name='detalle_estacion'),
+    # Datos de cada panel del detalle (JSON cacheable, se piden en paralelo desde la página)
+    path('estacion/<int:estacion_id>/datos/series/', views.detalle_series, name='detalle_series'),
+    path('estacion/<int:estacion_id>/datos/stats/', views.detalle_stats, name='detalle_stats'),
+    path('estacion/<int:estacion_id>/datos/heatmap/', views.detalle_heatmap, name='detalle_heatmap'),
+    path('estacion/<int:estacion_id>/datos/ultimas/', views.detalle_ultimas, name='detalle_ultimas'),
+    path('estacion/<int:estacion_id>/datos/similares/', views.detalle_similares, name='detalle_similares'),
     path('mapa/', views.mapa_estaciones, name='mapa_estaciones'),
+    path('mapa/datos/estaciones/', views.mapa_datos_estaciones, name='mapa_datos_estaciones'),
+    path('mapa/datos/timeline/', views.mapa_datos_timeline, name='mapa_datos_timeline'),
+    path('mapa/datos/instante/', views.mapa_datos_instante, name='mapa_datos_instante'),
+    path('mapa/datos/replay/', views.mapa_datos_replay, name='mapa_datos_replay'),
+    path('mapa/datos/zonas/', views.mapa_datos_zonas, name='mapa_datos_zonas'),
+    path('mapa/datos/zonas/<int:zona_id>/', views.mapa_datos_zona_serie, name='mapa_datos_zona_serie'),
     path('planificador/', views.planificador, name='planificador'),
     path('radar/', views.radar_index, name='radar'),
     path('radar-carga/', views.radar_carga, name='radar_carga'),
     path('analitica/', views.analitica_global, name='analitica'),
+    path('flujos/', views.flujos_estaciones, name='flujos'),
+    path('alertas/', views.alertas, name='alertas'),
 ]
\ No newline at end of file
@@ -1,14 +1,27 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
 from django.urls import reverse
-from django.db.models import Sum, Avg, Count, Q, F, FloatField, ExpressionWrapper
+from django.db.models import Sum, Avg, Count, Q, F
+from django.db.models.functions import TruncHour
 from django.core.serializers.json import DjangoJSONEncoder
 from django.http import JsonResponse 
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.cache import cache_page, cache_control
+from django.views.decorators.gzip import gzip_page
 import json
 import math
 import datetime
 from datetime import timedelta
-from .models import Estacion, LecturaEstacion, Captura
+import holidays
+import numpy as np
+from .models import Estacion, LecturaEstacion, Captura, FlujoEstacion, Feed, AlertaEstacion, Zona, SerieZona, PerfilEstacion
+from . import archivo
+from .predictor import prediccion_para
+from .zonas import RESOLUCIONES, RESOLUCION_POR_DEFECTO
+from .db_router import lectura_en_replica
+from .coalescencia import calcular_una_vez, cuantizar, version_capturas
+from .fotogramas import estado_en, fotogramas_entre
 
 # --- FUNCIONES AUXILIARES ---
 
@@ -27,6 +40,19 @@ def get_ultima_actualizacion():
     ultima = Captura.objects.filter(lecturas__isnull=False).order_by('-timestamp').first()
     return ultima.timestamp if ultima else timezone.now()
 
+def ultimas_capturas():
+    """{feed_id: id de su última captura con datos}. Cada red captura por separado."""
+    ultimas = {}
+    for feed_id in Feed.objects.values_list('id', flat=True):
+        ultimas[feed_id] = Captura.objects.filter(feed_id=feed_id, lecturas__isnull=False).order_by('-timestamp').values_list('id', flat=True).first()
+    return ultimas
+
+def feed_seleccionado(request):
+    """Feed pedido por ?feed=slug o, si no, el primer feed activo (Zaragoza)"""
+    feeds = Feed.objects.filter(activo=True).order_by('id')
+    slug = request.GET.get('feed')
+    return (feeds.filter(slug=slug).first() if slug else None) or feeds.first()
+
 def obtener_nivel_probabilidad(porcentaje):
     if porcentaje >= 80: return {'texto': 'Muy Alta', 'clase': 'success', 'color': '#198754', 'ancho': 100}
     elif porcentaje >= 60: return {'texto': 'Alta', 'clase': 'success', 'color': '#75b798', 'ancho': 75}
@@ -37,95 +63,330 @@ def obtener_nivel_probabilidad(porcentaje):
 # --- VISTAS ---
 
 def lista_estaciones(request):
+    # La ocupación actual la pinta el navegador desde los artefactos publicados (core/publicacion.py)
     estaciones = Estacion.objects.all().order_by('id_externo')
-    desde = timezone.now() - timedelta(hours=24)
-    capturas_recientes = Captura.objects.filter(timestamp__gte=desde).order_by('timestamp')
-    datos_globales = []
-    
-    # Optimización: Agregación en base de datos si fuera posible, aquí mantenemos lógica python
-    for c in capturas_recientes:
-        total = c.lecturas.aggregate(t=Sum('bicis_disponibles'))['t']
-        if total is not None:
-            datos_globales.append({'x': c.timestamp.isoformat(), 'y': total})
-            
     context = {
         'estaciones': estaciones, 
-        'datos_globales': json.dumps(datos_globales, cls=DjangoJSONEncoder),
+        'publicacion_url': settings.PUBLICACION_URL,
         'last_update': get_ultima_actualizacion()
     }
     return render(request, 'core/lista_estaciones.html', context)
 
+# --- CACHÉ DE LOS ENDPOINTS DE DATOS ---
+# Las capturas llegan cada 3 min; con 60s de caché ningún panel queda más de una captura atrás.
+CACHE_DATOS = 60
+CACHE_HEATMAP = 15 * 60  # Patrón de 30 días: apenas cambia entre capturas
+
+def datos_cacheables(timeout):
+    """
+    Envuelve un endpoint JSON: lecturas en réplica, respuesta comprimida y cacheada
+    (en servidor con cache_page y en el navegador/proxy con Cache-Control público).
+    Como gzip_page añade Vary: Accept-Encoding, la caché guarda ya la versión comprimida.
+    """
+    def decorator(view):
+        return cache_page(timeout)(cache_control(public=True)(gzip_page(lectura_en_replica(view))))
+    return decorator
+
+RANGOS = {
+    '24h': (24, "Últimas 24 horas"),
+    '7d': (168, "Últimos 7 días"),
+    '30d': (720, "Últimos 30 días"),
+    '1a': (8760, "Último año"),
+}
+# A partir de aquí la serie de una estación se sirve en medias horarias
+HORAS_SERIE_COMPLETA = 168
+
+def parsear_rango(request):
+    rango = request.GET.get('rango')
+    if rango not in RANGOS:
+        rango = '24h'
+    return (rango, *RANGOS[rango])
+
+def serie_horaria(estacion, desde):
+    """
+    Medias horarias de bicis/anclajes desde `desde`: meses del archivo frío (NumPy sobre mmap)
+    más la agregación por hora en la base. Devuelve {epoch de la hora: [n, suma bicis, suma anclajes]}.
+    """
+    horas = {}
+    ts, bicis, anclajes = archivo.serie_estacion(estacion, desde, timezone.now())
+    if len(ts):
+        claves, grupo = np.unique(ts // 3600, return_inverse=True)
+        columnas = zip(claves.tolist(), np.bincount(grupo).tolist(), np.bincount(grupo, weights=bicis).tolist(), np.bincount(grupo, weights=anclajes).tolist())
+        for hora, n, sb, sa in columnas:
+            horas[hora * 3600] = [n, sb, sa]
+
+    por_hora = LecturaEstacion.objects.filter(estacion=estacion, captura__timestamp__gte=desde).annotate(hora=TruncHour('captura__timestamp')).values('hora').annotate(
+        n=Count('id'), sb=Sum('bicis_disponibles'), sa=Sum('anclajes_libres')
+    )
+    for r in por_hora:
+        # La hora de frontera puede tener lecturas en el archivo y en la base
+        acumulado = horas.setdefault(int(r['hora'].timestamp()), [0, 0, 0])
+        acumulado[0] += r['n']
+        acumulado[1] += r['sb']
+        acumulado[2] += r['sa']
+    return horas
+
+# --- DETALLE DE ESTACIÓN: SHELL + PANELES ---
+
+@cache_page(CACHE_DATOS)
+@lectura_en_replica
 def detalle_estacion(request, estacion_id):
+    """Solo la estructura de la página: cada panel pide sus datos a su endpoint en paralelo."""
     estacion = get_object_or_404(Estacion, id_externo=estacion_id)
-    rango = request.GET.get('rango', '24h')
-    
-    if rango == '7d':
-        horas_atras, titulo_rango = 168, "Últimos 7 días"
-    else:
-        horas_atras, titulo_rango, rango = 24, "Últimas 24 horas", '24h'
+    rango, _, titulo_rango = parsear_rango(request)
+    context = {
+        'estacion': estacion, 
+        'rango_actual': rango, 
+        'titulo_rango': titulo_rango,
+        'last_update': get_ultima_actualizacion()
+    }
+    return render(request, 'core/detalle_estacion.html', context)
 
+@datos_cacheables(CACHE_DATOS)
+def detalle_series(request, estacion_id):
+    estacion = get_object_or_404(Estacion, id_externo=estacion_id)
+    _, horas_atras, _ = parsear_rango(request)
     start_date = timezone.now() - timedelta(hours=horas_atras)
-    # Optimización: select_related para evitar N+1 queries
-    lecturas = list(LecturaEstacion.objects.filter(estacion=estacion, captura__timestamp__gte=start_date).select_related('captura').order_by('captura__timestamp'))
-    
+
     dataset_bicis, dataset_anclajes = [], []
-    s_b, s_a, c_sb, c_sa = 0, 0, 0, 0
-    
-    for l in lecturas:
-        ts = l.captura.timestamp.isoformat()
-        dataset_bicis.append({'x': ts, 'y': l.bicis_disponibles})
-        dataset_anclajes.append({'x': ts, 'y': l.anclajes_libres})
-        s_b += l.bicis_disponibles
-        s_a += l.anclajes_libres
-        if l.bicis_disponibles == 0: c_sb += 1
-        if l.anclajes_libres == 0: c_sa += 1
-
-    total = len(lecturas)
+    if horas_atras > HORAS_SERIE_COMPLETA:
+        for hora, (n, sb, sa) in sorted(serie_horaria(estacion, start_date).items()):
+            ts = datetime.datetime.fromtimestamp(hora, tz=datetime.timezone.utc).isoformat()
+            dataset_bicis.append({'x': ts, 'y': round(sb / n, 1)})
+            dataset_anclajes.append({'x': ts, 'y': round(sa / n, 1)})
+        return JsonResponse({'bicis': dataset_bicis, 'anclajes': dataset_anclajes})
+
+    filas = LecturaEstacion.objects.filter(estacion=estacion, captura__timestamp__gte=start_date).order_by('captura__timestamp').values_list('captura__timestamp', 'bicis_disponibles', 'anclajes_libres')
+    ts_archivo, bicis_archivo, anclajes_archivo = archivo.serie_estacion(estacion, start_date, timezone.now())
+    for epoch, bicis, anclajes in zip(ts_archivo.tolist(), bicis_archivo.tolist(), anclajes_archivo.tolist()):
+        ts = datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc).isoformat()
+        dataset_bicis.append({'x': ts, 'y': bicis})
+        dataset_anclajes.append({'x': ts, 'y': anclajes})
+    for ts, bicis, anclajes in filas:
+        ts = ts.isoformat()
+        dataset_bicis.append({'x': ts, 'y': bicis})
+        dataset_anclajes.append({'x': ts, 'y': anclajes})
+    return JsonResponse({'bicis': dataset_bicis, 'anclajes': dataset_anclajes})
+
+@datos_cacheables(CACHE_DATOS)
+def detalle_stats(request, estacion_id):
+    estacion = get_object_or_404(Estacion, id_externo=estacion_id)
+    _, horas_atras, _ = parsear_rango(request)
+    start_date = timezone.now() - timedelta(hours=horas_atras)
+    # Agregación en base de datos: una sola fila de vuelta
+    agg = LecturaEstacion.objects.filter(estacion=estacion, captura__timestamp__gte=start_date).aggregate(
+        total=Count('id'),
+        mb=Sum('bicis_disponibles'), ma=Sum('anclajes_libres'),
+        sb=Count('id', filter=Q(bicis_disponibles=0)), sa=Count('id', filter=Q(anclajes_libres=0)),
+    )
+    # Más los meses que ya solo están en el archivo frío
+    _, bicis, anclajes = archivo.serie_estacion(estacion, start_date, timezone.now())
+    total = agg['total'] + len(bicis)
     stats = {'media_bicis': 0, 'media_anclajes': 0, 'pct_sin_bicis': 0, 'pct_sin_anclajes': 0}
     if total > 0:
+        suma_b = (agg['mb'] or 0) + int(bicis.sum())
+        suma_a = (agg['ma'] or 0) + int(anclajes.sum())
+        ceros_b = agg['sb'] + int((bicis == 0).sum())
+        ceros_a = agg['sa'] + int((anclajes == 0).sum())
         stats = {
-            'media_bicis': round(s_b/total, 1), 'media_anclajes': round(s_a/total, 1),
-            'pct_sin_bicis': round((c_sb/total)*100, 1), 'pct_sin_anclajes': round((c_sa/total)*100, 1)
+            'media_bicis': round(suma_b/total, 1), 'media_anclajes': round(suma_a/total, 1),
+            'pct_sin_bicis': round((ceros_b/total)*100, 1), 'pct_sin_anclajes': round((ceros_a/total)*100, 1)
         }
+    return JsonResponse(stats)
 
-    # Heatmap
-    lecturas_mes = LecturaEstacion.objects.filter(estacion=estacion, captura__timestamp__gte=timezone.now()-timedelta(days=30)).select_related('captura').only('captura__timestamp', 'bicis_disponibles')
+@datos_cacheables(CACHE_HEATMAP)
+def detalle_heatmap(request, estacion_id):
+    lecturas_mes = LecturaEstacion.objects.filter(estacion_id=estacion_id, captura__timestamp__gte=timezone.now()-timedelta(days=30)).values_list('captura__timestamp', 'bicis_disponibles')
     heatmap_raw = [[[{'s': 0, 'c': 0} for _ in range(4)] for _ in range(24)] for _ in range(7)]
-    for l in lecturas_mes:
-        fl = timezone.localtime(l.captura.timestamp)
-        heatmap_raw[fl.weekday()][fl.hour][fl.minute//15]['s'] += l.bicis_disponibles
+    for ts, bicis in lecturas_mes:
+        fl = timezone.localtime(ts)
+        heatmap_raw[fl.weekday()][fl.hour][fl.minute//15]['s'] += bicis
         heatmap_raw[fl.weekday()][fl.hour][fl.minute//15]['c'] += 1
 
     heatmap_data = [{'nombre': ['Lun','Mar','Mié','Jue','Vie','Sáb','Dom'][i], 'horas': [[round(heatmap_raw[i][h][q]['s']/heatmap_raw[i][h][q]['c'], 1) if heatmap_raw[i][h][q]['c']>0 else None for q in range(4)] for h in range(24)]} for i in range(7)]
+    return JsonResponse({'dias': heatmap_data})
+
+@datos_cacheables(CACHE_DATOS)
+def detalle_ultimas(request, estacion_id):
+    ultimas = LecturaEstacion.objects.filter(estacion_id=estacion_id).order_by('-captura_id').values_list('captura__timestamp', 'bicis_disponibles', 'anclajes_libres')[:10]
+    return JsonResponse({'lecturas': [
+        {'ts': timezone.localtime(ts).isoformat(), 'bicis': b, 'anclajes': a} for ts, b, a in ultimas
+    ]})
+
+@datos_cacheables(CACHE_HEATMAP)
+def detalle_similares(request, estacion_id):
+    """Grupo de uso y estaciones de patrón parecido (caché PerfilEstacion de calcular_similitud)"""
+    perfil = PerfilEstacion.objects.select_related('estacion').filter(estacion_id=estacion_id).first()
+    if perfil is None:
+        return JsonResponse({'grupo': None, 'similares': []})
+    ids = [eid for eid, _ in perfil.similares]
+    estaciones = Estacion.objects.in_bulk(ids)
+    origen = perfil.estacion
+    similares = []
+    for eid, similitud in perfil.similares:
+        est = estaciones.get(eid)
+        if est is None:
+            continue
+        similares.append({
+            'id': eid,
+            'nombre': est.nombre,
+            'similitud': round(similitud * 100),
+            'distancia': int(haversine(origen.latitud, origen.longitud, est.latitud, est.longitud)),
+            'url': reverse('detalle_estacion', args=[eid]),
+        })
+    return JsonResponse({
+        'grupo': perfil.grupo,
+        'descripcion': perfil.descripcion_grupo,
+        'calculado': timezone.localtime(perfil.calculado).isoformat(),
+        'similares': similares,
+    })
 
-    context = {
-        'estacion': estacion, 
-        'lecturas': list(reversed(lecturas[-10:])), 
-        'dataset_bicis': dataset_bicis, 
-        'dataset_anclajes': dataset_anclajes, 
-        'stats': stats, 
-        'heatmap_data': heatmap_data, 
-        'rango_actual': rango, 
-        'titulo_rango': titulo_rango,
-        'last_update': get_ultima_actualizacion()
-    }
-    return render(request, 'core/detalle_estacion.html', context)
+# --- MAPA: SHELL + DATOS ---
 
+@cache_page(CACHE_DATOS)
+@lectura_en_replica
 def mapa_estaciones(request):
-    hace_24h = timezone.now() - timedelta(hours=24)
-    estaciones_static = {e.id_externo: {'lat': float(e.latitud), 'lon': float(e.longitud), 'nombre': e.nombre, 'url': reverse('detalle_estacion', args=[e.id_externo])} for e in Estacion.objects.all()}
-    capturas = list(Captura.objects.filter(timestamp__gte=hace_24h).order_by('timestamp'))[::2]
-    timeline_data = [{'ts': timezone.localtime(c.timestamp).strftime("%H:%M"), 'd': {str(i[0]): [i[1], i[2]] for i in c.lecturas.values_list('estacion__id_externo', 'bicis_disponibles', 'anclajes_libres')}} for c in capturas]
-    
     context = {
-        'estaciones_static': json.dumps(estaciones_static, cls=DjangoJSONEncoder), 
-        'timeline_json': json.dumps(timeline_data, cls=DjangoJSONEncoder),
+        'feed': feed_seleccionado(request),
+        'feeds': Feed.objects.filter(activo=True).order_by('id'),
+        'modo': request.GET.get('modo') if request.GET.get('modo') in ('zonas', 'historico') else 'estaciones',
+        'publicacion_url': settings.PUBLICACION_URL,
+        'resoluciones': RESOLUCIONES,
+        'resolucion': resolucion_seleccionada(request),
         'last_update': get_ultima_actualizacion()
     }
+    if context['modo'] == 'historico' and context['feed']:
+        context['festivos'] = festivos_recientes(context['feed'])
+        context['hoy'] = timezone.localdate()
     return render(request, 'core/mapa_estaciones.html', context)
 
+@datos_cacheables(CACHE_HEATMAP)
+def mapa_datos_estaciones(request):
+    estaciones_static = {e.id_externo: {'lat': float(e.latitud), 'lon': float(e.longitud), 'nombre': e.nombre, 'url': reverse('detalle_estacion', args=[e.id_externo])} for e in Estacion.objects.filter(feed=feed_seleccionado(request))}
+    return JsonResponse(estaciones_static)
+
+@datos_cacheables(CACHE_DATOS)
+def mapa_datos_timeline(request):
+    hace_24h = timezone.now() - timedelta(hours=24)
+    capturas = list(Captura.objects.filter(feed=feed_seleccionado(request), timestamp__gte=hace_24h).order_by('timestamp').values_list('id', 'timestamp'))[::2]
+    # Una sola consulta para todas las capturas (antes: una por captura)
+    frames = {cid: {} for cid, _ in capturas}
+    for cid, eid, b, a in LecturaEstacion.objects.filter(captura_id__in=list(frames)).values_list('captura_id', 'estacion_id', 'bicis_disponibles', 'anclajes_libres'):
+        frames[cid][str(eid)] = [b, a]
+    timeline_data = [{'ts': timezone.localtime(ts).strftime("%H:%M"), 'd': frames[cid]} for cid, ts in capturas]
+    return JsonResponse(timeline_data, safe=False)
+
+# --- VIAJE EN EL TIEMPO (fotogramas clave + deltas, ver core/fotogramas.py) ---
+MAX_HORAS_REPLAY = 48
+
+def festivos_recientes(feed, dias=365):
+    """[(fecha, nombre)] de los festivos del feed en el último año, del más reciente al más antiguo"""
+    hoy = timezone.localdate()
+    calendario = holidays.country_holidays(feed.pais, subdiv=feed.subdivision or None, years=[hoy.year - 1, hoy.year])
+    return sorted(((d, nombre) for d, nombre in calendario.items() if hoy - timedelta(days=dias) <= d <= hoy), reverse=True)
+
+def instante_pedido(request, nombre):
+    """Fecha y hora local de ?nombre= (formato de <input type="datetime-local">) o None"""
+    try:
+        instante = parse_datetime(request.GET.get(nombre) or '')
+    except ValueError:
+        return None
+    if instante is not None and timezone.is_naive(instante):
+        instante = timezone.make_aware(instante)
+    return instante
+
+def fotograma_json(timestamp, datos):
+    return {'t': int(timestamp.timestamp()), 'ts': timezone.localtime(timestamp).strftime("%d/%m %H:%M"), 'd': datos}
+
+@datos_cacheables(CACHE_DATOS)
+def mapa_datos_instante(request):
+    """Estado de la red en ?t= (el último fotograma en o antes de ese instante)"""
+    instante = instante_pedido(request, 't')
+    feed = feed_seleccionado(request)
+    if instante is None or feed is None:
+        return JsonResponse({'error': 'Fecha inválida'}, status=400)
+    timestamp, estado, _ = estado_en(feed, instante)
+    if timestamp is None:
+        return JsonResponse({'error': 'Sin datos para esa fecha'}, status=404)
+    return JsonResponse(fotograma_json(timestamp, estado))
+
+@datos_cacheables(CACHE_DATOS)
+def mapa_datos_replay(request):
+    """Todas las capturas entre ?desde= y ?hasta= (máx. 48h): estado inicial + un delta por captura"""
+    desde = instante_pedido(request, 'desde')
+    feed = feed_seleccionado(request)
+    if desde is None or feed is None:
+        return JsonResponse({'error': 'Fecha inválida'}, status=400)
+    hasta = instante_pedido(request, 'hasta') or desde + timedelta(hours=24)
+    if hasta <= desde:
+        return JsonResponse({'error': 'Rango inválido'}, status=400)
+    hasta = min(hasta, desde + timedelta(hours=MAX_HORAS_REPLAY))
+
+    inicio, estado, deltas = fotogramas_entre(feed, desde, hasta)
+    if inicio is None:
+        return JsonResponse({'error': 'Sin datos para esas fechas'}, status=404)
+    return JsonResponse({
+        'inicial': fotograma_json(inicio, estado),
+        'deltas': [fotograma_json(timestamp, delta) for timestamp, delta in deltas],
+    })
+
+# --- MAPA POR ZONAS (solo agregados precalculados de SerieZona) ---
+
+def resolucion_seleccionada(request):
+    try:
+        resolucion = int(request.GET.get('res', RESOLUCION_POR_DEFECTO))
+    except ValueError:
+        return RESOLUCION_POR_DEFECTO
+    return resolucion if resolucion in RESOLUCIONES else RESOLUCION_POR_DEFECTO
+
+@datos_cacheables(CACHE_DATOS)
+def mapa_datos_zonas(request):
+    """Zonas del feed a la resolución pedida: agregado de la última captura y % de vacías/llenas en 24h."""
+    feed = feed_seleccionado(request)
+    resolucion = resolucion_seleccionada(request)
+    if feed is None:
+        return JsonResponse({'zonas': []})
+    ultima = Captura.objects.filter(feed=feed, lecturas__isnull=False).order_by('-timestamp').values_list('id', flat=True).first()
+    series = SerieZona.objects.filter(zona__feed=feed, zona__resolucion=resolucion)
+
+    actuales = {r['zona_id']: r for r in series.filter(captura_id=ultima).values('zona_id', 'bicis', 'anclajes', 'estaciones', 'vacias', 'llenas')}
+    dia = {r['zona_id']: r for r in series.filter(captura__timestamp__gte=timezone.now() - timedelta(hours=24)).values('zona_id').annotate(
+        n=Sum('estaciones'), v=Sum('vacias'), l=Sum('llenas')
+    )}
+
+    zonas = []
+    for z in Zona.objects.filter(pk__in=set(actuales) | set(dia)):
+        act, d = actuales.get(z.pk, {}), dia.get(z.pk)
+        zonas.append({
+            'id': z.pk,
+            'bounds': [[z.lat_min, z.lon_min], [z.lat_max, z.lon_max]],
+            'capacidad': z.capacidad_total,
+            'estaciones': act.get('estaciones', 0),
+            'bicis': act.get('bicis'),
+            'anclajes': act.get('anclajes'),
+            'vacias': act.get('vacias'),
+            'llenas': act.get('llenas'),
+            'pct_vacias_24h': round(d['v'] * 100 / d['n'], 1) if d and d['n'] else None,
+            'pct_llenas_24h': round(d['l'] * 100 / d['n'], 1) if d and d['n'] else None,
+        })
+    return JsonResponse({'zonas': zonas})
+
+@datos_cacheables(CACHE_DATOS)
+def mapa_datos_zona_serie(request, zona_id):
+    """Serie de las últimas 24h de una zona (índice zona, -captura)"""
+    filas = SerieZona.objects.filter(zona_id=zona_id, captura__timestamp__gte=timezone.now() - timedelta(hours=24)).order_by('captura__timestamp').values_list(
+        'captura__timestamp', 'bicis', 'anclajes', 'estaciones', 'vacias', 'llenas'
+    )
+    return JsonResponse({'serie': [
+        {'x': ts.isoformat(), 'bicis': b, 'anclajes': a, 'pct_vacias': round(v * 100 / n, 1) if n else 0, 'pct_llenas': round(l * 100 / n, 1) if n else 0}
+        for ts, b, a, n, v, l in filas
+    ]})
+
 # --- NUEVA VISTA DE ANALÍTICA (RANKING Y FILTROS) ---
 
+DIAS_ANALITICA = (7, 30, 365)
+
+@lectura_en_replica
 def analitica_global(request):
     """
     Vista nueva para mostrar ránkings y estadísticas avanzadas.
@@ -133,7 +394,13 @@ def analitica_global(request):
     """
     # 1. Toggle Nocturno (00:00 - 06:00)
     ignore_night = request.GET.get('ignore_night', 'false') == 'true'
-    dias_atras = 7 # Analizar última semana por defecto
+    # Periodo: última semana por defecto; 30 y 365 días tiran del archivo frío
+    try:
+        dias_atras = int(request.GET.get('dias', 7))
+    except ValueError:
+        dias_atras = 7
+    if dias_atras not in DIAS_ANALITICA:
+        dias_atras = 7
     
     limite = timezone.now() - timedelta(days=dias_atras)
     queryset = LecturaEstacion.objects.filter(captura__timestamp__gte=limite)
@@ -142,58 +409,132 @@ def analitica_global(request):
         # Excluir horas de 0 a 5 (00:00 a 05:59)
         queryset = queryset.exclude(captura__timestamp__hour__range=(0, 5))
 
-    # 2. Ranking "SIN BICIS" (Principal)
-    # Contamos cuántas veces bicis_disponibles = 0
-    # Ordenamos por % DESC y mostramos TOP 20
-    raw_sin_bicis = queryset.values('estacion__id_externo', 'estacion__nombre').annotate(
+    # 2. Conteos por estación: una agregación en la base + los meses archivados (NumPy)
+    # {id: [lecturas, veces sin bicis, veces sin anclajes]}
+    conteos = archivo.resumen_estaciones(limite, timezone.now(), horas_excluidas=range(0, 6) if ignore_night else None)
+    for r in queryset.values('estacion_id').annotate(
         total_registros=Count('id'),
-        ceros=Count('id', filter=Q(bicis_disponibles=0))
-    ).filter(ceros__gt=0).annotate(
-        porcentaje_calc=ExpressionWrapper(
-            F('ceros') * 100.0 / F('total_registros'),
-            output_field=FloatField()
-        )
-    ).order_by('-porcentaje_calc')[:20]
-
-    ranking_sin_bicis = []
-    for r in raw_sin_bicis:
-        ranking_sin_bicis.append({
-            'id': r['estacion__id_externo'],
-            'nombre': r['estacion__nombre'],
-            'porcentaje': round(r['porcentaje_calc'], 1),
-        })
-
-    # 3. Ranking "SIN ANCLAJES" (Full)
-    raw_sin_anclajes = queryset.values('estacion__id_externo', 'estacion__nombre').annotate(
-        total_registros=Count('id'),
-        ceros=Count('id', filter=Q(anclajes_libres=0))
-    ).filter(ceros__gt=0).annotate(
-        porcentaje_calc=ExpressionWrapper(
-            F('ceros') * 100.0 / F('total_registros'),
-            output_field=FloatField()
-        )
-    ).order_by('-porcentaje_calc')[:20]
-
-    ranking_sin_anclajes = []
-    for r in raw_sin_anclajes:
-        ranking_sin_anclajes.append({
-            'id': r['estacion__id_externo'],
-            'nombre': r['estacion__nombre'],
-            'porcentaje': round(r['porcentaje_calc'], 1),
-        })
+        ceros_bicis=Count('id', filter=Q(bicis_disponibles=0)),
+        ceros_anclajes=Count('id', filter=Q(anclajes_libres=0)),
+    ):
+        acumulado = conteos.setdefault(r['estacion_id'], [0, 0, 0])
+        acumulado[0] += r['total_registros']
+        acumulado[1] += r['ceros_bicis']
+        acumulado[2] += r['ceros_anclajes']
+
+    nombres = dict(Estacion.objects.filter(id_externo__in=list(conteos)).values_list('id_externo', 'nombre'))
+
+    def ranking(k):
+        # Ordenamos por % DESC y mostramos TOP 20
+        filas = [(eid, c[k] * 100.0 / c[0]) for eid, c in conteos.items() if c[k] > 0]
+        filas.sort(key=lambda f: -f[1])
+        return [{'id': eid, 'nombre': nombres.get(eid, ''), 'porcentaje': round(pct, 1)} for eid, pct in filas[:20]]
+
+    # 3. Ranking "SIN BICIS" (Principal) y "SIN ANCLAJES" (Full)
+    ranking_sin_bicis = ranking(1)
+    ranking_sin_anclajes = ranking(2)
 
     context = {
         'ranking_sin_bicis': ranking_sin_bicis,
         'ranking_sin_anclajes': ranking_sin_anclajes,
         'ignore_night': ignore_night,
         'dias_atras': dias_atras,
+        'opciones_dias': DIAS_ANALITICA,
         'last_update': get_ultima_actualizacion()
     }
     return render(request, 'core/analitica.html', context)
 
+# --- FLUJOS (SALIDAS / LLEGADAS) PARA REEQUILIBRADO ---
+
+@lectura_en_replica
+def flujos_estaciones(request):
+    """
+    Ránkings de salidas, llegadas y desequilibrio neto, más la serie horaria del neto
+    de una estación. Todo sale de la tabla precalculada FlujoEstacion.
+    """
+    rango = request.GET.get('rango', '24h')
+    if rango == '7d':
+        horas_atras, titulo_rango = 168, "Últimos 7 días"
+    else:
+        horas_atras, titulo_rango, rango = 24, "Últimas 24 horas", '24h'
+
+    desde = timezone.now() - timedelta(hours=horas_atras)
+    qs = FlujoEstacion.objects.filter(captura__timestamp__gte=desde)
+
+    totales = list(qs.values('estacion__id_externo', 'estacion__nombre').annotate(
+        salidas_total=Sum('salidas'),
+        llegadas_total=Sum('llegadas'),
+    ).annotate(neto=F('llegadas_total') - F('salidas_total')))
+
+    def fila(r):
+        return {'id': r['estacion__id_externo'], 'nombre': r['estacion__nombre'], 'salidas': r['salidas_total'], 'llegadas': r['llegadas_total'], 'neto': r['neto']}
+
+    ranking_salidas = [fila(r) for r in sorted(totales, key=lambda r: -r['salidas_total'])[:15]]
+    ranking_llegadas = [fila(r) for r in sorted(totales, key=lambda r: -r['llegadas_total'])[:15]]
+    ranking_desequilibrio = [fila(r) for r in sorted(totales, key=lambda r: -abs(r['neto']))[:15]]
+
+    # Serie horaria del neto (llegadas - salidas) para la estación elegida o la más desequilibrada
+    estacion_sel = None
+    try:
+        estacion_sel = int(request.GET.get('estacion'))
+    except (TypeError, ValueError):
+        if ranking_desequilibrio:
+            estacion_sel = ranking_desequilibrio[0]['id']
+
+    serie_neto = []
+    nombre_sel = None
+    if estacion_sel is not None:
+        nombre_sel = Estacion.objects.filter(id_externo=estacion_sel).values_list('nombre', flat=True).first()
+        por_hora = qs.filter(estacion_id=estacion_sel).annotate(hora=TruncHour('captura__timestamp')).values('hora').annotate(
+            s=Sum('salidas'), l=Sum('llegadas')
+        ).order_by('hora')
+        serie_neto = [{'x': r['hora'].isoformat(), 'salidas': r['s'], 'llegadas': r['l'], 'y': r['l'] - r['s']} for r in por_hora]
+
+    context = {
+        'ranking_salidas': ranking_salidas,
+        'ranking_llegadas': ranking_llegadas,
+        'ranking_desequilibrio': ranking_desequilibrio,
+        'estacion_sel': estacion_sel,
+        'nombre_sel': nombre_sel,
+        'serie_neto': json.dumps(serie_neto, cls=DjangoJSONEncoder),
+        'rango_actual': rango,
+        'titulo_rango': titulo_rango,
+        'last_update': get_ultima_actualizacion()
+    }
+    return render(request, 'core/flujos.html', context)
+
+# --- ALERTAS DEL DETECTOR DE ANOMALÍAS ---
+
+@lectura_en_replica
+def alertas(request):
+    """Alertas activas y las cerradas en los últimos 7 días (tabla AlertaEstacion)."""
+    tipo = request.GET.get('tipo')
+    qs = AlertaEstacion.objects.select_related('estacion')
+    if tipo in dict(AlertaEstacion.TIPOS):
+        qs = qs.filter(tipo=tipo)
+
+    context = {
+        'activas': qs.filter(activa=True).order_by('-inicio')[:200],
+        'recientes': qs.filter(activa=False, fin__gte=timezone.now() - timedelta(days=7)).order_by('-fin')[:100],
+        'tipos': AlertaEstacion.TIPOS,
+        'tipo_actual': tipo,
+        'last_update': get_ultima_actualizacion()
+    }
+    return render(request, 'core/alertas.html', context)
+
 # --- ORÁCULO INTELIGENTE (PLANIFICADOR) ---
 
 def calcular_prediccion_precisa(estacion_id, dia, hora, minuto):
+    # 1. Tabla precalculada (modelo con meteo + calendario) si el instante cae en las próximas 24h
+    pred = prediccion_para(estacion_id, dia, hora, minuto)
+    if pred:
+        mb, ma = round(pred['bicis'], 1), round(pred['anclajes'], 1)
+        delta = pred['despues'] - pred['antes']
+        tendencia = "Subiendo 📈" if delta > 0.3 else "Bajando 📉" if delta < -0.3 else "Estable 😐"
+        pct_bici, pct_hueco = min(100, int((mb/5.0)*100)), min(100, int((ma/5.0)*100))
+        return {'pct_bici_num': pct_bici, 'pct_hueco_num': pct_hueco, 'media_bicis': mb, 'media_anclajes': ma, 'tendencia': tendencia, 'fuente': 'modelo'}
+
+    # 2. Fuera del horizonte (o sin modelo entrenado): media histórica ±4 min
     dummy = datetime.datetime(2000, 1, 1, hora, minuto)
     start, end = (dummy - timedelta(minutes=4)).time(), (dummy + timedelta(minutes=4)).time()
     qs = LecturaEstacion.objects.filter(estacion__id_externo=estacion_id, captura__timestamp__gte=timezone.now()-timedelta(days=60), captura__timestamp__week_day=dia, captura__timestamp__time__range=(start, end))
@@ -207,12 +548,12 @@ def calcular_prediccion_precisa(estacion_id, dia, hora, minuto):
     tendencia = "Subiendo 📈" if (despues - antes) > 0.3 else "Bajando 📉" if (despues - antes) < -0.3 else "Estable 😐"
     
     pct_bici, pct_hueco = min(100, int((mb/5.0)*100)), min(100, int((ma/5.0)*100))
-    return {'pct_bici_num': pct_bici, 'pct_hueco_num': pct_hueco, 'media_bicis': mb, 'media_anclajes': ma, 'tendencia': tendencia}
+    return {'pct_bici_num': pct_bici, 'pct_hueco_num': pct_hueco, 'media_bicis': mb, 'media_anclajes': ma, 'tendencia': tendencia, 'fuente': 'historico'}
 
 def buscar_alternativas(target_id, dia, hora, minuto, tipo):
     try:
         origen = Estacion.objects.get(id_externo=target_id)
-        ult_captura = Captura.objects.filter(lecturas__isnull=False).distinct().order_by('-timestamp').first()
+        ult_capturas = ultimas_capturas()
         candidatas = []
         for est in Estacion.objects.exclude(id_externo=target_id):
             dist = haversine(float(origen.latitud), float(origen.longitud), float(est.latitud), float(est.longitud))
@@ -221,8 +562,8 @@ def buscar_alternativas(target_id, dia, hora, minuto, tipo):
                 if not pred: continue
                 
                 dato_real = '-'
-                if ult_captura:
-                    lec = LecturaEstacion.objects.filter(captura=ult_captura, estacion=est).first()
+                if ult_capturas.get(est.feed_id):
+                    lec = LecturaEstacion.objects.filter(captura_id=ult_capturas[est.feed_id], estacion=est).first()
                     if lec: dato_real = lec.bicis_disponibles if tipo == 'bici' else lec.anclajes_libres
                 
                 prob = pred['pct_bici_num'] if tipo == 'bici' else pred['pct_hueco_num']
@@ -253,13 +594,13 @@ def planificador(request):
             dia_llegada = dia + 1 if llegada.day != target_salida.day else dia
             if dia_llegada > 7: dia_llegada = 1
 
-            ult = Captura.objects.filter(lecturas__isnull=False).distinct().order_by('-timestamp').first()
+            ult = ultimas_capturas()
             ro, rd = {'b': 0, 'a': 0}, {'b': 0, 'a': 0}
             so_real, sd_real, hay_real = 0, 0, False
             
             if ult:
-                lo = LecturaEstacion.objects.filter(captura=ult, estacion=obj_o).first()
-                ld = LecturaEstacion.objects.filter(captura=ult, estacion=obj_d).first()
+                lo = LecturaEstacion.objects.filter(captura_id=ult.get(obj_o.feed_id), estacion=obj_o).first()
+                ld = LecturaEstacion.objects.filter(captura_id=ult.get(obj_d.feed_id), estacion=obj_d).first()
                 if lo: 
                     ro = {'b': lo.bicis_disponibles, 'a': lo.anclajes_libres}
                     so_real = min(100, int((lo.bicis_disponibles/5.0)*100))
@@ -292,7 +633,7 @@ def planificador(request):
             sug_d = buscar_alternativas(d_id, dia_llegada, llegada.hour, llegada.minute, 'hueco') if prob_d < 50 else []
 
             res = {
-                'viaje': {'minutos': mins_viaje, 'distancia_km': round(dist/1000, 1), 'hora_salida': f"{hora:02}:{minuto:02}", 'hora_llegada': f"{llegada.hour:02}:{llegada.minute:02}", 'fuente': fuente},
+                'viaje': {'minutos': mins_viaje, 'distancia_km': round(dist/1000, 1), 'hora_salida': f"{hora:02}:{minuto:02}", 'hora_llegada': f"{llegada.hour:02}:{llegada.minute:02}", 'fuente': fuente, 'modelo': bool(do_hist and do_hist['fuente'] == 'modelo')},
                 'origen': {'nombre': obj_o.nombre, 'nivel': obtener_nivel_probabilidad(prob_o), 'actual_bicis': ro['b'], 'media': do_hist['media_bicis'] if do_hist else 0, 'tendencia': do_hist['tendencia'] if do_hist else '-', 'alternativas': sug_o},
                 'destino': {'nombre': obj_d.nombre, 'nivel': obtener_nivel_probabilidad(prob_d), 'actual_anclajes': rd['a'], 'media': dd_hist['media_anclajes'] if dd_hist else 0, 'tendencia': dd_hist['tendencia'] if dd_hist else '-', 'alternativas': sug_d}
             }
@@ -309,6 +650,46 @@ def planificador(request):
 def radar_index(request): 
     return render(request, 'core/radar.html', {'last_update': get_ultima_actualizacion()})
 
+# Coordenadas cuantizadas a celdas de CELDA_RADAR m: una consulta por celda y captura (core/coalescencia.py)
+CELDA_RADAR = 150
+CACHE_RADAR = 15 * 60  # Tope; la clave ya cambia con cada captura
+ESTACIONES_RADAR = 5
+
+def candidatas_radar(lat, lon):
+    """
+    Estaciones que pueden estar entre las ESTACIONES_RADAR más cercanas de algún punto de la celda
+    de centro (lat, lon), con su última lectura. Un punto de la celda dista del centro como mucho
+    media diagonal h, así que basta con las que estén a menos de (la 5ª más cercana al centro) + 2h.
+    """
+    estaciones = sorted(
+        [(haversine(lat, lon, float(e['latitud']), float(e['longitud'])), e)
+         for e in Estacion.objects.values('id_externo', 'nombre', 'latitud', 'longitud')],
+        key=lambda x: x[0],
+    )
+    if not estaciones:
+        return []
+    limite = estaciones[min(ESTACIONES_RADAR, len(estaciones)) - 1][0] + CELDA_RADAR * math.sqrt(2)
+    cercanas = [e for dist, e in estaciones if dist <= limite]
+
+    # Cada estación solo tiene lecturas en las capturas de su feed: una consulta para todas
+    ult = [c for c in ultimas_capturas().values() if c]
+    lecturas = {
+        l['estacion_id']: l for l in LecturaEstacion.objects.filter(
+            captura_id__in=ult, estacion_id__in=[e['id_externo'] for e in cercanas]
+        ).values('estacion_id', 'bicis_disponibles', 'anclajes_libres')
+    }
+    return [
+        {
+            'id': e['id_externo'],
+            'nombre': e['nombre'],
+            'lat': float(e['latitud']),
+            'lon': float(e['longitud']),
+            'lectura': lecturas.get(e['id_externo']),
+        }
+        for e in cercanas
+    ]
+
+@lectura_en_replica
 def radar_carga(request):
     try: 
         lat = float(request.GET.get('lat'))
@@ -316,25 +697,27 @@ def radar_carga(request):
     except (TypeError, ValueError): 
         return JsonResponse({'error': 'Coordenadas inválidas'}, status=400)
 
-    candidatas = sorted([(haversine(lat, lon, float(e.latitud), float(e.longitud)), e) for e in Estacion.objects.all()], key=lambda x: x[0])[:5]
-    
-    ult = Captura.objects.filter(lecturas__isnull=False).distinct().order_by('-timestamp').first()
-    
-    res = []
-    if ult:
-        for dist, est in candidatas:
-            act = LecturaEstacion.objects.filter(captura=ult, estacion=est).first()
-            if act: 
-                res.append({
-                    'id': est.id_externo, 
-                    'nombre': est.nombre, 
-                    'distancia': int(dist), 
-                    'tiempo_pie': int(dist/80), 
-                    'bicis': act.bicis_disponibles, 
-                    'anclajes': act.anclajes_libres,
-                    'lat': float(est.latitud),
-                    'lon': float(est.longitud),
-                    'url': reverse('detalle_estacion', args=[est.id_externo])
-                })
-    
+    fila, columna, lat_celda, lon_celda = cuantizar(lat, lon, CELDA_RADAR)
+    candidatas = calcular_una_vez(
+        f"radar:{version_capturas()}:{fila}:{columna}",
+        lambda: candidatas_radar(lat_celda, lon_celda),
+        CACHE_RADAR,
+    )
+
+    # Lo único por usuario: ordenar las candidatas de su celda por su distancia real
+    cercanas = sorted([(haversine(lat, lon, c['lat'], c['lon']), c) for c in candidatas], key=lambda x: x[0])[:ESTACIONES_RADAR]
+    res = [
+        {
+            'id': c['id'],
+            'nombre': c['nombre'],
+            'distancia': int(dist),
+            'tiempo_pie': int(dist/80),
+            'bicis': c['lectura']['bicis_disponibles'],
+            'anclajes': c['lectura']['anclajes_libres'],
+            'lat': c['lat'],
+            'lon': c['lon'],
+            'url': reverse('detalle_estacion', args=[c['id']])
+        }
+        for dist, c in cercanas if c['lectura']
+    ]
     return JsonResponse({'estaciones': res})
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+Agregación espacial por zonas.
+
+Cada feed tiene una rejilla de celdas cuadradas a varias resoluciones, calculada localmente con
+latitud/longitud (grados -> metros con el coseno de la latitud del feed). Las estaciones se
+asignan a su celda al aparecer y en cada captura se guarda un SerieZona por zona con ocupación,
+estaciones vacías y llenas, sumando las lecturas que la ingesta ya tiene en memoria.
+"""
+import math
+from collections import defaultdict
+
+from django.db.models import Count, Q, Sum
+
+from .models import Estacion, LecturaEstacion, SerieZona, Zona
+
+# Lado de la celda en metros: barrio, distrito y zona amplia
+RESOLUCIONES = (250, 500, 1000)
+RESOLUCION_POR_DEFECTO = 500
+METROS_POR_GRADO = 111320
+
+
+def tamano_celda_en(latitud, resolucion):
+    """(grados de latitud, grados de longitud) que mide una celda a la latitud de referencia"""
+    dlat = resolucion / METROS_POR_GRADO
+    dlon = resolucion / (METROS_POR_GRADO * max(math.cos(math.radians(latitud)), 0.01))
+    return dlat, dlon
+
+
+def celda_en(latitud, resolucion, lat, lon):
+    dlat, dlon = tamano_celda_en(latitud, resolucion)
+    return math.floor(lat / dlat), math.floor(lon / dlon)
+
+
+def tamano_celda(feed, resolucion):
+    """(grados de latitud, grados de longitud) que mide una celda en el feed"""
+    return tamano_celda_en(feed.latitud, resolucion)
+
+
+def celda(feed, resolucion, lat, lon):
+    return celda_en(feed.latitud, resolucion, lat, lon)
+
+
+def tiene_coordenadas(estacion):
+    """Las estaciones con latitud o longitud 0 (sin coordenadas en el feed) no van a ninguna zona"""
+    return bool(estacion.latitud and estacion.longitud)
+
+
+def asignar_zonas(feed, estaciones):
+    """
+    Asigna `estaciones` (del feed) a su celda en cada resolución, creando las zonas que falten,
+    y recalcula la capacidad de las zonas tocadas. Es idempotente.
+    """
+    estaciones = [e for e in estaciones if tiene_coordenadas(e)]
+    if not estaciones:
+        return 0
+    destino = {}  # estacion_id -> [(resolucion, fila, columna)]
+    celdas = set()
+    for e in estaciones:
+        claves = [(r, *celda(feed, r, e.latitud, e.longitud)) for r in RESOLUCIONES]
+        destino[e.id_externo] = claves
+        celdas.update(claves)
+
+    nuevas = []
+    for resolucion, fila, columna in celdas:
+        dlat, dlon = tamano_celda(feed, resolucion)
+        nuevas.append(Zona(
+            feed=feed, resolucion=resolucion, fila=fila, columna=columna,
+            lat_min=fila * dlat, lon_min=columna * dlon, lat_max=(fila + 1) * dlat, lon_max=(columna + 1) * dlon,
+        ))
+    Zona.objects.bulk_create(nuevas, ignore_conflicts=True)
+    zonas = {
+        (z.resolucion, z.fila, z.columna): z.pk
+        for z in Zona.objects.filter(feed=feed, resolucion__in=RESOLUCIONES, fila__in={c[1] for c in celdas}, columna__in={c[2] for c in celdas})
+    }
+
+    propias = {eid: {zonas[c] for c in claves} for eid, claves in destino.items()}
+    tocadas = set(zonas[c] for c in celdas)
+    Pertenencia = Zona.estaciones.through
+    # Una estación que se ha movido deja sus celdas anteriores (cada una comparando con las suyas)
+    sobrantes = [
+        (p.pk, p.zona_id) for p in Pertenencia.objects.filter(estacion_id__in=list(destino)).only('pk', 'estacion_id', 'zona_id')
+        if p.zona_id not in propias[p.estacion_id]
+    ]
+    if sobrantes:
+        Pertenencia.objects.filter(pk__in=[pk for pk, _ in sobrantes]).delete()
+        tocadas.update(zid for _, zid in sobrantes)
+    Pertenencia.objects.bulk_create(
+        [Pertenencia(zona_id=zid, estacion_id=eid) for eid, zids in propias.items() for zid in zids],
+        ignore_conflicts=True,
+    )
+
+    # Capacidad de las zonas afectadas, incluidas las que una estación acaba de dejar
+    capacidades = dict(
+        Zona.objects.filter(pk__in=tocadas).annotate(c=Sum('estaciones__capacidad_total')).values_list('pk', 'c')
+    )
+    Zona.objects.bulk_update(
+        [Zona(pk=pk, capacidad_total=capacidades.get(pk) or 0) for pk in tocadas], ['capacidad_total']
+    )
+    return len(estaciones)
+
+
+def pertenencias(feed):
+    """{estacion_id: [zona_id, ...]} del feed: una fila por estación y resolución"""
+    resultado = defaultdict(list)
+    for eid, zid in Zona.estaciones.through.objects.filter(zona__feed=feed).values_list('estacion_id', 'zona_id'):
+        resultado[eid].append(zid)
+    return resultado
+
+
+def registrar_zonas(captura, lecturas):
+    """
+    Suma las `lecturas` de la captura por zona y guarda un SerieZona por zona.
+    Las estaciones sin zona (nuevas) se asignan antes; las que no tienen coordenadas se saltan
+    para no reintentarlas en cada captura. Devuelve las filas creadas.
+    """
+    if captura.feed_id is None or not lecturas:
+        return 0
+    feed = captura.feed
+    zonas_de = pertenencias(feed)
+    sin_zona = [l.estacion for l in lecturas if l.estacion_id not in zonas_de and tiene_coordenadas(l.estacion)]
+    if sin_zona:
+        asignar_zonas(feed, sin_zona)
+        zonas_de = pertenencias(feed)
+
+    # zona_id -> [bicis, anclajes, estaciones, vacias, llenas]
+    acumulado = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for l in lecturas:
+        for zid in zonas_de.get(l.estacion_id, ()):
+            a = acumulado[zid]
+            a[0] += l.bicis_disponibles
+            a[1] += l.anclajes_libres
+            a[2] += 1
+            a[3] += l.bicis_disponibles == 0
+            a[4] += l.anclajes_libres == 0
+
+    SerieZona.objects.bulk_create([
+        SerieZona(captura=captura, zona_id=zid, bicis=a[0], anclajes=a[1], estaciones=a[2], vacias=a[3], llenas=a[4])
+        for zid, a in acumulado.items()
+    ], ignore_conflicts=True)
+    return len(acumulado)
+
+
+def backfill_zonas(feed, desde):
+    """
+    Recalcula zonas y SerieZona del feed desde `desde` con una agregación por (captura, zona)
+    en la base. Solo para el comando calcular_zonas; la ingesta usa registrar_zonas.
+    Devuelve las filas insertadas de verdad (las que ya existían se saltan con ignore_conflicts).
+    """
+    asignar_zonas(feed, Estacion.objects.filter(feed=feed))
+    existentes = SerieZona.objects.filter(zona__feed=feed, captura__timestamp__gte=desde)
+    antes = existentes.count()
+    filas = LecturaEstacion.objects.filter(captura__feed=feed, captura__timestamp__gte=desde).values(
+        'captura_id', 'estacion__zonas'
+    ).annotate(
+        b=Sum('bicis_disponibles'), a=Sum('anclajes_libres'), n=Count('id'),
+        v=Count('id', filter=Q(bicis_disponibles=0)), ll=Count('id', filter=Q(anclajes_libres=0)),
+    ).order_by()
+
+    lote = []
+    for r in filas.iterator(chunk_size=5000):
+        if r['estacion__zonas'] is None:
+            continue
+        lote.append(SerieZona(
+            captura_id=r['captura_id'], zona_id=r['estacion__zonas'],
+            bicis=r['b'], anclajes=r['a'], estaciones=r['n'], vacias=r['v'], llenas=r['ll'],
+        ))
+        if len(lote) >= 5000:
+            SerieZona.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    SerieZona.objects.bulk_create(lote, ignore_conflicts=True)
+    return existentes.count() - antes